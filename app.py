@@ -1,236 +1,1118 @@
 import os
 import logging
-import requests
 import re
-from flask import Flask, request, jsonify
-from bs4 import BeautifulSoup
+from flask import Flask, Response, request, jsonify
 from datetime import datetime
+import atexit
+import fcntl
+import html
+import functools
+import json
+import marshal
+import math
+import queue
+import random
 import threading
 import time
-import schedule
-from telegram import Bot
-from telegram.error import TelegramError
+from collections import deque
+
+from config import (
+    ALERT_MEDIAN_DAYS, BASE_INTERVAL, CATALOG_DISCOVERY, CATALOG_REFRESH, CATEGORIES_FILE,
+    CHECK_PAGE_WAIT, DIGEST_MAX_ITEMS, DUP_CLUSTERING, EARLY_STOP_AFTER, INTERVAL_JITTER,
+    LEADER_LOCK_PATH, LEADER_RETRY_SECONDS, MAX_BACKOFF, MAX_INTERVAL, MAX_RULES_PER_CHAT,
+    MIN_INTERVAL, MONITOR_AUTOSTART, MONITOR_ROLE, PRESENCE_ALERTS, RESPONSE_CACHE_SECONDS,
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_MESSAGE_LIMIT, URLS_TO_MONITOR,
+    WARM_STATE_INTERVAL, WARM_STATE_MAX_AGE, WARM_STATE_PATH,
+)
+from metrics import (
+    boot_seconds, cycle_latency, cycle_overruns, dedup_hits, fetch_errors, listing_events, metrics,
+    new_items_total,
+)
+from dispatcher import NotificationDispatcher, create_bot
+from parsing import CardBuffer, CategoryRegistry, ListingScan, normalize_text
+from fetch import FetchError, crawl, discover_sections, fetch_page, open_circuits, validator_cache
+from diff import EmptyListing, ListingClusters, ListingDiff
+from storage import DedupStore, EventRing, PriceHistory, SellerPresence, open_state_db
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+def process_started_at():
+    """Время запуска процесса по /proc (если недоступно — момент импорта модуля)"""
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return min(time.time(), boot_time + ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+# Отсчет холодного старта: от запуска процесса до первой полезной проверки
+PROCESS_STARTED = process_started_at()
 
-# Конфигурация из переменных окружения
-TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
-TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
+app = Flask(__name__)
 
 # Проверка конфигурации
 if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
     logger.error("❌ Не заданы TELEGRAM_BOT_TOKEN или TELEGRAM_CHAT_ID")
     raise ValueError("Задайте TELEGRAM_BOT_TOKEN и TELEGRAM_CHAT_ID в переменных окружения")
 
-# Инициализация бота
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
-
 # Глобальные переменные
-found_items = {}
-monitoring_active = False
-monitoring_thread = None
+is_leader = False
+last_cycle_stats = {}
+cycle_seq = 0
+catalog_refreshed_at = 0.0
+silent_first_scan = False
+# Категории, уже разобранные в этом процессе: тихая только первая проверка каждой
+scanned_categories = set()
+boot_stages = {}
 
-def send_telegram_message(message, parse_mode='HTML'):
-    """Отправка сообщения в Telegram"""
-    try:
-        bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message, parse_mode=parse_mode)
-        logger.info(f"📨 Отправлено в Telegram: {message[:50]}...")
-        return True
-    except TelegramError as e:
-        logger.error(f"❌ Ошибка Telegram: {e}")
-        return False
+def mark_boot(stage):
+    """Запомнить, через сколько секунд после запуска процесса пройден этап (один раз)"""
+    if stage in boot_stages:
+        return
+    boot_stages[stage] = round(time.time() - PROCESS_STARTED, 3)
+    boot_seconds.set(boot_stages[stage], stage=stage)
+    logger.info(f"🚀 Этап запуска {stage}: {boot_stages[stage]:.2f} с после старта процесса")
+
+notifier = NotificationDispatcher(create_bot)
+metrics.gauge('telegram_queue_depth', 'Сообщений в очереди на отправку', func=lambda: notifier.depth)
+
+def send_telegram_message(message, parse_mode='HTML', chat_id=None):
+    """Отправка сообщения в Telegram (через очередь, без ожидания)"""
+    notifier.send(chat_id or TELEGRAM_CHAT_ID, message, parse_mode)
+    return True
+
+# События, о которых сообщаем в Telegram (только для онлайн продавцов)
+NOTIFY_EVENTS = ('new', 'price_drop', 'seller_went_online')
+
+EVENT_HEADERS = {
+    'new': ('🎮', 'НОВОЕ ПРЕДЛОЖЕНИЕ', 'НОВЫЕ ПРЕДЛОЖЕНИЯ'),
+    'price_drop': ('📉', 'СНИЖЕНИЕ ЦЕНЫ', 'СНИЖЕНИЯ ЦЕН'),
+    'seller_went_online': ('🟢', 'ПРОДАВЕЦ ОНЛАЙН', 'ПРОДАВЦЫ ОНЛАЙН'),
+}
+
+def _event_price(event):
+    """Цена для уведомления: «старая → новая» при изменении цены"""
+    price = event['item']['price']
+    if event['old_price'] is not None and event['old_price'] != price:
+        return f"{event['old_price']} → {price} руб."
+    return f"{price} руб."
+
+def _event_note(event):
+    """Пояснение к уведомлению: сколько похожих предложений свернуто или сколько товаров у продавца"""
+    if event.get('seller_offers'):
+        return f"👤 {html.escape(event['item']['seller'])}: товаров {event['seller_offers']}, здесь самый дешевый"
+    cluster = event.get('cluster')
+    if not cluster or cluster['offers'] < 2:
+        return ''
+    return f"👥 похожих предложений: {cluster['offers']} у {cluster['sellers']} продавцов"
+
+def format_item_message(event, category):
+    """Уведомление об одном событии товара"""
+    item = event['item']
+    icon, title, _ = EVENT_HEADERS[event['type']]
+    note = _event_note(event)
+    return (
+        f"{icon} <b>{title} {category}</b>\n\n"
+        f"📦 <b>{html.escape(item['title'])}</b>\n"
+        f"💰 <b>Цена:</b> {_event_price(event)}\n"
+        + (f"{note}\n" if note else "")
+        + f"🟢 <b>Статус:</b> Продавец онлайн\n"
+        f"🔗 <a href='{html.escape(item['link'])}'>Открыть на FunPay</a>\n\n"
+        f"⏰ {datetime.now().strftime('%H:%M:%S')}"
+    )
+
+def format_digest_messages(events, category):
+    """Дайджест событий: не больше DIGEST_MAX_ITEMS и 4096 символов в сообщении"""
+    if len(events) == 1:
+        return [format_item_message(events[0], category)]
+    
+    kinds = {event['type'] for event in events}
+    if len(kinds) == 1:
+        icon, _, header = EVENT_HEADERS[kinds.pop()]
+    else:
+        icon, header = '🎮', 'ОБНОВЛЕНИЯ'
+    
+    messages = []
+    lines = []
+    size = 0
+    for event in sorted(events, key=lambda event: event['item']['price']):
+        item = event['item']
+        note = _event_note(event)
+        line = (
+            f"{EVENT_HEADERS[event['type']][0]} <b>{_event_price(event)}</b> — {html.escape(item['title'][:80])} "
+            f"<a href='{html.escape(item['link'])}'>открыть</a>" + (f" ({note})" if note else "")
+        )
+        if lines and (len(lines) >= DIGEST_MAX_ITEMS or size + len(line) > TELEGRAM_MESSAGE_LIMIT - 200):
+            messages.append(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line) + 1
+    messages.append(lines)
+    
+    total = len(messages)
+    return [
+        f"{icon} <b>{header} {category}</b> ({len(events)} шт."
+        + (f", часть {index}/{total}" if total > 1 else "") + ")\n"
+        f"🟢 Продавцы онлайн\n\n" + "\n".join(chunk)
+        + f"\n\n⏰ {datetime.now().strftime('%H:%M:%S')}"
+        for index, chunk in enumerate(messages, 1)
+    ]
+
+def notify_events(events, category, chat_id=None):
+    """Поставить в очередь дайджест событий категории"""
+    for message in format_digest_messages(events, category):
+        send_telegram_message(message, chat_id=chat_id)
+
+categories = CategoryRegistry(CATEGORIES_FILE)
+categories.reload_if_changed()
+URLS_TO_MONITOR[:] = categories.sources()
 
 def smart_parse_black_russia(url, category):
-    """Парсинг Black Russia ТОЛЬКО с онлайн продавцами"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Referer': 'https://funpay.com/',
-        }
-        
-        logger.info(f"🎮 Парсинг {category} (только онлайн продавцы)...")
-        response = requests.get(url, headers=headers, timeout=30)
-        
-        if response.status_code != 200:
-            logger.error(f"❌ Ошибка HTTP: {response.status_code}")
-            return []
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
+    """Парсинг категории (по умолчанию Black Russia) с правилами из ее описания"""
+    logger.info(f"🎮 Парсинг {category}...")
+    return parse_listing_page(fetch_page(url), category)
+
+def parse_listing_page(result, category):
+    """Разбор загруженной страницы: товары категории, при require_online — только онлайн продавцы"""
+    spec = categories.spec(result.url, category)
+    return [item for item in parse_listings(result, category) if item['seller_online'] or not spec.require_online]
+
+def parse_listings(result, category):
+    """Все подходящие товары страницы (онлайн и офлайн)
+    
+    Если страница не загружена, бросает FetchError: сбой FunPay не выглядит как пустой раздел.
+    """
+    if result.error:
+        raise FetchError(result.error, result.reason or 'network')
+    if result.status != 200:
+        raise FetchError(f"HTTP {result.status}", 'http')
+    return list(ListingScan(result, categories.spec(result.url, category)))
+
+class ResponseCache:
+    """Готовые ответы страниц статуса
+    
+    Ответ хранится, пока не сменилась версия данных (номер цикла проверки
+    лидера и флаг мониторинга), и не дольше max_age секунд, чтобы время
+    на странице и отклик лидера не устаревали сильно.
+    """
+
+    def __init__(self, max_age=RESPONSE_CACHE_SECONDS):
+        self.max_age = max_age
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, render):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] == version and now - entry[1] < self.max_age:
+            data, status_code, mimetype = entry[2]
+            return Response(data, status_code, mimetype=mimetype)
         
-        # Ищем ВСЕ карточки товаров
-        product_cards = soup.find_all('div', class_='tc-item')
-        logger.info(f"📦 Найдено карточек: {len(product_cards)}")
+        response = app.make_response(render())
+        if response.status_code == 200:
+            with self._lock:
+                self._entries[key] = (version, now, (response.get_data(), response.status_code, response.mimetype))
+        return response
+
+def cached_page(view):
+    """Отдавать страницу из ResponseCache до конца следующего цикла проверки"""
+    @functools.wraps(view)
+    def wrapper():
+        version = (control.get('cycle_seq', 0), is_monitoring())
+        return response_cache.get(request.path, version, view)
+    return wrapper
+
+class SubscriptionStore:
+    """Подписчики и их правила уведомлений (SQLite, общие для всех воркеров)
+    
+    Правило — диапазон цены, ключевые фразы, категория и сервер; пустое
+    условие не ограничивает. После каждого изменения в общем состоянии
+    меняется версия правил, по ней лидер перестраивает RuleIndex.
+    """
+
+    def __init__(self, connection, channel):
+        self.db = connection
+        self.channel = channel
+        self._lock = threading.Lock()
+        self.db.execute('CREATE TABLE IF NOT EXISTS subscribers (chat_id INTEGER PRIMARY KEY, created INTEGER)')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS rules ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER, min_price INTEGER, max_price INTEGER, '
+            'keywords TEXT, category TEXT, server TEXT, created INTEGER)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS rules_chat ON rules (chat_id)')
+
+    def _changed(self):
+        self.channel.set('rules_version', time.time_ns())
+
+    def version(self):
+        return self.channel.get('rules_version', 0)
+
+    def subscribe(self, chat_id):
+        """Зарегистрировать чат; False, если он уже подписан"""
+        with self._lock:
+            cursor = self.db.execute('INSERT OR IGNORE INTO subscribers VALUES (?, ?)', (chat_id, int(time.time())))
+        self._changed()
+        return cursor.rowcount > 0
+
+    def is_subscribed(self, chat_id):
+        with self._lock:
+            return self.db.execute('SELECT 1 FROM subscribers WHERE chat_id = ?', (chat_id,)).fetchone() is not None
+
+    def unsubscribe(self, chat_id):
+        """Удалить чат вместе со всеми его правилами"""
+        with self._lock, self.db:
+            self.db.execute('BEGIN')
+            self.db.execute('DELETE FROM rules WHERE chat_id = ?', (chat_id,))
+            cursor = self.db.execute('DELETE FROM subscribers WHERE chat_id = ?', (chat_id,))
+        self._changed()
+        return cursor.rowcount > 0
+
+    def add_rule(self, chat_id, min_price=None, max_price=None, keywords=(), category=None, server=None):
+        """Добавить правило чату; возвращает его номер"""
+        with self._lock:
+            cursor = self.db.execute(
+                'INSERT INTO rules (chat_id, min_price, max_price, keywords, category, server, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (chat_id, min_price, max_price, json.dumps(list(keywords), ensure_ascii=False),
+                 category, server, int(time.time())),
+            )
+        self._changed()
+        return cursor.lastrowid
+
+    def delete_rule(self, chat_id, rule_id):
+        with self._lock:
+            cursor = self.db.execute('DELETE FROM rules WHERE id = ? AND chat_id = ?', (rule_id, chat_id))
+        self._changed()
+        return cursor.rowcount > 0
+
+    def rules(self, chat_id=None):
+        """Правила подписанных чатов (или одного чата) в виде словарей"""
+        query = ('SELECT r.id, r.chat_id, r.min_price, r.max_price, r.keywords, r.category, r.server '
+                 'FROM rules r JOIN subscribers s ON s.chat_id = r.chat_id')
+        params = ()
+        if chat_id is not None:
+            query += ' WHERE r.chat_id = ?'
+            params = (chat_id,)
+        with self._lock:
+            rows = self.db.execute(query + ' ORDER BY r.id', params).fetchall()
+        return [
+            {'id': rule_id, 'chat_id': chat, 'min_price': min_price, 'max_price': max_price,
+             'keywords': json.loads(keywords), 'category': category, 'server': server}
+            for rule_id, chat, min_price, max_price, keywords, category, server in rows
+        ]
+
+    def subscriber_count(self):
+        with self._lock:
+            return self.db.execute('SELECT COUNT(*) FROM subscribers').fetchone()[0]
+
+_WORD_RE = re.compile(r'\w+')
+
+def _phrase(text):
+    """Нормализованные слова фразы через один пробел"""
+    return ' '.join(_WORD_RE.findall(normalize_text(text)))
+
+class RuleIndex:
+    """Индекс правил подписчиков: сопоставление товара без перебора всех правил
+    
+    Правило кладется во все ценовые корзины (логарифмическая шкала), которые
+    пересекает его диапазон, и в posting-список первого слова каждой своей
+    фразы; правила без фраз лежат отдельно. Кандидаты для товара — правила
+    из корзины его цены, совпавшие хотя бы по одному слову названия, точная
+    проверка делается только для них.
+    """
+
+    PRICE_BASE = 1.25
+    TOP_BUCKET = 64
+
+    def __init__(self, rules=()):
+        self.rules = {}
+        self.price_buckets = {}
+        self.postings = {}
+        self.without_keywords = set()
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _bucket(self, price):
+        return min(int(math.log(max(price, 1), self.PRICE_BASE)), self.TOP_BUCKET)
+
+    def add(self, rule):
+        rule_id = rule['id']
+        phrases = [phrase for phrase in map(_phrase, rule['keywords']) if phrase]
+        server = rule.get('server')
+        self.rules[rule_id] = dict(rule, phrases=phrases, server=normalize_text(server) if server else None)
         
-        items = []
-        online_count = 0
-        offline_count = 0
+        low = self._bucket(rule['min_price'] or 1)
+        high = self._bucket(rule['max_price']) if rule['max_price'] is not None else self.TOP_BUCKET
+        for bucket in range(low, high + 1):
+            self.price_buckets.setdefault(bucket, set()).add(rule_id)
+        if phrases:
+            for phrase in phrases:
+                self.postings.setdefault(phrase.split()[0], set()).add(rule_id)
+        else:
+            self.without_keywords.add(rule_id)
+
+    def match(self, item):
+        """chat_id подписчиков, хотя бы одно правило которых подходит товару"""
+        in_price = self.price_buckets.get(self._bucket(item['price']))
+        if not in_price:
+            return set()
+        title = _phrase(item['title'])
+        candidates = in_price & self.without_keywords
+        for word in set(title.split()):
+            posting = self.postings.get(word)
+            if posting:
+                candidates |= in_price & posting
         
-        for card in product_cards[:40]:  # Анализируем первые 40
+        chats = set()
+        padded_title = f" {title} "
+        server = normalize_text(item.get('server') or '')
+        for rule_id in candidates:
+            rule = self.rules[rule_id]
+            if rule['chat_id'] in chats:
+                continue
+            if rule['min_price'] is not None and item['price'] < rule['min_price']:
+                continue
+            if rule['max_price'] is not None and item['price'] > rule['max_price']:
+                continue
+            if rule['category'] is not None and rule['category'] != item['category']:
+                continue
+            if rule['server'] is not None and rule['server'] != server:
+                continue
+            if rule['phrases'] and not any(f" {phrase} " in padded_title for phrase in rule['phrases']):
+                continue
+            chats.add(rule['chat_id'])
+        return chats
+
+class StateChannel:
+    """Общее состояние процессов: ключ -> JSON в таблице SQLite
+    
+    Через него веб-воркеры управляют лидером (включение мониторинга,
+    запросы ручной проверки), а лидер публикует свой статус.
+    """
+
+    def __init__(self, connection):
+        self.db = connection
+        self._lock = threading.Lock()
+        self.db.execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, updated REAL)')
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self.db.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self._lock:
+            self.db.execute(
+                'INSERT INTO kv (key, value, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated = excluded.updated',
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+
+    def update(self, key, func, default=None):
+        """Атомарно (и между процессами) заменить значение на func(текущее); возвращает новое"""
+        with self._lock, self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            row = self.db.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+            value = func(json.loads(row[0]) if row else default)
+            self.db.execute(
+                'INSERT INTO kv (key, value, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated = excluded.updated',
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+        return value
+
+class RecentUpdates:
+    """Недавние update_id Telegram: повторная доставка того же обновления отбрасывается
+    
+    В памяти — ограниченное множество последних id (deque + set), общая
+    таблица SQLite ловит повторы, которые пришли в другой воркер. Telegram
+    перестает повторять доставку через сутки, более старые id удаляются.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, connection, limit=1000):
+        self.db = connection
+        self._lock = threading.Lock()
+        self._order = deque(maxlen=limit)
+        self._ids = set()
+        self._inserted = 0
+        self.db.execute('CREATE TABLE IF NOT EXISTS webhook_updates (update_id INTEGER PRIMARY KEY, received INTEGER)')
+
+    def seen(self, update_id):
+        """True, если обновление уже приходило; иначе запоминает его"""
+        with self._lock:
+            if update_id in self._ids:
+                return True
+            if len(self._order) == self._order.maxlen:
+                self._ids.discard(self._order[0])
+            self._order.append(update_id)
+            self._ids.add(update_id)
+            
+            now = int(time.time())
+            cursor = self.db.execute('INSERT OR IGNORE INTO webhook_updates VALUES (?, ?)', (update_id, now))
+            if cursor.rowcount == 0:
+                return True
+            self._inserted += 1
+            if self._inserted % self.PRUNE_EVERY == 0:
+                self.db.execute('DELETE FROM webhook_updates WHERE received < ?', (now - 86400,))
+            return False
+
+class JobQueue:
+    """Фоновые задачи веб-воркера: обработчик запроса только ставит задачу и сразу отвечает
+    
+    Потоки запускаются при первой задаче (уже после fork в gunicorn).
+    """
+
+    def __init__(self, workers=2, maxsize=1000):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._started = False
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """Поставить задачу; False, если очередь переполнена"""
+        self._start()
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            logger.error(f"❌ Очередь задач переполнена, задача {func.__name__} отброшена")
+            return False
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f'jobs-{index}', daemon=True).start()
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
             try:
-                # 1. Проверяем статус продавца (ОНЛАЙН/ОФФЛАЙН)
-                seller_online = False
-                
-                # Ищем статус продавца
-                status_elem = card.find('div', class_='media-user-status')
-                if status_elem:
-                    status_text = status_elem.get_text(strip=True)
-                    if 'Онлайн' in status_text or 'online' in status_text.lower():
-                        seller_online = True
-                        online_count += 1
-                    else:
-                        offline_count += 1
-                        continue  # Пропускаем офлайн
-                else:
-                    # Если статус не найден, пропускаем для безопасности
-                    continue
-                
-                # 2. Извлекаем название товара
-                title_elem = card.find('div', class_='tc-desc-text')
-                if not title_elem:
-                    continue
-                
-                title = title_elem.get_text(strip=True)
-                
-                # 3. Фильтруем ТОЛЬКО Black Russia
-                title_lower = title.lower()
-                keywords = [
-                    'black russia', 
-                    'blackrussia', 
-                    'блек раша',
-                    'блек рашн',
-                    'блэк раша',
-                    'br ',
-                    'бр ',
-                    'black s',
-                    'blacks'
-                ]
-                
-                if not any(keyword in title_lower for keyword in keywords):
-                    continue
-                
-                # 4. Извлекаем цену
-                price_elem = card.find('div', class_='tc-price')
-                if not price_elem:
-                    continue
-                
-                price_text = price_elem.get_text(strip=True)
-                
-                # Извлекаем цифры из цены
-                digits = re.findall(r'\d+', price_text.replace(' ', ''))
-                if not digits:
-                    continue
-                
-                price = int(''.join(digits))
-                
-                # Фильтр по цене (от 10 до 50000 руб)
-                if price < 10 or price > 50000:
-                    continue
-                
-                # 5. Извлекаем ссылку на товар
-                link = url
-                link_elem = card.find('a')
-                if link_elem and link_elem.get('href'):
-                    href = link_elem['href']
-                    if href.startswith('/'):
-                        link = f"https://funpay.com{href}"
-                    elif href.startswith('http'):
-                        link = href
-                
-                # 6. Создаем уникальный ID для товара
-                item_id = f"{hash(title)}_{price}_{hash(link)}"
-                
-                # 7. Добавляем товар в список
-                items.append({
-                    'id': item_id,
-                    'title': title[:100],
-                    'price': price,
-                    'link': link,
-                    'category': category,
-                    'seller_online': seller_online
-                })
-                
-                logger.info(f"   ✅ [ОНЛАЙН] '{title[:50]}...' - {price} руб.")
-                
+                func(*args)
             except Exception as e:
-                logger.warning(f"⚠️ Ошибка обработки карточки: {e}")
-                continue
-        
-        logger.info(f"📊 Статистика парсинга:")
-        logger.info(f"   • Онлайн продавцов: {online_count}")
-        logger.info(f"   • Офлайн продавцов: {offline_count}")
-        logger.info(f"   • Black Russia товаров: {len(items)}")
-        
-        return items
-        
+                logger.error(f"❌ Ошибка фоновой задачи {func.__name__}: {e}")
+
+class LeaderLock:
+    """Эксклюзивная блокировка файла: держит ее только процесс-лидер"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def try_acquire(self):
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+class WarmState:
+    """Снимок горячего состояния лидера в файле marshal
+    
+    Память DedupStore, отпечатки списков, расписание опроса, валидаторы и
+    найденные в каталоге разделы читаются за миллисекунды, поэтому проснувшийся
+    инстанс сразу продолжает с того же места, а не прогревается из SQLite и не
+    скачивает все страницы заново. Файл заменяется атомарно; снимок другой
+    версии или старше max_age не используется.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path, max_age=WARM_STATE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.saved_at = 0.0
+
+    def load(self):
+        """Снимок или None, если его нет, он устарел или поврежден"""
+        try:
+            with open(self.path, 'rb') as f:
+                state = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning(f"⚠️ Снимок состояния не прочитан: {e}")
+            return None
+        if not isinstance(state, dict) or state.get('version') != self.VERSION:
+            return None
+        if time.time() - state['saved'] > self.max_age:
+            logger.info("🧊 Снимок состояния устарел, начинаем с базы")
+            return None
+        return state
+
+    def save(self, state):
+        """Атомарно записать снимок"""
+        state = dict(state, version=self.VERSION, saved=time.time())
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            marshal.dump(state, f)
+        os.replace(temporary, self.path)
+        self.saved_at = state['saved']
+
+state_db = open_state_db()
+control = StateChannel(open_state_db())
+leader_lock = LeaderLock(LEADER_LOCK_PATH)
+warm_state = WarmState(WARM_STATE_PATH)
+# Цикл проверки и запись снимка не пересекаются (снимок пишется и при остановке процесса)
+cycle_lock = threading.Lock()
+
+# История цен и журнал событий: пишет лидер, читают все воркеры
+price_history = PriceHistory(open_state_db())
+event_log = EventRing(open_state_db())
+listing_clusters = ListingClusters()
+seller_presence = SellerPresence(open_state_db())
+response_cache = ResponseCache()
+
+# Команды из webhook выполняются в фоне; повторные доставки отбрасываются
+webhook_jobs = JobQueue()
+recent_updates = RecentUpdates(open_state_db())
+
+# Подписчики и их правила; индекс правил перестраивает лидер
+subscriptions = SubscriptionStore(open_state_db(), control)
+rule_index = RuleIndex()
+rules_version = None
+
+# Создаются только в процессе-лидере
+seen_items = None
+listing_diff = None
+
+# Последние найденные товары для страницы статуса
+recent_items = deque(maxlen=20)
+
+def is_monitoring():
+    """Включен ли мониторинг (общий флаг для всех воркеров)"""
+    return bool(control.get('monitoring_active', False))
+
+def set_monitoring(active):
+    """Включить или выключить мониторинг; лидер подхватит изменение за секунду"""
+    control.set('monitoring_active', bool(active))
+
+def monitor_status():
+    """Последний статус, опубликованный лидером"""
+    return control.get('status', {})
+
+def tracked_items_count():
+    """Число отслеживаемых товаров по данным лидера"""
+    return monitor_status().get('items_count', 0)
+
+def monitored_sources():
+    """Отслеживаемые разделы с учетом найденных лидером в каталоге"""
+    return [tuple(source) for source in control.get('sections') or URLS_TO_MONITOR]
+
+def refresh_catalog():
+    """Добавить в опрос новые разделы игр из каталога (в процессе-лидере)"""
+    added = []
+    for spec in categories.discovering():
+        sections = discover_sections(spec.catalog, spec.game)
+        if sections is not None:
+            added += categories.set_discovered(spec.name, sections)
+    for spec in added:
+        logger.info(f"🗂️ Новый раздел каталога: {spec.name} ({spec.url})")
+    if added:
+        sync_sources()
+
+def sync_sources():
+    """Привести опрос к текущему набору категорий: список URL, расписание и разделы для воркеров"""
+    sources = categories.sources()
+    URLS_TO_MONITOR[:] = sources
+    scheduler.sync(sources)
+    control.set('sections', sources)
+
+def invalidate_sources(urls):
+    """Правила категорий urls сменились: забыть валидаторы и отпечатки, опросить и разобрать заново
+    
+    Иначе 304 или тот же отпечаток страницы не дадут применить новые правила,
+    пока не изменится сам список на FunPay.
+    """
+    for url in urls:
+        validator_cache.pop(url, None)
+    for spec in categories.specs.values():
+        if spec.url in urls:
+            listing_diff.snapshots.pop(spec.name, None)
+    scheduler.reset(urls)
+
+def refresh_rule_index():
+    """Перестроить индекс правил, если подписчики или правила изменились"""
+    global rule_index, rules_version
+    version = subscriptions.version()
+    if version != rules_version:
+        rule_index = RuleIndex(subscriptions.rules())
+        rules_version = version
+        logger.info(f"📋 Правил подписчиков: {len(rule_index)}")
+
+def request_check(chat_id=None, wait=0):
+    """Попросить лидера выполнить проверку сейчас
+    
+    Если проверка уже запрошена и еще не завершилась, новый запрос
+    присоединяется к ней: выполняется одна проверка, отчет получают все.
+    chat_id — куда отправить отчет о завершении; wait — сколько секунд ждать
+    завершения. Возвращает True, если проверка завершилась за это время.
+    """
+    def join(current):
+        if current and not current.get('done'):
+            chat_ids = current.setdefault('chat_ids', [])
+            if chat_id is not None and chat_id not in chat_ids:
+                chat_ids.append(chat_id)
+            return current
+        return {'id': f"{os.getpid()}-{time.time_ns()}", 'chat_ids': [] if chat_id is None else [chat_id], 'done': False}
+    
+    request_id = control.update('check_request', join)['id']
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if monitor_status().get('handled_check') == request_id:
+            return True
+        time.sleep(0.2)
+    return False
+
+def publish_status(**extra):
+    """Опубликовать статус лидера для остальных воркеров"""
+    status = monitor_status()
+    status.update({
+        'leader_pid': os.getpid(),
+        'heartbeat': time.time(),
+        'items_count': len(seen_items) if seen_items is not None else 0,
+        'last_cycle': last_cycle_stats,
+        'recent': list(recent_items)[-5:],
+        'schedule': scheduler.snapshot(),
+        'boot': boot_stages,
+        'circuits': open_circuits(),
+    })
+    status.update(extra)
+    control.set('status', status)
+    control.set('metrics', metrics.render())
+    # Новый номер цикла сбрасывает кэш страниц во всех воркерах
+    control.set('cycle_seq', [os.getpid(), cycle_seq])
+
+class SourceSchedule:
+    """Интервал опроса одного URL
+    
+    После опроса с новыми товарами интервал сокращается вдвое, после пустого —
+    растет на 20% (в пределах MIN_INTERVAL..MAX_INTERVAL). Ошибки 429/5xx и
+    таймауты дают экспоненциальную паузу (или Retry-After). К каждой паузе
+    добавляется случайный разброс ±10%.
+    """
+
+    def __init__(self, url, category):
+        self.url = url
+        self.category = category
+        self.interval = BASE_INTERVAL
+        self.failures = 0
+        self.new_rate = 0.0     # сглаженное число новых товаров за опрос
+        self.next_run = 0.0
+
+    def _schedule(self, delay):
+        self.next_run = time.time() + delay * random.uniform(1 - INTERVAL_JITTER, 1 + INTERVAL_JITTER)
+
+    def record_success(self, new_count):
+        self.failures = 0
+        self.new_rate = 0.7 * self.new_rate + 0.3 * new_count
+        if new_count:
+            self.interval = max(MIN_INTERVAL, self.interval / 2)
+        else:
+            self.interval = min(MAX_INTERVAL, self.interval * 1.2)
+        self._schedule(self.interval)
+
+    def record_failure(self, retry_after=0.0):
+        self.failures += 1
+        delay = min(MAX_BACKOFF, self.interval * 2 ** self.failures)
+        self._schedule(max(delay, retry_after))
+
+    def snapshot(self):
+        return {
+            'category': self.category,
+            'interval': round(self.interval, 1),
+            'next_run': datetime.fromtimestamp(self.next_run).isoformat(timespec='seconds') if self.next_run else None,
+            'failures': self.failures,
+            'new_rate': round(self.new_rate, 2),
+        }
+
+class PollScheduler:
+    """Расписание опроса всех отслеживаемых URL"""
+
+    def __init__(self, sources):
+        self.sources = {url: SourceSchedule(url, category) for url, category in sources}
+
+    def due(self, now=None):
+        """Источники, которые пора опросить"""
+        now = now or time.time()
+        return [(source.url, source.category) for source in self.sources.values() if source.next_run <= now]
+
+    def add(self, url, category):
+        """Добавить источник (раздел, найденный в каталоге)"""
+        self.sources.setdefault(url, SourceSchedule(url, category))
+
+    def sync(self, sources):
+        """Оставить в расписании только URL из sources; новые опрашиваются сразу"""
+        urls = {}
+        for url, category in sources:
+            urls.setdefault(url, category)
+        for url in self.sources.keys() - urls.keys():
+            del self.sources[url]
+        for url, category in urls.items():
+            self.add(url, category)
+
+    def reset(self, urls=None):
+        """Опросить источники urls (по умолчанию все) при следующей проверке"""
+        for url, source in self.sources.items():
+            if urls is None or url in urls:
+                source.next_run = 0.0
+
+    def record(self, url, result, new_count):
+        source = self.sources.get(url)
+        if source is None:
+            return
+        if result.ok or result.not_modified:
+            source.record_success(new_count)
+        else:
+            source.record_failure(result.retry_after)
+            logger.warning(f"⏳ {source.category}: ошибка #{source.failures}, следующий опрос {source.snapshot()['next_run']}")
+
+    def snapshot(self):
+        return {url: source.snapshot() for url, source in self.sources.items()}
+
+    def state(self):
+        """Состояние для снимка: url -> (интервал, ошибок подряд, new_rate, next_run)"""
+        return {url: (source.interval, source.failures, source.new_rate, source.next_run)
+                for url, source in self.sources.items()}
+
+    def restore(self, state):
+        """Продолжить расписание известных источников из снимка"""
+        for url, (interval, failures, new_rate, next_run) in state.items():
+            source = self.sources.get(url)
+            if source is not None:
+                source.interval, source.failures, source.new_rate, source.next_run = interval, failures, new_rate, next_run
+
+scheduler = PollScheduler(URLS_TO_MONITOR)
+
+def route_events(category, events, recipients):
+    """Развести события по чатам: основной чат получает цены ниже медианы, подписчики — по своим правилам"""
+    for event in events:
+        item = event['item']
+        chats = {str(chat) for chat in rule_index.match(item)}
+        if price_history.is_good_price(category, item['price']):
+            chats.add(TELEGRAM_CHAT_ID)
+        for chat in chats:
+            recipients.setdefault(chat, []).append(event)
+
+def scan_category(spec, result, cards=None):
+    """Сравнение, история цен и уведомления одной категории загруженной страницы; возвращает число новых товаров"""
+    category = spec.name
+    silent = silent_first_scan and category not in scanned_categories
+    scan = ListingScan(result, spec, listing_diff.known(category), EARLY_STOP_AFTER, cards)
+    try:
+        events = listing_diff.update(category, scan)
+    except EmptyListing as e:
+        # Разметка сменилась, заглушка или обрезанный ответ: не снимаем все товары и продавцов
+        logger.error(f"🕳️ {category}: {e}")
+        fetch_errors.inc(source=result.url, reason='empty')
+        result.error, result.reason = str(e), 'empty'
+        return 0
     except Exception as e:
-        logger.error(f"💥 Критическая ошибка парсинга: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
-        return []
+        logger.error(f"💥 Ошибка разбора {category}: {e}")
+        result.error, result.reason = str(e), 'parse'
+        return 0
+    scanned_categories.add(category)
+    
+    # Дальше по конвейеру идут только изменения списка
+    price_history.record(category, listing_diff.known(category), events)
+    event_log.extend(events, category)
+    came_online = seller_presence.observe(category, {seller: state[0] for seller, state in scan.sellers.items()},
+                                          partial=scan.truncated)
+    recipients = {}
+    new_count = 0
+    candidates = []
+    for event in events:
+        listing_events.inc(source=result.url, type=event['type'])
+        if event['type'] == 'new':
+            new_count += 1
+        item = event['item']
+        if silent or event['type'] not in NOTIFY_EVENTS or (spec.require_online and not item['seller_online']):
+            continue
+        if PRESENCE_ALERTS and event['type'] == 'seller_went_online':
+            continue
+        candidates.append(event)
+    route_events(category, candidates, recipients)
+    if DUP_CLUSTERING:
+        listing_clusters.remove(category, [event['item']['id'] for event in events if event['type'] == 'removed'])
+        recipients = listing_clusters.collapse(category, recipients)
+    if PRESENCE_ALERTS and not silent:
+        # Продавец вышел онлайн — одно уведомление с его самым дешевым товаром, без лишних загрузок
+        route_events(category, [
+            {'type': 'seller_went_online', 'item': scan.sellers[seller][1], 'old_price': None,
+             'seller_offers': scan.sellers[seller][2]}
+            for seller in came_online
+        ], recipients)
+    for item in {event['item']['id']: event['item'] for chat_events in recipients.values() for event in chat_events}.values():
+        recent_items.append(item)
+    dedup_hits.inc(scan.yielded - new_count)
+    if events:
+        logger.info(f"🔀 {category}: " + ", ".join(
+            f"{kind} {sum(event['type'] == kind for event in events)}"
+            for kind in sorted({event['type'] for event in events})
+        ))
+    if silent:
+        logger.info(f"📥 {category}: первая проверка без сохраненного состояния, товары запомнены без уведомлений")
+    
+    # Все события категории за цикл уходят каждому чату одним дайджестом
+    for chat, chat_events in recipients.items():
+        notify_events(chat_events, category, chat_id=chat)
+    return new_count
 
-def check_new_items():
-    """Проверка новых товаров и отправка уведомлений"""
-    global found_items
+def check_new_items(sources=None):
+    """Проверка изменений в разделах и отправка уведомлений
     
-    if not monitoring_active:
-        return
+    sources — список (url, категория) для опроса, по умолчанию все. Каждый URL
+    загружается и разбирается один раз для всех его категорий.
+    Возвращает {url: (FetchResult, число новых товаров)}.
+    """
+    global cycle_seq
+    if not is_monitoring():
+        return {}
     
+    pages = {}
+    for url, category in sources or URLS_TO_MONITOR:
+        pages.setdefault(url, category)
+    refresh_rule_index()
     logger.info("🔍 Начинаем проверку новых товаров...")
+    cycle_started = time.perf_counter()
     
-    # URL для мониторинга
-    urls_to_monitor = [
-        ("https://funpay.com/chips/186/", "Black Russia - Вирты"),
-    ]
-    
-    for url, category in urls_to_monitor:
-        current_items = smart_parse_black_russia(url, category)
+    # Конвейер: загрузка (параллельно, с ограничением) → разбор → фильтр → сравнение
+    outcomes = {}
+    results = []
+    for url, category, result in crawl(pages.items()):
+        results.append(result)
+        specs = categories.for_url(url, category)
+        label = ", ".join(spec.name for spec in specs)
+        logger.info(f"🌐 {label}: HTTP {result.status or '-'} за {result.elapsed:.2f} с")
+        outcomes[url] = (result, 0)
+        if result.not_modified:
+            logger.info(f"💤 {label}: список товаров не изменился, пропускаем разбор")
+            for spec in specs:
+                # Тихие часы тоже получают строку сводки цен — из последнего разбора
+                price_history.record(spec.name, listing_diff.known(spec.name), [])
+                seller_presence.refresh(spec.name)
+            continue
+        if not result.ok:
+            # Ошибку загрузки не считаем исчезновением всех товаров
+            logger.error(f"❌ Ошибка загрузки {url}: {result.error or f'HTTP {result.status}'}")
+            continue
         
-        # Проверяем новые товары
-        for item in current_items:
-            item_id = item['id']
-            if item_id not in found_items:
-                found_items[item_id] = item
-                
-                # Формируем сообщение для Telegram
-                message = (
-                    f"🎮 <b>НОВОЕ ПРЕДЛОЖЕНИЕ {category}</b>\n\n"
-                    f"📦 <b>{item['title']}</b>\n"
-                    f"💰 <b>Цена:</b> {item['price']} руб.\n"
-                    f"🟢 <b>Статус:</b> Продавец онлайн\n"
-                    f"🔗 <a href='{item['link']}'>Открыть на FunPay</a>\n\n"
-                    f"⏰ {datetime.now().strftime('%H:%M:%S')}"
-                )
-                send_telegram_message(message)
+        # Категории одного URL читают карточки одного прохода парсера
+        cards = CardBuffer(specs[0].cards(result.text)) if len(specs) > 1 else None
+        try:
+            new_count = sum(scan_category(spec, result, cards) for spec in specs)
+        except Exception:
+            validator_cache.pop(url, None)
+            raise
+        if not result.ok:
+            # Страница не разобрана: иначе следующая загрузка совпадет с ее отпечатком и будет пропущена
+            validator_cache.pop(url, None)
+        outcomes[url] = (result, new_count)
+        new_items_total.inc(new_count, source=url)
     
-    logger.info(f"📊 Всего отслеживаемых товаров: {len(found_items)}")
+    seen_items.flush()
+    price_history.flush()
+    event_log.flush()
+    seller_presence.flush()
+    if any(result.ok or result.not_modified for result in results):
+        mark_boot('first_scan')
+    
+    cycle_seq += 1
+    cycle_duration = time.perf_counter() - cycle_started
+    cycle_latency.observe(cycle_duration)
+    if cycle_duration > MIN_INTERVAL:
+        cycle_overruns.inc()
+    last_cycle_stats.clear()
+    last_cycle_stats.update({
+        'finished_at': datetime.now().isoformat(),
+        'fetch_seconds': round(sum(result.elapsed for result in results), 3),
+        'cycle_seconds': round(cycle_duration, 3),
+        'urls': {result.url: round(result.elapsed, 3) for result in results},
+        'unchanged': sum(result.not_modified for result in results),
+    })
+    
+    logger.info(f"⏱️ Цикл: загрузка {last_cycle_stats['fetch_seconds']:.2f} с, всего {cycle_duration:.2f} с ({len(results)} URL)")
+    logger.info(f"📊 Всего отслеживаемых товаров: {len(seen_items)}")
+    return outcomes
 
 def monitoring_loop():
-    """Цикл мониторинга"""
-    global monitoring_active
-    
+    """Цикл мониторинга (работает только в процессе-лидере)"""
     logger.info("🔄 Запуск цикла мониторинга...")
     
-    while monitoring_active:
+    global catalog_refreshed_at
+    handled_request = None
+    was_active = False
+    last_heartbeat = 0
+    
+    while True:
         try:
-            check_new_items()
-            # Ждем 60 секунд перед следующей проверкой
-            for _ in range(60):
-                if not monitoring_active:
-                    break
-                time.sleep(1)
+            # Файл категорий перечитывается на лету, без перезапуска мониторинга
+            changed = categories.reload_if_changed()
+            if changed:
+                sync_sources()
+                invalidate_sources(changed)
+            
+            active = is_monitoring()
+            if active and not was_active:
+                logger.info("▶️ Мониторинг включен")
+                scheduler.reset()
+            was_active = active
+            
+            # Каталог обходится после первой проверки, чтобы не откладывать ее при запуске
+            if (active and CATALOG_DISCOVERY and 'first_scan' in boot_stages
+                    and time.time() - catalog_refreshed_at >= CATALOG_REFRESH):
+                catalog_refreshed_at = time.time()
+                refresh_catalog()
+            
+            check_req = control.get('check_request') or {}
+            manual = check_req.get('id') is not None and not check_req.get('done')
+            
+            # Ручная проверка опрашивает все источники, обычная — только те, чей срок подошел
+            due = URLS_TO_MONITOR if manual else (scheduler.due() if active else [])
+            ran = bool(due)
+            found = 0
+            if ran:
+                with cycle_lock:
+                    for url, (result, new_count) in check_new_items(due).items():
+                        scheduler.record(url, result, new_count)
+                        found += new_count
+                    if time.time() - warm_state.saved_at >= WARM_STATE_INTERVAL:
+                        save_warm_state()
+            
+            if manual:
+                # Закрываем запрос атомарно: присоединившиеся позже получат новый
+                finished = control.update(
+                    'check_request',
+                    lambda current: dict(current, done=True) if current and current['id'] == check_req['id'] else current,
+                )
+                handled_request = check_req['id']
+                if finished['id'] == check_req['id']:
+                    for chat_id in finished.get('chat_ids', []):
+                        send_telegram_message(
+                            f"✅ Проверка завершена\nНовых товаров: {found}\nОтслеживается: {len(seen_items)}",
+                            chat_id=chat_id,
+                        )
+            if ran or time.time() - last_heartbeat >= 10:
+                publish_status(handled_check=handled_request)
+                last_heartbeat = time.time()
+            time.sleep(1)
         except Exception as e:
             logger.error(f"❌ Ошибка в цикле мониторинга: {e}")
             time.sleep(30)
 
+def _leader_election():
+    """Ждать блокировку лидера, затем вести мониторинг в этом процессе"""
+    while not leader_lock.try_acquire():
+        time.sleep(LEADER_RETRY_SECONDS)
+    
+    init_leader_state()
+    logger.info(f"👑 Процесс {os.getpid()} ведет мониторинг")
+    monitoring_loop()
+
+def init_leader_state():
+    """Состояние, которое нужно только процессу, ведущему мониторинг
+    
+    Продолжает со снимка горячего состояния, если он есть, и возобновляет
+    мониторинг, если он был включен (или MONITOR_AUTOSTART при первом запуске).
+    """
+    global is_leader, seen_items, listing_diff, silent_first_scan
+    
+    is_leader = True
+    if seen_items is not None:
+        return
+    
+    started = time.perf_counter()
+    warm = warm_state.load() or {}
+    seen_items = DedupStore(state_db, warm=warm.get('seen'))
+    listing_diff = ListingDiff(seen_items)
+    seller_presence.load()
+    # Без сохраненного состояния первая проверка запоминает товары без уведомлений
+    silent_first_scan = len(seen_items) == 0
+    control.set('sections', URLS_TO_MONITOR)
+    if warm:
+        restore_warm_state(warm)
+        logger.info(f"♻️ Состояние из снимка за {(time.perf_counter() - started) * 1000:.0f} мс: "
+                    f"{len(seen_items)} товаров, {len(URLS_TO_MONITOR)} разделов"
+                    + ("" if seen_items.restored else " (отпечатки устарели, страницы загружаются заново)"))
+    
+    if control.get('monitoring_active') is None and warm.get('monitoring', MONITOR_AUTOSTART):
+        set_monitoring(True)
+        logger.info("▶️ Мониторинг возобновлен после перезапуска")
+    atexit.register(save_warm_state_on_exit)
+    mark_boot('leader')
+
+def restore_warm_state(warm):
+    """Разделы, расписание, отпечатки и валидаторы из снимка прошлого процесса"""
+    global catalog_refreshed_at
+    if CATALOG_DISCOVERY:
+        added = [spec for parent, sections in warm['discovered'].items()
+                 for spec in categories.set_discovered(parent, sections)]
+        catalog_refreshed_at = warm['catalog_refreshed']
+        if added:
+            sync_sources()
+    scheduler.restore(warm['schedule'])
+    # Отпечатки и валидаторы верны, только пока хранилище не менялось после снимка
+    if seen_items.restored:
+        listing_diff.snapshots.update(warm['listings'])
+        validator_cache.update(warm['validators'])
+        seller_presence.sources.update(warm.get('presence', {}))
+
+def save_warm_state():
+    """Записать снимок горячего состояния лидера"""
+    try:
+        warm_state.save({
+            'monitoring': is_monitoring(),
+            'seen': seen_items.snapshot(),
+            'listings': listing_diff.snapshots,
+            'validators': validator_cache,
+            'presence': seller_presence.sources,
+            'schedule': scheduler.state(),
+            'discovered': categories.discovered,
+            'catalog_refreshed': catalog_refreshed_at,
+        })
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Снимок состояния не сохранен: {e}")
+
+def save_warm_state_on_exit():
+    """При остановке процесса дождаться конца цикла и сохранить снимок"""
+    if cycle_lock.acquire(timeout=10):
+        try:
+            save_warm_state()
+        finally:
+            cycle_lock.release()
+
+def start_supervisor():
+    """Запуск выбора лидера в фоне (в каждом воркере gunicorn)"""
+    if MONITOR_ROLE == 'web':
+        return
+    thread = threading.Thread(target=_leader_election, name='monitor-leader', daemon=True)
+    thread.start()
+
+start_supervisor()
+
 # Маршруты Flask
 @app.route('/')
+@cached_page
 def index():
+    monitoring_active = is_monitoring()
     return f"""
     <!DOCTYPE html>
     <html>
@@ -259,7 +1141,7 @@ def index():
             <div class="status {'online' if monitoring_active else 'offline'}">
                 <h3>{'✅ Сервис работает' if monitoring_active else '⏸️ Сервис остановлен'}</h3>
                 <p><strong>Мониторинг:</strong> {'🟢 АКТИВЕН' if monitoring_active else '🔴 ОСТАНОВЛЕН'}</p>
-                <p><strong>Найдено товаров:</strong> {len(found_items)}</p>
+                <p><strong>Найдено товаров:</strong> {tracked_items_count()}</p>
                 <p><strong>Время:</strong> {datetime.now().strftime('%H:%M:%S')}</p>
             </div>
             <div>
@@ -274,7 +1156,7 @@ def index():
                 <ol>
                     <li>Нажмите "Тест парсинга" для проверки работы парсера</li>
                     <li>Запустите мониторинг кнопкой "Запустить мониторинг"</li>
-                    <li>Бот будет присылать новые предложения в Telegram каждые 60 секунд</li>
+                    <li>Бот будет присылать новые предложения в Telegram (опрос примерно раз в минуту, чаще при активном рынке)</li>
                     <li>Получайте уведомления только от онлайн продавцов</li>
                 </ol>
                 <p><strong>Telegram команды:</strong> /start, /check, /monitor, /stop, /status, /help</p>
@@ -288,8 +1170,8 @@ def index():
 def test():
     """Тестовая страница для проверки парсинга"""
     try:
-        url = "https://funpay.com/chips/186/"
-        items = smart_parse_black_russia(url, "Black Russia - Вирты")
+        url, category = URLS_TO_MONITOR[0]
+        items = smart_parse_black_russia(url, category)
         
         if items:
             result = f"<h2>✅ Найдено {len(items)} товаров Black Russia:</h2>"
@@ -336,21 +1218,19 @@ def test():
         </body>
         </html>
         """
+    except FetchError as e:
+        return (f"<h2>❌ FunPay недоступен ({e.reason}):</h2><pre>{str(e)}</pre>"
+                f"<p>Товары не проверялись. <a href='/'>← Назад</a></p>")
     except Exception as e:
         return f"<h2>❌ Ошибка:</h2><pre>{str(e)}</pre><p><a href='/'>← Назад</a></p>"
 
 @app.route('/start_monitor')
 def start_monitor():
     """Запуск мониторинга через браузер"""
-    global monitoring_active, monitoring_thread
-    
-    if not monitoring_active:
-        monitoring_active = True
-        monitoring_thread = threading.Thread(target=monitoring_loop)
-        monitoring_thread.daemon = True
-        monitoring_thread.start()
+    if not is_monitoring():
+        set_monitoring(True)
         
-        send_telegram_message("✅ <b>Мониторинг запущен!</b>\n\nЯ буду присылать новые предложения Black Russia каждые 60 секунд.")
+        send_telegram_message("✅ <b>Мониторинг запущен!</b>\n\nЯ буду присылать новые предложения Black Russia (опрос примерно раз в минуту, чаще при активном рынке).")
         
         return """
         <!DOCTYPE html>
@@ -367,7 +1247,7 @@ def start_monitor():
             <div class="success">
                 <h2>✅ Мониторинг запущен!</h2>
                 <p>Бот начал отслеживать новые предложения Black Russia.</p>
-                <p>Проверка будет выполняться каждые 60 секунд.</p>
+                <p>Проверка будет выполняться примерно раз в минуту, чаще при активном рынке.</p>
                 <p>Вы получили уведомление в Telegram.</p>
             </div>
             <p><a href="/">← Назад на главную</a></p>
@@ -388,9 +1268,7 @@ def start_monitor():
 @app.route('/stop_monitor')
 def stop_monitor():
     """Остановка мониторинга"""
-    global monitoring_active
-    
-    monitoring_active = False
+    set_monitoring(False)
     
     send_telegram_message("⏸️ <b>Мониторинг остановлен</b>")
     
@@ -419,7 +1297,7 @@ def stop_monitor():
 @app.route('/check')
 def manual_check():
     """Ручная проверка"""
-    check_new_items()
+    finished = request_check(wait=CHECK_PAGE_WAIT)
     
     return f"""
     <!DOCTYPE html>
@@ -434,9 +1312,9 @@ def manual_check():
     </head>
     <body>
         <div class="info">
-            <h2>🔍 Проверка выполнена</h2>
-            <p>Проверено на наличие новых предложений.</p>
-            <p><strong>Всего отслеживаемых товаров:</strong> {len(found_items)}</p>
+            <h2>{'🔍 Проверка выполнена' if finished else '⏳ Проверка запущена'}</h2>
+            <p>{'Проверено на наличие новых предложений.' if finished else 'Проверка еще идет, результаты придут в Telegram.'}</p>
+            <p><strong>Всего отслеживаемых товаров:</strong> {tracked_items_count()}</p>
         </div>
         <p><a href="/">← Назад на главную</a></p>
     </body>
@@ -444,15 +1322,34 @@ def manual_check():
     """
 
 @app.route('/status')
+@cached_page
 def status_page():
     """Страница статуса"""
-    status_text = "🟢 АКТИВЕН" if monitoring_active else "🔴 ОСТАНОВЛЕН"
+    status_text = "🟢 АКТИВЕН" if is_monitoring() else "🔴 ОСТАНОВЛЕН"
+    status = monitor_status()
+    items_count = status.get('items_count', 0)
+    
+    if status.get('heartbeat'):
+        leader_text = f"PID {status['leader_pid']}, отклик {time.time() - status['heartbeat']:.0f} с назад"
+    else:
+        leader_text = "не запущен"
+    
+    boot = status.get('boot', {})
+    boot_text = ", ".join(f"{stage} {seconds:.1f} с" for stage, seconds in boot.items()) or "нет данных"
     
-    # Получаем последние 5 товаров
-    recent_items = list(found_items.values())[-5:] if found_items else []
+    schedule_html = ""
+    for source in status.get('schedule', {}).values():
+        failures = f", ошибок подряд: {source['failures']}" if source['failures'] else ""
+        schedule_html += (
+            f"<li>{source['category']}: интервал {source['interval']} с, "
+            f"следующий опрос {source['next_run'] or '—'}{failures}</li>"
+        )
+    
+    # Последние 5 товаров публикует процесс-лидер
+    recent = status.get('recent', [])
     
     recent_html = ""
-    for item in recent_items:
+    for item in recent:
         recent_html += f"""
         <div style="border: 1px solid #ddd; padding: 10px; margin: 5px 0; border-radius: 3px;">
             <strong>{item['title'][:50]}...</strong><br>
@@ -475,12 +1372,16 @@ def status_page():
         <h2>📊 Статус системы</h2>
         <div class="status-box">
             <p><strong>Мониторинг:</strong> {status_text}</p>
-            <p><strong>Всего товаров в памяти:</strong> {len(found_items)}</p>
+            <p><strong>Всего товаров в памяти:</strong> {items_count}</p>
+            <p><strong>Процесс мониторинга:</strong> {leader_text}</p>
+            <p><strong>Запуск процесса (от старта до этапа):</strong> {boot_text}</p>
+            <p><strong>Расписание опроса:</strong></p>
+            <ul>{schedule_html or '<li>Нет данных</li>'}</ul>
             <p><strong>Время сервера:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
             <p><strong>Telegram бот:</strong> {'✅ Подключен' if TELEGRAM_BOT_TOKEN else '❌ Не подключен'}</p>
         </div>
         
-        <h3>Последние товары ({len(recent_items)} из {len(found_items)}):</h3>
+        <h3>Последние товары ({len(recent)} из {items_count}):</h3>
         {recent_html if recent_html else '<p>Нет данных</p>'}
         
         <p><a href="/">← Назад на главную</a></p>
@@ -488,82 +1389,193 @@ def status_page():
     </html>
     """
 
+_PRICE_RANGE_RE = re.compile(r'^(\d*)-(\d*)$')
+
+# Команды, доступные любому чату; остальные — только основному TELEGRAM_CHAT_ID
+SUBSCRIPTION_COMMANDS = ('/subscribe', '/rule', '/rules', '/unsubscribe')
+SUBSCRIBER_COMMANDS = ('/start', '/help') + SUBSCRIPTION_COMMANDS
+
+def parse_rule(args):
+    """Правило из аргументов /rule: price=100-500 server=Red category=вирты фраза, фраза"""
+    rule = {'min_price': None, 'max_price': None, 'keywords': [], 'category': None, 'server': None}
+    words = []
+    for token in args.split():
+        key, sep, value = token.partition('=')
+        key = key.lower()
+        if not sep or key not in ('price', 'server', 'category'):
+            words.append(token)
+        elif key == 'price':
+            match = _PRICE_RANGE_RE.match(value)
+            if not match or not any(match.groups()):
+                raise ValueError("цена задается как price=100-500, price=100- или price=-500")
+            low, high = (int(value) if value else None for value in match.groups())
+            if low is not None and high is not None and low > high:
+                raise ValueError("нижняя граница цены больше верхней")
+            rule['min_price'], rule['max_price'] = low, high
+        elif key == 'server':
+            rule['server'] = value
+        else:
+            names = [name for _, name in monitored_sources()]
+            matches = [name for name in names if value.lower() in name.lower()]
+            if len(matches) != 1:
+                raise ValueError("категория не найдена, доступны: " + ", ".join(names))
+            rule['category'] = matches[0]
+    rule['keywords'] = [phrase.strip() for phrase in ' '.join(words).split(',') if phrase.strip()]
+    return rule
+
+def describe_rule(rule):
+    """Правило одной строкой для ответа в чат"""
+    parts = []
+    if rule['min_price'] is not None or rule['max_price'] is not None:
+        parts.append(f"цена {rule['min_price'] or 0}–{rule['max_price'] if rule['max_price'] is not None else '∞'} руб.")
+    if rule['category']:
+        parts.append(f"категория {rule['category']}")
+    if rule['server']:
+        parts.append(f"сервер {rule['server']}")
+    if rule['keywords']:
+        parts.append("слова: " + ", ".join(rule['keywords']))
+    return html.escape("; ".join(parts) or "все товары")
+
+def handle_subscription_command(command, args, chat_id):
+    """Ответ на команды подписки: /subscribe, /rule, /rules, /unsubscribe"""
+    if command == '/subscribe':
+        if not subscriptions.subscribe(chat_id):
+            return "⚠️ Вы уже подписаны. Правила: /rules"
+        return (
+            "✅ <b>Подписка оформлена</b>\n\n"
+            "Добавьте правило, по которому присылать товары:\n"
+            "<code>/rule price=100-500 server=Red category=вирты 10кк, 50кк</code>\n\n"
+            "Все условия необязательны, фразы — через запятую."
+        )
+    
+    if not subscriptions.is_subscribed(chat_id):
+        return "⚠️ Сначала подпишитесь: /subscribe"
+    
+    if command == '/rule':
+        if len(subscriptions.rules(chat_id)) >= MAX_RULES_PER_CHAT:
+            return f"⚠️ Не больше {MAX_RULES_PER_CHAT} правил на чат. Удалите лишние: /unsubscribe &lt;номер&gt;"
+        try:
+            rule = parse_rule(args)
+        except ValueError as e:
+            return f"❌ {html.escape(str(e))}"
+        rule_id = subscriptions.add_rule(chat_id, **rule)
+        return f"✅ Правило #{rule_id}: {describe_rule(rule)}"
+    
+    if command == '/rules':
+        rules = subscriptions.rules(chat_id)
+        if not rules:
+            return "📋 Правил пока нет. Добавьте: /rule price=100-500 10кк"
+        return "📋 <b>Ваши правила</b>\n\n" + "\n".join(
+            f"#{rule['id']}: {describe_rule(rule)}" for rule in rules
+        ) + "\n\nУдалить: /unsubscribe &lt;номер&gt;, отписаться от всего: /unsubscribe"
+    
+    # /unsubscribe [номер правила]
+    if args.strip():
+        if not args.strip().isdigit() or not subscriptions.delete_rule(chat_id, int(args)):
+            return "❌ Правило не найдено. Список: /rules"
+        return f"🗑️ Правило #{int(args)} удалено"
+    subscriptions.unsubscribe(chat_id)
+    return "⏸️ Подписка и все правила удалены"
+
+def handle_command(command, args, chat_id):
+    """Выполнить команду бота (в фоновой очереди, не в запросе webhook)"""
+    if command in SUBSCRIPTION_COMMANDS:
+        send_telegram_message(handle_subscription_command(command, args, chat_id), chat_id=chat_id)
+    
+    elif command == '/start':
+        message = (
+            "🚀 <b>FunPay Hunter для Black Russia</b>\n\n"
+            "Я отслеживаю новые предложения по Black Russia на FunPay.\n\n"
+            "✅ <b>Только онлайн продавцы</b>\n"
+            f"✅ <b>Цены ниже медианы категории за {ALERT_MEDIAN_DAYS} дн.</b>\n"
+            "✅ <b>Снижения цен и продавцы, вышедшие онлайн</b>\n"
+            "✅ <b>Свои правила: цена, сервер, категория, слова</b>\n\n"
+            "📋 <b>Команды:</b>\n"
+            "/start - это сообщение\n"
+            "/help - помощь\n\n"
+            "🔔 <b>Подписка:</b>\n"
+            "/subscribe - получать товары по своим правилам\n"
+            "/rule - добавить правило (цена, сервер, категория, слова)\n"
+            "/rules - мои правила\n"
+            "/unsubscribe - удалить правило или подписку"
+        )
+        if str(chat_id) == TELEGRAM_CHAT_ID:
+            # Управление мониторингом доступно только основному чату
+            message += (
+                "\n\n🛠 <b>Управление:</b>\n"
+                "/check - проверить сейчас\n"
+                "/monitor - запустить мониторинг\n"
+                "/stop - остановить мониторинг\n"
+                "/status - статус системы\n\n"
+                "🌐 <b>Веб-интерфейс:</b>\n"
+                "Откройте в браузере для управления:"
+            )
+        send_telegram_message(message, chat_id=chat_id)
+    
+    elif command == '/check':
+        send_telegram_message("🔍 Проверяю новые предложения...")
+        request_check(chat_id=chat_id)
+    
+    elif command == '/monitor':
+        if not is_monitoring():
+            set_monitoring(True)
+            send_telegram_message("✅ Мониторинг запущен!\nПроверка примерно раз в минуту, чаще при активном рынке.")
+        else:
+            send_telegram_message("⚠️ Мониторинг уже запущен.")
+    
+    elif command == '/stop':
+        set_monitoring(False)
+        send_telegram_message("⏸️ Мониторинг остановлен.")
+    
+    elif command == '/status':
+        status = "🟢 АКТИВЕН" if is_monitoring() else "🔴 ОСТАНОВЛЕН"
+        message = (
+            f"📊 <b>Статус мониторинга</b>\n\n"
+            f"• Мониторинг: {status}\n"
+            f"• Отслеживаемых товаров: {tracked_items_count()}\n"
+            f"• Подписчиков: {subscriptions.subscriber_count()}\n"
+            f"• Время: {datetime.now().strftime('%H:%M:%S')}\n\n"
+            f"🌐 <a href='https://black-russia-monitor.onrender.com/'>Веб-интерфейс</a>"
+        )
+        send_telegram_message(message)
+    
+    elif command == '/help':
+        message = (
+            "❓ <b>Помощь</b>\n\n"
+            "Бот отслеживает новые предложения Black Russia на FunPay.\n\n"
+            "1. Мониторинг запускает основной чат командой /monitor\n"
+            "2. Бот проверяет примерно раз в минуту, чаще при активном рынке\n"
+            "3. Основной чат получает новые товары и снижения цен дешевле медианы "
+            f"категории за {ALERT_MEDIAN_DAYS} дн. (пока история цен не накоплена — все)\n"
+            "4. Отслеживаются только онлайн продавцы\n"
+            "5. Свои условия уведомлений: /subscribe, затем /rule price=100-500 server=Red 10кк\n"
+            "6. Свои правила: /rules, удалить: /unsubscribe &lt;номер&gt;\n\n"
+            "Проблемы? Перезапустите сервис на Render или напишите /start"
+        )
+        send_telegram_message(message, chat_id=chat_id)
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    """Webhook для Telegram бота (для обратной связи)"""
+    """Webhook для Telegram бота: сразу отвечает, команды выполняются в фоне"""
     try:
         data = request.get_json()
         
+        # Telegram повторяет доставку, если не дождался ответа, — повторы пропускаем
+        update_id = data.get('update_id')
+        if update_id is not None and recent_updates.seen(update_id):
+            return jsonify({'status': 'ok', 'duplicate': True})
+        
         if 'message' in data and 'text' in data['message']:
             text = data['message']['text']
             chat_id = data['message']['chat']['id']
+            command, _, args = text.strip().partition(' ')
+            command = command.split('@')[0]
             
-            # Проверяем, что сообщение от нужного чата
-            if str(chat_id) != TELEGRAM_CHAT_ID:
+            # Управлять мониторингом может только основной чат
+            if str(chat_id) != TELEGRAM_CHAT_ID and command not in SUBSCRIBER_COMMANDS:
                 return jsonify({'status': 'error', 'message': 'Unauthorized'}), 403
             
-            if text == '/start':
-                message = (
-                    "🚀 <b>FunPay Hunter для Black Russia</b>\n\n"
-                    "Я отслеживаю новые предложения по Black Russia на FunPay.\n\n"
-                    "✅ <b>Только онлайн продавцы</b>\n"
-                    "✅ <b>Фильтр по цене (10-50000 руб)</b>\n"
-                    "✅ <b>Мгновенные уведомления</b>\n\n"
-                    "📋 <b>Команды:</b>\n"
-                    "/start - это сообщение\n"
-                    "/check - проверить сейчас\n"
-                    "/monitor - запустить мониторинг\n"
-                    "/stop - остановить мониторинг\n"
-                    "/status - статус системы\n"
-                    "/help - помощь\n\n"
-                    "🌐 <b>Веб-интерфейс:</b>\n"
-                    "Откройте в браузере для управления:"
-                )
-                send_telegram_message(message)
-            
-            elif text == '/check':
-                send_telegram_message("🔍 Проверяю новые предложения...")
-                check_new_items()
-                send_telegram_message(f"✅ Проверка завершена\nНайдено товаров: {len(found_items)}")
-            
-            elif text == '/monitor':
-                global monitoring_active
-                if not monitoring_active:
-                    monitoring_active = True
-                    thread = threading.Thread(target=monitoring_loop)
-                    thread.daemon = True
-                    thread.start()
-                    send_telegram_message("✅ Мониторинг запущен!\nПроверка каждые 60 секунд.")
-                else:
-                    send_telegram_message("⚠️ Мониторинг уже запущен.")
-            
-            elif text == '/stop':
-                monitoring_active = False
-                send_telegram_message("⏸️ Мониторинг остановлен.")
-            
-            elif text == '/status':
-                status = "🟢 АКТИВЕН" if monitoring_active else "🔴 ОСТАНОВЛЕН"
-                message = (
-                    f"📊 <b>Статус мониторинга</b>\n\n"
-                    f"• Мониторинг: {status}\n"
-                    f"• Отслеживаемых товаров: {len(found_items)}\n"
-                    f"• Время: {datetime.now().strftime('%H:%M:%S')}\n\n"
-                    f"🌐 <a href='https://black-russia-monitor.onrender.com/'>Веб-интерфейс</a>"
-                )
-                send_telegram_message(message)
-            
-            elif text == '/help':
-                message = (
-                    "❓ <b>Помощь</b>\n\n"
-                    "Бот отслеживает новые предложения Black Russia на FunPay.\n\n"
-                    "1. Нажмите /monitor для запуска автоматического мониторинга\n"
-                    "2. Бот будет проверять каждые 60 секунд\n"
-                    "3. При появлении нового товара вы получите уведомление\n"
-                    "4. Отслеживаются только онлайн продавцы\n"
-                    "5. Цена от 10 до 50000 руб\n\n"
-                    "Проблемы? Перезапустите сервис на Render или напишите /start"
-                )
-                send_telegram_message(message)
+            webhook_jobs.submit(handle_command, command, args, chat_id)
         
         return jsonify({'status': 'ok'})
     
@@ -572,16 +1584,146 @@ def webhook():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/health')
+@cached_page
 def health():
     """Проверка здоровья приложения"""
+    status = monitor_status()
     return jsonify({
         'status': 'healthy',
-        'monitoring': monitoring_active,
-        'items_count': len(found_items),
+        'monitoring': is_monitoring(),
+        'items_count': status.get('items_count', 0),
+        'last_cycle': status.get('last_cycle', {}),
+        'leader_pid': status.get('leader_pid'),
+        'schedule': status.get('schedule', {}),
+        'boot': status.get('boot', {}),
+        'circuits': status.get('circuits', {}),
         'timestamp': datetime.now().isoformat(),
         'version': '1.0'
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Метрики в формате Prometheus (цикл мониторинга — по данным лидера)"""
+    text = metrics.render() if is_leader else control.get('metrics', metrics.render())
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+_WINDOW_UNITS = {'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+def _window_seconds(value, default):
+    """Длина окна из строки вида 24h, 7d, 4w"""
+    value = (value or default).strip().lower()
+    if len(value) < 2 or value[-1] not in _WINDOW_UNITS or not value[:-1].isdigit():
+        raise ValueError(f"неверное окно: {value}")
+    return int(value[:-1]) * _WINDOW_UNITS[value[-1]]
+
+def _limit(value, default, maximum):
+    """Размер страницы из параметра limit: целое от 1, не больше maximum"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit должен быть целым числом") from None
+    if limit < 1:
+        raise ValueError("limit должен быть не меньше 1")
+    return min(limit, maximum)
+
+@app.route('/api/stats')
+def api_stats():
+    """Цены по категориям за окно: минимум, медиана, перцентили (по почасовым сводкам)"""
+    try:
+        window = _window_seconds(request.args.get('window'), '30d')
+        percentiles = tuple(float(value) for value in request.args.get('percentiles', '0.1,0.25,0.5,0.75,0.9').split(','))
+        if not all(0 < value < 1 for value in percentiles):
+            raise ValueError("перцентили должны быть между 0 и 1")
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    now = int(time.time())
+    return jsonify({
+        'window_seconds': window,
+        'from': now - window,
+        'to': now,
+        'categories': price_history.stats(now - window, category=request.args.get('category'),
+                                          percentiles=percentiles),
+    })
+
+@app.route('/api/items')
+def api_items():
+    """Последние события из кольцевого журнала: курсоры before/after, фильтры цены, времени, типа"""
+    args = request.args
+    try:
+        numbers = {
+            name: int(args[name]) if args.get(name) else None
+            for name in ('before', 'after', 'min_price', 'max_price', 'since', 'until')
+        }
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'числовые параметры должны быть целыми'}), 400
+    try:
+        limit = _limit(args.get('limit'), 50, 500)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    items = event_log.query(limit=limit, kind=args.get('type'), category=args.get('category'), **numbers)
+    ascending = numbers['after'] is not None
+    return jsonify({
+        'items': items,
+        # Курсор следующей страницы: before (вглубь истории) или after (новые события)
+        'next_cursor': items[-1]['seq'] if items and len(items) == limit else None,
+        'direction': 'after' if ascending else 'before',
+        'latest': event_log.latest(),
+    })
+
+@app.route('/api/history')
+def api_history():
+    """История цен: наблюдения предложения или продавца, либо почасовой ряд категории"""
+    offer = request.args.get('offer')
+    seller = request.args.get('seller')
+    category = request.args.get('category')
+    try:
+        window = _window_seconds(request.args.get('window'), '7d')
+        limit = _limit(request.args.get('limit'), 1000, 10000)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    since = int(time.time()) - window
+    if offer or seller:
+        rows = price_history.history(since, offer=offer, category=category, seller=seller, limit=limit)
+        return jsonify({
+            'observations': [
+                {'category': row[0], 'offer': row[1], 'seller': row[2], 'price': row[3], 'ts': row[4]}
+                for row in rows
+            ],
+        })
+    if category:
+        return jsonify({
+            'category': category,
+            'series': [
+                {'hour': hour, 'offers': offers, 'min': low, 'median': median, 'max': high}
+                for hour, offers, low, median, high in price_history.series(category, since)
+            ],
+        })
+    return jsonify({'status': 'error', 'message': 'нужен параметр offer, seller или category'}), 400
+
+@app.route('/api/sellers')
+def api_sellers():
+    """Присутствие продавцов: список (online=1 — только онлайн сейчас) или seller= — отрезки и активность по часам"""
+    name = request.args.get('seller')
+    if name:
+        info = seller_presence.seller(name)
+        if info is None:
+            return jsonify({'status': 'error', 'message': 'продавец не встречался'}), 404
+        return jsonify(info)
+    try:
+        limit = _limit(request.args.get('limit'), 100, 1000)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    online = request.args.get('online')
+    sellers = seller_presence.query(online=None if online is None else online == '1', limit=limit)
+    return jsonify({'sellers': sellers, 'count': len(sellers)})
+
+mark_boot('import')
+
 # Запуск приложения
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
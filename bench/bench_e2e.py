@@ -0,0 +1,169 @@
+"""Сквозной офлайн-бенчмарк мониторинга: время цикла, задержка обнаружения, CPU и память
+
+Поднимает локальные FunPay и Telegram (bench.fake_funpay), затем:
+  1. вызывает check_new_items() --cycles раз и замеряет время цикла;
+  2. запускает monitoring_loop() на --duration секунд, пока фейковый FunPay
+     обновляет карточки, и замеряет задержку от появления карточки до уведомления.
+
+Результаты сохраняются в bench/results/<версия>-<время>.json и сравниваются
+с предыдущим сохраненным запуском.
+
+    python -m bench.bench_e2e --cards 300 --churn 0.05 --tick 2 --duration 30
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench.fake_funpay import FakeFunPay
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# Метрики, для которых рост — это регрессия
+REGRESSION_KEYS = ('cycle_p50', 'cycle_p95', 'cpu_per_cycle', 'latency_p50', 'latency_p95', 'peak_rss_mb')
+REGRESSION_THRESHOLD = 0.2
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def git_version():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def configure_environment(fake, args):
+    """Настройки приложения до импорта app: локальные адреса и короткие интервалы"""
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '0:bench',
+        'TELEGRAM_CHAT_ID': '1',
+        'FUNPAY_BASE_URL': fake.base_url,
+        'TELEGRAM_API_URL': fake.telegram_url,
+        'DATA_DIR': tempfile.mkdtemp(prefix='funpay-e2e-'),
+        'MONITOR_ROLE': 'web',
+        'BASE_INTERVAL': str(args.interval),
+        'MIN_INTERVAL': str(max(1, args.interval // 2)),
+        'MAX_INTERVAL': str(args.interval * 2),
+        'TELEGRAM_CHAT_RATE': '100',
+        'TELEGRAM_CHAT_BURST': '100',
+        'TELEGRAM_GLOBAL_RATE': '100',
+    })
+
+def bench_cycles(app, cycles):
+    """Время и CPU на вызов check_new_items()"""
+    durations = []
+    cpu_started = time.process_time()
+    for _ in range(cycles):
+        started = time.perf_counter()
+        app.check_new_items()
+        durations.append(time.perf_counter() - started)
+    return durations, (time.process_time() - cpu_started) / cycles
+
+def bench_loop(app, fake, duration):
+    """Задержка обнаружения при работе monitoring_loop()"""
+    with fake._lock:
+        fake.messages.clear()
+        fake.appeared.clear()
+    threading.Thread(target=app.monitoring_loop, name='bench-monitor', daemon=True).start()
+    time.sleep(duration)
+    # Даем очереди уведомлений отправить последнее
+    deadline = time.time() + 5
+    while app.notifier.depth and time.time() < deadline:
+        time.sleep(0.1)
+    return fake.detection_latencies()
+
+def compare_with_previous(result):
+    """Сравнение с последним сохраненным запуском"""
+    previous_files = sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')), key=os.path.getmtime)
+    if not previous_files:
+        return
+    with open(previous_files[-1], encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nСравнение с {os.path.basename(previous_files[-1])}:")
+    for key in REGRESSION_KEYS:
+        old, new = previous.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        mark = '⚠️ регрессия' if change > REGRESSION_THRESHOLD else ''
+        print(f"  {key:<16}{old:>10.4f} → {new:<10.4f}{change:+8.0%} {mark}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cards', type=int, default=300, help='карточек в разделе')
+    parser.add_argument('--online', type=float, default=0.5, help='доля онлайн-продавцов')
+    parser.add_argument('--churn', type=float, default=0.05, help='доля карточек, заменяемых за тик')
+    parser.add_argument('--tick', type=float, default=2.0, help='секунд между обновлениями FunPay')
+    parser.add_argument('--sections', type=int, default=1, help='число разделов /chips/<id>/')
+    parser.add_argument('--cycles', type=int, default=20, help='вызовов check_new_items() для замера цикла')
+    parser.add_argument('--duration', type=float, default=30, help='секунд работы monitoring_loop()')
+    parser.add_argument('--interval', type=int, default=2, help='базовый интервал опроса, с')
+    parser.add_argument('--no-save', action='store_true', help='не сохранять результат')
+    args = parser.parse_args()
+
+    fake = FakeFunPay(cards=args.cards, online_ratio=args.online, churn=args.churn, tick=args.tick,
+                      sections=range(186, 186 + args.sections))
+    configure_environment(fake, args)
+
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    app.URLS_TO_MONITOR[:] = [(f"{fake.base_url}/chips/{section}/", f"Раздел {section}") for section in fake.sections]
+    app.scheduler = app.PollScheduler(app.URLS_TO_MONITOR)
+    app.init_leader_state()
+    app.set_monitoring(True)
+
+    fake.start()
+    cycle_durations, cpu_per_cycle = bench_cycles(app, args.cycles)
+    latencies = bench_loop(app, fake, args.duration)
+
+    result = {
+        'version': git_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': vars(args),
+        'cycle_p50': percentile(cycle_durations, 0.5),
+        'cycle_p95': percentile(cycle_durations, 0.95),
+        'cpu_per_cycle': cpu_per_cycle,
+        'notified_offers': len(latencies),
+        'appeared_offers': len(fake.appeared),
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p95': percentile(latencies, 0.95),
+        'latency_max': max(latencies) if latencies else None,
+        'funpay_requests': fake.requests,
+        'telegram_messages': len(fake.messages),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    fake.stop()
+
+    print(f"Цикл check_new_items(): p50 {result['cycle_p50'] * 1000:.1f} мс, "
+          f"p95 {result['cycle_p95'] * 1000:.1f} мс, CPU {cpu_per_cycle * 1000:.1f} мс")
+    if latencies:
+        print(f"Задержка обнаружения: p50 {result['latency_p50']:.2f} с, p95 {result['latency_p95']:.2f} с, "
+              f"макс. {result['latency_max']:.2f} с ({len(latencies)} из {len(fake.appeared)} новых карточек)")
+    else:
+        print("Задержка обнаружения: уведомлений о новых карточках не было")
+    print(f"Запросов к FunPay: {fake.requests}, сообщений в Telegram: {len(fake.messages)}, "
+          f"пик памяти: {result['peak_rss_mb']:.0f} МБ")
+
+    compare_with_previous(result)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{result['version']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результат сохранен: {path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
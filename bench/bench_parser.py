@@ -0,0 +1,130 @@
+"""Бенчмарк парсера карточек FunPay и сверка с прежним разбором через BeautifulSoup
+
+Запуск из корня репозитория:
+    python -m bench.bench_parser                      # фикстуры и сгенерированная страница на 200 карточек
+    python -m bench.bench_parser page1.html page2.html  # свои сохраненные страницы
+    python -m bench.bench_parser --synthetic 2000     # сгенерированная страница
+
+Перед замером проверяет, что новый разбор дает ровно те же карточки и
+те же товары, что и прежняя реализация на BeautifulSoup (без лимита в 40 карточек).
+Код возврата 1, если результаты расходятся.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:bench')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-bench-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+from bs4 import BeautifulSoup
+
+import app
+import parsing
+from fetch import FetchResult
+from parsing import extract_cards
+from bench.fixtures import synthetic_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+# Настоящие страницы, сохраненные bench.save_page
+SAVED_PAGES = 'funpay_*.html'
+
+def legacy_extract_cards(html):
+    """Карточки так, как их видел прежний парсер на BeautifulSoup"""
+    soup = BeautifulSoup(html, 'html.parser')
+    cards = []
+    for card in soup.find_all('div', class_='tc-item'):
+        fields = {}
+        for field, css_class in (('status', 'media-user-status'), ('seller', 'media-user-name'),
+                                 ('server', 'tc-server'), ('title', 'tc-desc-text'), ('price', 'tc-price')):
+            elem = card.find('div', class_=css_class)
+            fields[field] = elem.get_text(strip=True) if elem else None
+        link_elem = card.find('a')
+        fields['href'] = link_elem.get('href') if link_elem else None
+        fields['has_link'] = link_elem is not None
+        cards.append(fields)
+    return cards
+
+def parse_items(html, extract, url='https://funpay.com/chips/186/', category='Black Russia - Вирты'):
+    """Товары страницы через parse_listing_page с заданным разбором карточек"""
+    original = parsing.iter_cards
+    parsing.iter_cards = lambda page, *selectors: iter(extract(page))
+    try:
+        return app.parse_listing_page(FetchResult(url, 200, html), category)
+    finally:
+        parsing.iter_cards = original
+
+def check_equivalence(name, html):
+    """Сверка нового и прежнего разбора; True, если совпадают"""
+    new_cards = extract_cards(html)
+    old_cards = legacy_extract_cards(html)
+    if new_cards != old_cards:
+        print(f'❌ {name}: карточки расходятся')
+        for index, (new, old) in enumerate(zip(new_cards, old_cards)):
+            if new != old:
+                print(f'   #{index}: новый {new!r}')
+                print(f'   #{index}: старый {old!r}')
+        if len(new_cards) != len(old_cards):
+            print(f'   карточек: новый {len(new_cards)}, старый {len(old_cards)}')
+        return False
+
+    new_items = parse_items(html, extract_cards)
+    old_items = parse_items(html, legacy_extract_cards)
+    if new_items != old_items:
+        print(f'❌ {name}: товары расходятся ({len(new_items)} против {len(old_items)})')
+        return False
+
+    print(f'✅ {name}: {len(new_cards)} карточек, {len(new_items)} товаров совпадают')
+    return True
+
+def measure(extract, html, min_seconds):
+    """Карточек в секунду для функции разбора"""
+    runs = 0
+    cards = 0
+    started = time.perf_counter()
+    while True:
+        cards += len(extract(html))
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return cards / elapsed, elapsed / runs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*', help='сохраненные HTML-страницы FunPay')
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help='добавить сгенерированную страницу с N карточками (без своих страниц — 200)')
+    parser.add_argument('--seconds', type=float, default=2.0, help='длительность замера на страницу')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    pages = args.pages or sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html')))
+    if not args.pages and not glob.glob(os.path.join(FIXTURES_DIR, SAVED_PAGES)):
+        print('⚠️ В bench/fixtures нет сохраненных страниц FunPay (funpay_*.html): замер только на ручной '
+              'и сгенерированной разметке. Добавьте страницу: python -m bench.save_page <URL раздела>')
+    documents = []
+    for path in pages:
+        with open(path, encoding='utf-8') as f:
+            documents.append((os.path.basename(path), f.read()))
+    synthetic = args.synthetic if args.synthetic is not None else (0 if args.pages else 200)
+    if synthetic:
+        documents.append((f'synthetic-{synthetic}', synthetic_page(synthetic)))
+
+    if not all([check_equivalence(name, html) for name, html in documents]):
+        return 1
+
+    print(f"\n{'страница':<28}{'KiB':>8}{'BeautifulSoup':>18}{'ListingExtractor':>20}{'ускорение':>12}")
+    for name, html in documents:
+        old_rate, _ = measure(legacy_extract_cards, html, args.seconds)
+        new_rate, _ = measure(extract_cards, html, args.seconds)
+        print(f"{name:<28}{len(html) / 1024:>8.0f}{old_rate:>14.0f} к/с{new_rate:>16.0f} к/с{new_rate / old_rate:>11.1f}x")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Локальная замена FunPay и Telegram Bot API для офлайн-бенчмарков
+
+Отдает страницы /chips/<id>/ из сохраненных файлов или генерирует их:
+заданное число карточек, доля онлайн-продавцов и скорость обновления
+(доля карточек, заменяемых новыми за тик). Запросы /bot<token>/<метод>
+отвечают как Telegram и запоминают отправленные сообщения.
+
+Запуск отдельно:
+    python -m bench.fake_funpay --port 8081 --cards 300 --online 0.5 --churn 0.05 --tick 5
+затем FUNPAY_BASE_URL=http://127.0.0.1:8081 TELEGRAM_API_URL=http://127.0.0.1:8081/bot.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from bench.fixtures import SERVERS, TITLES, make_card, make_nav, render_page
+
+_CHIPS_PATH_RE = re.compile(r'^/(?:chips|lots)/(\d+)/?(?:\?.*)?$')
+_TELEGRAM_PATH_RE = re.compile(r'^/bot([^/]+)/(\w+)$')
+_OFFER_ID_RE = re.compile(r'[?&]id=(\d+)')
+
+class Offer:
+    """Карточка синтетического раздела"""
+
+    __slots__ = ('offer_id', 'title', 'price', 'online', 'seller', 'server', 'appeared_at')
+
+    def __init__(self, rng, offer_id, online_ratio):
+        self.offer_id = offer_id
+        self.title = rng.choice(TITLES).format(amount=rng.choice([1, 3, 5, 10, 50, 100]), server=rng.choice(SERVERS))
+        self.price = rng.choice([rng.randint(10, 5000), rng.randint(10, 60000)])
+        self.online = rng.random() < online_ratio
+        self.seller = f'seller{rng.randint(1, 400)}'
+        self.server = rng.choice(SERVERS)
+        self.appeared_at = time.time()
+
+    def html(self):
+        return make_card(self.offer_id, self.title, self.price, self.online, self.seller, self.server)
+
+class Section:
+    """Раздел /chips/<id>/: набор карточек, который обновляется по тикам"""
+
+    def __init__(self, section_id, cards, online_ratio, churn, seed, next_id):
+        self.section_id = section_id
+        self.online_ratio = online_ratio
+        self.churn = churn
+        self.rng = random.Random(seed)
+        self._next_id = next_id
+        self.nav = ''
+        self.offers = [self._new_offer() for _ in range(cards)]
+        for offer in self.offers:
+            offer.appeared_at = 0.0      # начальные карточки не участвуют в замере задержки
+        self._render()
+
+    def _new_offer(self):
+        return Offer(self.rng, self._next_id(), self.online_ratio)
+
+    def _render(self):
+        self.page = render_page((offer.html() for offer in self.offers), nav=self.nav)
+        self.etag = '"' + hashlib.md5(self.page.encode('utf-8')).hexdigest() + '"'
+
+    def tick(self):
+        """Заменить долю churn карточек новыми (новые встают в начало списка)"""
+        replace = int(round(len(self.offers) * self.churn))
+        if not replace:
+            return []
+        for _ in range(replace):
+            self.offers.pop(self.rng.randrange(len(self.offers)))
+        fresh = [self._new_offer() for _ in range(replace)]
+        self.offers[:0] = fresh
+        self._render()
+        return fresh
+
+class FakeFunPay:
+    """Фейковые FunPay и Telegram на одном HTTP-сервере"""
+
+    def __init__(self, port=0, cards=200, online_ratio=0.5, churn=0.0, tick=5.0,
+                 sections=(186,), pages=None, etag=True, seed=186):
+        self.tick_interval = tick
+        self.etag = etag
+        self.pages = dict(pages or {})
+        self.messages = []
+        self.appeared = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._ids = iter(range(20_000_000, 2**31))
+        self.sections = {
+            str(section_id): Section(str(section_id), cards, online_ratio, churn, seed + index, self._next_id)
+            for index, section_id in enumerate(sections)
+        }
+        # Каждая страница раздела ссылается на все разделы, как на FunPay
+        nav = make_nav([(f'/chips/{section_id}/', f'Раздел {section_id}', len(section.offers))
+                        for section_id, section in self.sections.items()])
+        for section in self.sections.values():
+            section.nav = nav
+            section._render()
+        self._stop = threading.Event()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self.telegram_url = f'{self.base_url}/bot'
+
+    def _next_id(self):
+        return next(self._ids)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-funpay', daemon=True).start()
+        if any(section.churn for section in self.sections.values()):
+            threading.Thread(target=self._churn_loop, name='fake-funpay-churn', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _churn_loop(self):
+        while not self._stop.wait(self.tick_interval):
+            with self._lock:
+                for section in self.sections.values():
+                    for offer in section.tick():
+                        self.appeared[str(offer.offer_id)] = offer.appeared_at
+
+    def detection_latencies(self):
+        """Задержки от появления карточки до первого уведомления о ней, в секундах"""
+        with self._lock:
+            messages = list(self.messages)
+            appeared = dict(self.appeared)
+        first_seen = {}
+        for received_at, _, text in messages:
+            for offer_id in _OFFER_ID_RE.findall(text):
+                first_seen.setdefault(offer_id, received_at)
+        return sorted(first_seen[offer_id] - appeared[offer_id] for offer_id in first_seen if offer_id in appeared)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, code, body, content_type, headers=None):
+                payload = body.encode('utf-8') if isinstance(body, str) else body
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            def do_GET(self):
+                match = _CHIPS_PATH_RE.match(self.path)
+                if not match:
+                    telegram = _TELEGRAM_PATH_RE.match(self.path.split('?')[0])
+                    if telegram:
+                        return self._telegram(telegram.group(2), {})
+                    return self._send(404, 'not found', 'text/plain')
+                section_id = match.group(1)
+                with fake._lock:
+                    fake.requests += 1
+                    section = fake.sections.get(section_id)
+                    page, etag = (section.page, section.etag) if section else (None, None)
+                if section_id in fake.pages:
+                    return self._send(200, fake.pages[section_id], 'text/html; charset=utf-8')
+                if section is None:
+                    return self._send(404, 'not found', 'text/plain')
+                if fake.etag and self.headers.get('If-None-Match') == etag:
+                    return self._send(304, b'', 'text/html; charset=utf-8', {'ETag': etag})
+                return self._send(200, page, 'text/html; charset=utf-8', {'ETag': etag} if fake.etag else None)
+
+            def do_POST(self):
+                match = _TELEGRAM_PATH_RE.match(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8', 'replace')
+                if not match:
+                    return self._send(404, 'not found', 'text/plain')
+                if 'json' in (self.headers.get('Content-Type') or ''):
+                    params = json.loads(body or '{}')
+                else:
+                    params = {key: values[-1] for key, values in parse_qs(body).items()}
+                return self._telegram(match.group(2), params)
+
+            def _telegram(self, method, params):
+                now = time.time()
+                if method == 'sendMessage':
+                    with fake._lock:
+                        fake.messages.append((now, str(params.get('chat_id')), params.get('text', '')))
+                        message_id = len(fake.messages)
+                    result = {
+                        'message_id': message_id,
+                        'date': int(now),
+                        'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+                        'text': params.get('text', ''),
+                    }
+                elif method == 'getMe':
+                    result = {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+                else:
+                    result = True
+                return self._send(200, json.dumps({'ok': True, 'result': result}), 'application/json')
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--cards', type=int, default=200, help='карточек в разделе')
+    parser.add_argument('--online', type=float, default=0.5, help='доля онлайн-продавцов')
+    parser.add_argument('--churn', type=float, default=0.05, help='доля карточек, заменяемых за тик')
+    parser.add_argument('--tick', type=float, default=5.0, help='секунд между тиками')
+    parser.add_argument('--sections', default='186', help='id разделов через запятую')
+    parser.add_argument('--page', action='append', default=[], metavar='ID=FILE',
+                        help='отдавать сохраненную страницу для раздела')
+    parser.add_argument('--no-etag', action='store_true', help='не отдавать ETag и 304')
+    args = parser.parse_args()
+
+    pages = {}
+    for spec in args.page:
+        section_id, path = spec.split('=', 1)
+        with open(path, encoding='utf-8') as f:
+            pages[section_id] = f.read()
+
+    fake = FakeFunPay(args.port, args.cards, args.online, args.churn, args.tick,
+                      [int(section) for section in args.sections.split(',')], pages, not args.no_etag).start()
+    print(f'FUNPAY_BASE_URL={fake.base_url} TELEGRAM_API_URL={fake.telegram_url}')
+    try:
+        while True:
+            time.sleep(60)
+            print(f'запросов страниц: {fake.requests}, сообщений Telegram: {len(fake.messages)}')
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == '__main__':
+    main()
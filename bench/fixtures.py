@@ -0,0 +1,85 @@
+"""Синтетические страницы FunPay для бенчмарков и офлайн-проверок парсера"""
+import random
+from html import escape
+
+TITLES = [
+    'Вирты Black Russia {amount}кк, быстрая выдача',
+    'BLACK RUSSIA вирты {amount} кк | сервер {server}',
+    'Блек раша вирты {amount}кк — моментально',
+    'Блэк раша {amount}кк на любой сервер',
+    'Вирты BR {amount}кк',
+    'Вирты на сервер {server} бр {amount}кк',
+    'BlackRussia {amount}kk &amp; бонус',
+    'Black Russia <b>{amount}кк</b> + подарок',
+    'Вирты Radmir RP {amount}кк',
+    'Arizona RP {amount}кк, гарант',
+    'Amazing Online {amount}кк',
+]
+
+SERVERS = ['Red', 'Green', 'Blue', 'Yellow', 'Orange', 'Purple', 'Lime', 'Pink', 'Cherry', 'Black']
+
+PAGE_HEAD = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>Black Russia — Вирты — FunPay</title>
+<link rel="stylesheet" href="/css/app.css">
+<script>window._csrf = "{token}"; var config = {{"locale": "ru"}};</script>
+</head>
+<body data-app-data='{{"csrf-token":"{token}"}}'>
+<div class="wrapper">
+<header class="navbar"><a class="navbar-brand" href="/">FunPay</a>
+<ul class="dropdown-menu"><li><a href="/chips/1/">Arizona RP</a></li><li><a href="/lots/2/">Radmir RP</a></li></ul></header>
+<div class="content-with-cd">
+{nav}<div class="tc table-hover table-clickable tc-short showcase-table tc-lazyload tc-sortable">
+<div class="tc-header"><div class="tc-server">Сервер</div><div class="tc-user">Продавец</div><div class="tc-price">Цена</div></div>
+"""
+
+PAGE_TAIL = """</div>
+</div>
+<footer class="footer"><p>© FunPay, {year}</p><img src="/img/logo.png" alt="logo"></footer>
+</div>
+</body>
+</html>
+"""
+
+def make_card(offer_id, title, price, online, seller, server='Red'):
+    """HTML одной карточки товара"""
+    status = 'Онлайн' if online else 'Был 3 часа назад'
+    price_text = f'{price:,}'.replace(',', ' ')
+    return (
+        f'<div class="tc-item" data-online="{int(online)}">\n'
+        f'<a href="/chips/offer?id={offer_id}" class="tc-link">\n'
+        f'<div class="tc-server">{escape(server)}</div>\n'
+        f'<div class="tc-desc"><div class="tc-desc-text">{title}</div></div>\n'
+        f'<div class="tc-user"><div class="media media-user{" online" if online else ""}">'
+        f'<div class="media-body"><div class="media-user-name">{escape(seller)}</div>'
+        f'<div class="media-user-status">{status}</div></div></div></div>\n'
+        f'<div class="tc-price" data-s="{price}">{price_text} <span class="unit">₽</span></div>\n'
+        '</a>\n</div>\n'
+    )
+
+def random_card(rng, offer_id, online_ratio=0.5):
+    """Случайная карточка в духе настоящего списка FunPay"""
+    title = rng.choice(TITLES).format(amount=rng.choice([1, 3, 5, 10, 50, 100]), server=rng.choice(SERVERS))
+    price = rng.choice([rng.randint(1, 9), rng.randint(10, 5000), rng.randint(10, 60000)])
+    seller = f'seller{rng.randint(1, 400)}'
+    return make_card(offer_id, title, price, rng.random() < online_ratio, seller, rng.choice(SERVERS))
+
+def make_nav(sections):
+    """Список разделов игры div.counter-list: sections — [(путь, название, число предложений)]"""
+    links = ''.join(
+        f'<a href="{path}" class="counter-item"><div class="counter-param">{escape(name)}</div>'
+        f'<div class="counter-value">{count}</div></a>'
+        for path, name, count in sections
+    )
+    return f'<div class="counter-list">{links}</div>\n'
+
+def render_page(cards_html, token='x' * 32, nav=''):
+    """Полная страница раздела с переданными карточками"""
+    return PAGE_HEAD.format(token=token, nav=nav) + ''.join(cards_html) + PAGE_TAIL.format(year=2024)
+
+def synthetic_page(n_cards, online_ratio=0.5, seed=186):
+    """Страница со случайными n_cards карточками"""
+    rng = random.Random(seed)
+    return render_page(random_card(rng, 10_000_000 + i, online_ratio) for i in range(n_cards))
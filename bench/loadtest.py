@@ -0,0 +1,294 @@
+"""Нагрузочный тест веб-приложения под gunicorn во время работы мониторинга
+
+Поднимает локальные FunPay и Telegram (bench.fake_funpay), запускает
+`gunicorn app:app` с мониторингом, включенным с первого запуска, и --concurrency
+клиентов посылают запросы по смеси --mix (маршрут=вес): страницы статуса,
+/health, как от пингеров аптайма, и обновления Telegram в /webhook с командами
+основного чата и подписчиков (доля --redeliver — повторные доставки того же update_id).
+Для каждого маршрута выводятся p50/p95/p99, пропускная способность и доля ошибок;
+результат сохраняется в bench/results/loadtest/ и сравнивается с предыдущим запуском.
+
+    python -m bench.loadtest --duration 30 --concurrency 16
+    python -m bench.loadtest --workers 2 --threads 4 --mix "/=1,/status=2,/health=5,/webhook=4" --rate 200
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench.bench_e2e import RESULTS_DIR, git_version, percentile
+from bench.fake_funpay import FakeFunPay
+
+LOADTEST_DIR = os.path.join(RESULTS_DIR, 'loadtest')
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = '/=1,/status=2,/health=5,/webhook=3'
+CHAT_ID = 1
+
+# Команды основного чата и подписчиков; /check ждет общей проверки, остальные отвечают сразу
+ADMIN_COMMANDS = ('/status', '/help', '/check', '/status', '/help')
+SUBSCRIBER_COMMANDS = ('/subscribe', '/rule price=100-500 вирты', '/rules', '/unsubscribe')
+
+REGRESSION_THRESHOLD = 0.2
+
+def parse_mix(text):
+    """'/=1,/health=5' -> [('/', 1.0), ('/health', 5.0)]"""
+    mix = []
+    for part in text.split(','):
+        route, _, weight = part.strip().partition('=')
+        mix.append((route, float(weight or 1)))
+    return mix
+
+class UpdateFactory:
+    """Обновления Telegram для /webhook: растущие update_id и доля повторных доставок"""
+
+    def __init__(self, redeliver, subscribers, seed):
+        self.redeliver = redeliver
+        self.subscribers = subscribers
+        self.rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._recent = []
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._recent and self.rng.random() < self.redeliver:
+                return self.rng.choice(self._recent)
+            update_id = next(self._ids)
+            if self.subscribers and self.rng.random() < 0.5:
+                chat_id = 1000 + self.rng.randrange(self.subscribers)
+                text = self.rng.choice(SUBSCRIBER_COMMANDS)
+            else:
+                chat_id, text = CHAT_ID, self.rng.choice(ADMIN_COMMANDS)
+            update = {
+                'update_id': update_id,
+                'message': {'message_id': update_id, 'date': int(time.time()), 'text': text,
+                            'chat': {'id': chat_id, 'type': 'private'}},
+            }
+            self._recent = (self._recent + [update])[-100:]
+            return update
+
+class Stats:
+    """Задержки и ошибки по маршрутам"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, elapsed, status):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            self.statuses.setdefault(route, {}).setdefault(status, 0)
+            self.statuses[route][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+def client(base_url, mix, updates, stats, deadline, interval, seed):
+    """Один клиент: запросы по смеси до deadline, не чаще раза в interval секунд"""
+    rng = random.Random(seed)
+    routes = [route for route, _ in mix]
+    weights = [weight for _, weight in mix]
+    session = requests.Session()
+    scheduled = time.perf_counter()
+    while time.time() < deadline:
+        route = rng.choices(routes, weights)[0]
+        started = time.perf_counter()
+        try:
+            if route == '/webhook':
+                response = session.post(base_url + route, json=updates.next(), timeout=30)
+            else:
+                response = session.get(base_url + route, timeout=30)
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        stats.add(route, time.perf_counter() - started, status)
+        if interval:
+            scheduled += interval
+            time.sleep(max(0.0, scheduled - time.perf_counter()))
+
+def start_gunicorn(fake, args, log_path):
+    """gunicorn app:app с локальными FunPay и Telegram; ждет ответа /health"""
+    port = args.port
+    env = dict(os.environ, **{
+        'TELEGRAM_BOT_TOKEN': '0:loadtest',
+        'TELEGRAM_CHAT_ID': str(CHAT_ID),
+        'FUNPAY_BASE_URL': fake.base_url,
+        'TELEGRAM_API_URL': fake.telegram_url,
+        'DATA_DIR': tempfile.mkdtemp(prefix='funpay-loadtest-'),
+        'CATEGORIES_FILE': os.path.join(tempfile.gettempdir(), 'funpay-loadtest-no-categories.json'),
+        'MONITOR_ROLE': 'auto',
+        'MONITOR_AUTOSTART': '1',
+        'BASE_INTERVAL': str(args.interval),
+        'MIN_INTERVAL': str(max(1, args.interval // 2)),
+        'MAX_INTERVAL': str(args.interval * 2),
+        'TELEGRAM_CHAT_RATE': '100',
+        'TELEGRAM_CHAT_BURST': '100',
+        'TELEGRAM_GLOBAL_RATE': '100',
+    })
+    command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--threads', str(args.threads), '--timeout', '120']
+    log = open(log_path, 'w')
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn завершился с кодом {process.returncode}, лог: {log_path}')
+        try:
+            health = requests.get(base_url + '/health', timeout=2).json()
+            if health.get('leader_pid'):
+                return process, base_url
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn не ответил за 60 с, лог: {log_path}')
+
+def report(stats, duration):
+    """Сводка по маршрутам: {маршрут: метрики}"""
+    summary = {}
+    for route, latencies in sorted(stats.latencies.items()):
+        summary[route] = {
+            'requests': len(latencies),
+            'rps': len(latencies) / duration,
+            'error_rate': stats.errors.get(route, 0) / len(latencies),
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies),
+            'statuses': {str(status): count for status, count in stats.statuses[route].items()},
+        }
+    return summary
+
+def compare_with_previous(result):
+    """Сравнение p95/p99 и доли ошибок по маршрутам с последним сохраненным запуском"""
+    previous_files = sorted(glob.glob(os.path.join(LOADTEST_DIR, '*.json')), key=os.path.getmtime)
+    if not previous_files:
+        return
+    with open(previous_files[-1], encoding='utf-8') as f:
+        previous = json.load(f)
+    print(f"\nСравнение с {os.path.basename(previous_files[-1])}:")
+    for route, new in result['routes'].items():
+        old = previous.get('routes', {}).get(route)
+        if not old:
+            continue
+        for key in ('p95', 'p99'):
+            change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+            mark = '⚠️ регрессия' if change > REGRESSION_THRESHOLD else ''
+            print(f"  {route:<10}{key:<5}{old[key] * 1000:>9.1f} → {new[key] * 1000:<9.1f}мс{change:+8.0%} {mark}")
+        if new['error_rate'] > old['error_rate']:
+            print(f"  {route:<10}ошибки {old['error_rate']:.1%} → {new['error_rate']:.1%} ⚠️")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='маршруты и веса: "/=1,/status=2,/health=5,/webhook=3"')
+    parser.add_argument('--concurrency', type=int, default=8, help='одновременных клиентов')
+    parser.add_argument('--rate', type=float, default=0, help='запросов в секунду всего (0 — без ограничения)')
+    parser.add_argument('--duration', type=float, default=20, help='секунд нагрузки')
+    parser.add_argument('--warmup', type=float, default=3, help='секунд работы мониторинга до нагрузки')
+    parser.add_argument('--redeliver', type=float, default=0.1, help='доля повторных доставок обновлений Telegram')
+    parser.add_argument('--subscribers', type=int, default=20, help='чатов-подписчиков, пишущих в /webhook')
+    parser.add_argument('--workers', type=int, default=1, help='воркеров gunicorn (на Render — 1)')
+    parser.add_argument('--threads', type=int, default=1, help='потоков на воркер gunicorn')
+    parser.add_argument('--port', type=int, default=8765, help='порт gunicorn')
+    parser.add_argument('--cards', type=int, default=300, help='карточек в разделе фейкового FunPay')
+    parser.add_argument('--sections', type=int, default=3, help='число разделов /chips/<id>/')
+    parser.add_argument('--churn', type=float, default=0.05, help='доля карточек, заменяемых за тик')
+    parser.add_argument('--interval', type=int, default=2, help='базовый интервал опроса, с')
+    parser.add_argument('--seed', type=int, default=186)
+    parser.add_argument('--no-save', action='store_true', help='не сохранять результат')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    fake = FakeFunPay(cards=args.cards, churn=args.churn, tick=args.interval,
+                      sections=range(186, 186 + args.sections)).start()
+    # Обрывы соединений при остановке gunicorn — не ошибки теста
+    fake.server.handle_error = lambda request, client_address: None
+    log_path = os.path.join(tempfile.gettempdir(), f'funpay-loadtest-{os.getpid()}.log')
+    try:
+        process, base_url = start_gunicorn(fake, args, log_path)
+    except RuntimeError as e:
+        fake.stop()
+        print(e)
+        return 1
+
+    try:
+        time.sleep(args.warmup)
+        requests_before, messages_before = fake.requests, len(fake.messages)
+        stats = Stats()
+        updates = UpdateFactory(args.redeliver, args.subscribers, args.seed)
+        interval = args.concurrency / args.rate if args.rate else 0.0
+        deadline = time.time() + args.duration
+        threads = [
+            threading.Thread(target=client, args=(base_url, mix, updates, stats, deadline, interval, args.seed + index),
+                             daemon=True)
+            for index in range(args.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        health = requests.get(base_url + '/health', timeout=10).json()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fake.stop()
+
+    routes = report(stats, elapsed)
+    total = sum(route['requests'] for route in routes.values())
+    errors = sum(stats.errors.values())
+    result = {
+        'version': git_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': vars(args),
+        'routes': routes,
+        'requests': total,
+        'rps': total / elapsed,
+        'error_rate': errors / total if total else 0.0,
+        'funpay_requests': fake.requests - requests_before,
+        'telegram_messages': len(fake.messages) - messages_before,
+        'last_cycle': health.get('last_cycle', {}),
+    }
+
+    print(f"gunicorn: {args.workers} воркер(ов) × {args.threads} поток(ов), клиентов: {args.concurrency}, "
+          f"{elapsed:.1f} с")
+    print(f"{'маршрут':<10}{'запросов':>9}{'в сек':>8}{'ошибки':>8}{'p50, мс':>9}{'p95, мс':>9}{'p99, мс':>9}{'макс.':>9}")
+    for route, row in routes.items():
+        print(f"{route:<10}{row['requests']:>9}{row['rps']:>8.1f}{row['error_rate']:>8.1%}{row['p50'] * 1000:>9.1f}"
+              f"{row['p95'] * 1000:>9.1f}{row['p99'] * 1000:>9.1f}{row['max'] * 1000:>9.1f}")
+    print(f"Всего: {total} запросов, {result['rps']:.1f} в секунду, ошибок {result['error_rate']:.1%}")
+    print(f"За время нагрузки: запросов к FunPay {result['funpay_requests']}, "
+          f"сообщений в Telegram {result['telegram_messages']}")
+    for route, row in routes.items():
+        failed = {status: count for status, count in row['statuses'].items()
+                  if not status.isdigit() or int(status) >= 400}
+        if failed:
+            print(f"  {route}: {failed}")
+
+    compare_with_previous(result)
+    if not args.no_save:
+        os.makedirs(LOADTEST_DIR, exist_ok=True)
+        path = os.path.join(LOADTEST_DIR, f"{result['version']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Результат сохранен: {path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Прогон мониторинга по архиву ответов FunPay без сети
+
+Архив пишется в рабочем сервисе с CAPTURE_MODE=record (каталог CAPTURE_DIR,
+по умолчанию $DATA_DIR/capture). Здесь он воспроизводится через
+check_new_items(): каждый URL получает свои ответы в порядке записи, Telegram
+подменяется локальной заглушкой из bench.fake_funpay.
+
+    python -m bench.replay data/capture                 # как можно быстрее
+    python -m bench.replay data/capture --realtime      # с исходными интервалами
+    python -m bench.replay data/capture --profile       # cProfile самых дорогих функций
+    python -m bench.replay data/capture --list          # содержимое архива
+"""
+import argparse
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from bench.fake_funpay import FakeFunPay
+
+def list_archive(archive):
+    for index in range(len(archive)):
+        record = archive.read(index)
+        print(f"{index:>6}  {datetime.fromtimestamp(record['ts']):%Y-%m-%d %H:%M:%S}  "
+              f"HTTP {record['status']}  {len(record['body']) / 1024:>7.1f} KiB  {record['url']}")
+
+def recorded_sources(archive):
+    """URL архива в порядке первого появления"""
+    urls = {}
+    for index in range(len(archive)):
+        urls.setdefault(archive.read(index)['url'], None)
+    return list(urls)
+
+def replay(app, sources):
+    """check_new_items() по архиву, пока у всех URL не кончатся ответы"""
+    cycles = 0
+    pages = 0
+    durations = []
+    events = Counter()
+    while True:
+        started = time.perf_counter()
+        outcomes = app.check_new_items(sources)
+        replayed = [result for result, _ in outcomes.values() if not result.error]
+        if not replayed:
+            break
+        durations.append(time.perf_counter() - started)
+        cycles += 1
+        pages += len(replayed)
+    for line in app.metrics.render().splitlines():
+        if line.startswith('funpay_listing_events_total{'):
+            kind = line.split('type="', 1)[1].split('"', 1)[0]
+            events[kind] += int(float(line.rsplit(' ', 1)[1]))
+    return cycles, pages, durations, events
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('capture_dir', help='каталог архива (capture.dat и capture.idx)')
+    parser.add_argument('--realtime', action='store_true', help='соблюдать исходные интервалы между ответами')
+    parser.add_argument('--profile', action='store_true', help='показать cProfile самых дорогих функций')
+    parser.add_argument('--list', action='store_true', help='только показать записи архива')
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(args.capture_dir, 'capture.idx')):
+        print(f"Архив не найден: {args.capture_dir}")
+        return 1
+
+    telegram = FakeFunPay(sections=()).start()
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '0:replay',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_API_URL': telegram.telegram_url,
+        'DATA_DIR': tempfile.mkdtemp(prefix='funpay-replay-'),
+        'MONITOR_ROLE': 'web',
+        'CATALOG_DISCOVERY': '0',
+        'CAPTURE_MODE': 'replay',
+        'CAPTURE_DIR': args.capture_dir,
+        'CAPTURE_REALTIME': '1' if args.realtime else '0',
+        'TELEGRAM_CHAT_RATE': '1000',
+        'TELEGRAM_CHAT_BURST': '1000',
+        'TELEGRAM_GLOBAL_RATE': '1000',
+    })
+
+    import app
+    import fetch
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    archive = fetch.capture_archive
+    if args.list:
+        list_archive(archive)
+        return 0
+
+    urls = recorded_sources(archive)
+    sources = [(url, f"Архив {urlsplit(url).path}") for url in urls]
+    app.URLS_TO_MONITOR[:] = sources
+    app.init_leader_state()
+    app.set_monitoring(True)
+
+    profiler = cProfile.Profile() if args.profile else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    cycles, pages, durations, events = replay(app, sources)
+    if profiler:
+        profiler.disable()
+    total = time.perf_counter() - started
+    deadline = time.time() + 5
+    while app.notifier.depth and time.time() < deadline:
+        time.sleep(0.1)
+    telegram.stop()
+
+    print(f"Записей в архиве: {len(archive)}, URL: {len(urls)}")
+    print(f"Циклов: {cycles}, страниц: {pages}, за {total:.2f} с"
+          + (f" ({pages / total:.0f} стр/с)" if total else ""))
+    if durations:
+        durations.sort()
+        print(f"Цикл: p50 {durations[len(durations) // 2] * 1000:.1f} мс, макс. {durations[-1] * 1000:.1f} мс")
+    print("События: " + (", ".join(f"{kind} {count}" for kind, count in sorted(events.items())) or "нет"))
+    print(f"Сообщений в Telegram: {len(telegram.messages)}")
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Сохранить настоящую страницу FunPay как фикстуру парсера, без личных данных
+
+    python -m bench.save_page https://funpay.com/chips/186/      # загрузить страницу
+    python -m bench.save_page --input page.html                  # страница, сохраненная из браузера
+    python -m bench.save_page --capture data/capture             # последний ответ 200 из архива CAPTURE_MODE=record
+
+Страница пишется в bench/fixtures/funpay_<раздел>.html (или --output). Перед записью
+имена продавцов заменяются на seller1..N (одинаковые имена — одинаково), номера
+профилей /users/<id>/ — на порядковые, удаляются аватары, CSRF-токены и содержимое
+<script>. Разметка карточек остается как есть: фикстура проверяет парсер на
+настоящей верстке (bench.bench_parser и tests/test_parser.py).
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+_SELLER_NAME_RE = re.compile(r'(<div\b[^>]*\bmedia-user-name\b[^>]*>)(.*?)(</div>)', re.IGNORECASE | re.DOTALL)
+_TEXT_RE = re.compile(r'>([^<]+)<')
+_USER_ID_RE = re.compile(r'/users/(\d+)/')
+_USER_ATTR_RE = re.compile(r'''(\bdata-(?:user|seller|uid)[\w-]*=["'])[^"']*(["'])''', re.IGNORECASE)
+_AVATAR_RE = re.compile(r'''(url\(|src=["'])[^)"']*avatar[^)"']*''', re.IGNORECASE)
+_SCRIPT_RE = re.compile(r'(<script\b[^>]*>).*?(</script>)', re.IGNORECASE | re.DOTALL)
+_TOKEN_RE = re.compile(r'''(\b(?:data-app-data|content)=)(["'])[^"']*csrf[^"']*\2''', re.IGNORECASE)
+_CSRF_META_RE = re.compile(r'''(<meta\b[^>]*name=["']csrf-token["'][^>]*content=["'])[^"']*''', re.IGNORECASE)
+
+class Scrubber:
+    """Замена личных данных страницы на стабильные псевдонимы"""
+
+    def __init__(self):
+        self.names = {}
+        self.user_ids = {}
+
+    def _alias(self, table, value, prefix):
+        return table.setdefault(value, f'{prefix}{len(table) + 1}')
+
+    def _seller(self, match):
+        opening, inner, closing = match.groups()
+        name = ' '.join(''.join(_TEXT_RE.findall(f'>{inner}<')).split())
+        alias = self._alias(self.names, name, 'seller')
+        # Меняется только текст: вложенные теги остаются, как на FunPay
+        inner = _TEXT_RE.sub(lambda text: f'>{alias}<' if text.group(1).strip() else text.group(0), f'>{inner}<')[1:-1]
+        return opening + inner + closing
+
+    def scrub(self, html):
+        html = _SCRIPT_RE.sub(r'\1\2', html)
+        html = _SELLER_NAME_RE.sub(self._seller, html)
+        html = _USER_ID_RE.sub(lambda match: f"/users/{self._alias(self.user_ids, match.group(1), '')}/", html)
+        html = _USER_ATTR_RE.sub(r'\1\2', html)
+        html = _AVATAR_RE.sub(r'\1/img/layout/avatar.png', html)
+        html = _TOKEN_RE.sub(r'\1\2{}\2', html)
+        html = _CSRF_META_RE.sub(r'\1' + 'x' * 32, html)
+        return html
+
+def from_capture(path):
+    """(URL, HTML) последнего ответа 200 из архива"""
+    os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-save-'))
+    from fetch import CaptureArchive
+    archive = CaptureArchive(path)
+    for index in reversed(range(len(archive))):
+        record = archive.read(index)
+        if record['status'] == 200:
+            return record['url'], record['body'].decode(record.get('encoding') or 'utf-8', 'replace')
+    raise ValueError(f'в архиве {path} нет ответов 200')
+
+def default_output(url):
+    section = '_'.join(part for part in url.split('?')[0].split('/')[3:] if part) or 'page'
+    return os.path.join(FIXTURES_DIR, f'funpay_{section}.html')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url', nargs='?', help='адрес раздела FunPay')
+    parser.add_argument('--input', help='HTML, сохраненный из браузера')
+    parser.add_argument('--capture', help='каталог архива CAPTURE_MODE=record')
+    parser.add_argument('--output', help='куда сохранить (по умолчанию bench/fixtures/funpay_<раздел>.html)')
+    args = parser.parse_args()
+
+    if args.capture:
+        url, html = from_capture(args.capture)
+    elif args.input:
+        with open(args.input, encoding='utf-8') as f:
+            html = f.read()
+        url = args.url or 'https://funpay.com/page'
+    elif args.url:
+        response = requests.get(args.url, headers={'User-Agent': USER_AGENT, 'Accept-Language': 'ru-RU,ru;q=0.9'},
+                                timeout=30)
+        response.raise_for_status()
+        url, html = args.url, response.text
+    else:
+        parser.error('нужен URL, --input или --capture')
+
+    scrubber = Scrubber()
+    html = scrubber.scrub(html)
+    output = args.output or default_output(url)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(html)
+    print(f'Сохранено: {output} ({len(html) / 1024:.0f} KiB), продавцов заменено: {len(scrubber.names)}, '
+          f'профилей: {len(scrubber.user_ids)}')
+    print('Проверьте файл на оставшиеся личные данные перед коммитом, затем: python -m bench.bench_parser')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""Сравнение списков товаров между опросами и свертка почти одинаковых предложений"""
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+
+from config import DUP_PRICE_TOLERANCE, DUP_SIMILARITY, DUP_WINDOW
+from metrics import duplicates_suppressed
+from parsing import normalize_text
+
+class EmptyListing(Exception):
+    """Страница без единой карточки там, где в прошлый раз были товары: это сбой загрузки, а не пустой раздел"""
+
+class ListingDiff:
+    """Сравнение списков товаров между опросами
+    
+    Для каждого источника хранится компактный отпечаток предложений
+    (ключ -> (цена, продавец онлайн)), по нему на каждом цикле получаются
+    события: new, price_drop, price_rise, seller_went_online и removed.
+    Дальше по конвейеру идут только изменения. Предложения, которых нет в
+    отпечатке (первый опрос после рестарта), сверяются с хранилищем, чтобы
+    не считать их новыми повторно. Хранилище общее, поэтому ключ в нем
+    включает источник: категории одного раздела получают события независимо.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.snapshots = {}
+
+    def known(self, source):
+        """Отпечаток источника с прошлого опроса (ключ -> (цена, онлайн))"""
+        return self.snapshots.get(source, {})
+
+    def update(self, source, listings):
+        """События изменений источника относительно прошлого опроса
+        
+        listings — список товаров или ListingScan; после неполного обхода
+        (truncated) пропавшие не ищутся, непросмотренные предложения остаются.
+        Если на странице не нашлось ни одной карточки, а в прошлый раз товары
+        были, отпечаток не меняется и поднимается EmptyListing.
+        """
+        previous = self.snapshots.get(source, {})
+        current = {}
+        events = []
+        for item in listings:
+            key = item['id']
+            stored_key = f"{source}:{key}"
+            price = item['price']
+            online = item['seller_online']
+            current[key] = (price, online)
+            
+            before = previous.get(key)
+            if before is None:
+                stored_price = self.store.price(stored_key)
+                if stored_price is None:
+                    events.append(self._event('new', item))
+                    self.store.add(stored_key, price)
+                    continue
+                # Состояние продавца до рестарта неизвестно — сравниваем только цену
+                before = (stored_price, online)
+            
+            old_price, was_online = before
+            if price < old_price:
+                events.append(self._event('price_drop', item, old_price))
+            elif price > old_price:
+                events.append(self._event('price_rise', item, old_price))
+            if online and not was_online:
+                events.append(self._event('seller_went_online', item))
+            
+            if price != old_price:
+                self.store.add(stored_key, price)
+            else:
+                self.store.touch(stored_key, price)
+        
+        if previous and not current and getattr(listings, 'counts', {}).get('seen') == 0:
+            raise EmptyListing(f"на странице нет карточек, в прошлый раз было {len(previous)}")
+        if getattr(listings, 'truncated', False):
+            for key, fingerprint in previous.items():
+                current.setdefault(key, fingerprint)
+        else:
+            for key in previous.keys() - current.keys():
+                old_price, _ = previous[key]
+                events.append(self._event('removed', {'id': key, 'price': old_price}, old_price))
+        
+        self.snapshots[source] = current
+        return events
+
+    @staticmethod
+    def _event(kind, item, old_price=None):
+        return {'type': kind, 'item': item, 'old_price': old_price}
+
+class ListingClusters:
+    """Кластеры почти одинаковых предложений: одно уведомление на кластер
+    
+    Перекупщики выставляют одно и то же название с мелкими отличиями (эмодзи,
+    регистр, пунктуация) почти по одной цене. Название превращается в MinHash-
+    подпись по символьным 3-граммам; подпись режется на BANDS полос по ROWS
+    значений, и каждая полоса вместе с категорией, числами из названия и ценовой
+    корзиной (логарифмический шаг price_tolerance) дает ключ LSH-корзины.
+    Кандидаты берутся только из своих корзин (и соседних ценовых), поэтому
+    стоимость добавления не зависит от числа запомненных предложений. Числа из
+    названия должны совпадать: «10кк» и «50кк» — разные товары.
+    
+    Кластер живет window секунд после последнего нового участника и помнит, о какой
+    цене сообщили каждому чату: повторное уведомление чату будет только о более
+    низкой цене. Снятые с продажи предложения убираются из кластера (remove),
+    поэтому числа предложений и продавцов в уведомлении — текущие. Кластеры свертываются после разведения событий по чатам, поэтому
+    предложение, подходящее под правило подписчика, не теряется из-за похожего,
+    ушедшего в другой чат.
+    """
+
+    BANDS = 16
+    ROWS = 4
+    PRUNE_INTERVAL = 300
+    PRIME = (1 << 61) - 1
+    _NUMBER_RE = re.compile(r'\d+')
+    _PUNCT_RE = re.compile(r'[\W_]+')
+
+    def __init__(self, similarity=DUP_SIMILARITY, price_tolerance=DUP_PRICE_TOLERANCE, window=DUP_WINDOW):
+        self.similarity = similarity
+        self.price_step = math.log1p(price_tolerance)
+        self.window = window
+        rng = random.Random(186)
+        self._coefficients = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME))
+                              for _ in range(self.BANDS * self.ROWS)]
+        self._clusters = {}      # номер -> состояние кластера
+        self._buckets = {}       # ключ корзины -> номера кластеров
+        self._offers = {}        # (категория, предложение) -> номер кластера
+        self._next_id = 0
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def signature(self, title):
+        """MinHash-подпись нормализованного названия"""
+        text = self._PUNCT_RE.sub(' ', normalize_text(title)).strip()
+        shingles = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for shingle in shingles]
+        return tuple(min((a * value + b) % self.PRIME for value in hashes) for a, b in self._coefficients)
+
+    def _keys(self, category, numbers, band, signature):
+        for index in range(self.BANDS):
+            yield (category, numbers, band, index, signature[index * self.ROWS:(index + 1) * self.ROWS])
+
+    def _match(self, category, numbers, price, signature):
+        """Самый похожий кластер в допустимом диапазоне цен или None"""
+        band = math.floor(math.log(max(price, 1)) / self.price_step)
+        best, best_score = None, self.similarity
+        for neighbour in (band - 1, band, band + 1):
+            for key in self._keys(category, numbers, neighbour, signature):
+                for cluster_id in self._buckets.get(key, ()):
+                    cluster = self._clusters[cluster_id]
+                    if abs(math.log(max(price, 1) / max(cluster['price'], 1))) > self.price_step:
+                        continue
+                    score = sum(x == y for x, y in zip(signature, cluster['signature'])) / len(signature)
+                    if score >= best_score:
+                        best, best_score = cluster, score
+        return best, band
+
+    def assign(self, category, item):
+        """Кластер предложения (новый, если похожих нет)"""
+        price = item['price']
+        signature = self.signature(item['title'])
+        numbers = tuple(sorted(set(self._NUMBER_RE.findall(item['title']))))
+        cluster, band = self._match(category, numbers, price, signature)
+        if cluster is None:
+            self._next_id += 1
+            cluster = {
+                'id': self._next_id, 'price': price, 'signature': signature, 'offers': {},
+                'notified': {}, 'updated': 0.0,
+                'keys': list(self._keys(category, numbers, band, signature)),
+            }
+            self._clusters[cluster['id']] = cluster
+            for key in cluster['keys']:
+                self._buckets.setdefault(key, set()).add(cluster['id'])
+        if item['id'] not in cluster['offers']:
+            cluster['updated'] = time.time()
+        previous = self._offers.get((category, item['id']))
+        if previous is not None and previous != cluster['id'] and previous in self._clusters:
+            self._clusters[previous]['offers'].pop(item['id'], None)
+        self._offers[(category, item['id'])] = cluster['id']
+        cluster['offers'][item['id']] = (item.get('seller', ''), price)
+        return cluster
+
+    def remove(self, category, offer_ids):
+        """Убрать снятые с продажи предложения из их кластеров"""
+        with self._lock:
+            for offer_id in offer_ids:
+                cluster_id = self._offers.pop((category, offer_id), None)
+                cluster = self._clusters.get(cluster_id)
+                if cluster is not None:
+                    cluster['offers'].pop(offer_id, None)
+
+    def collapse(self, category, recipients):
+        """События для уведомлений каждого чата: одно на кластер — с лучшей ценой и числом продавцов
+        
+        recipients — {чат: события}, уже разведенные по чатам правилами. Событие
+        кластера, о котором этому чату уже сообщили не дороже, отбрасывается.
+        В событии-представителе 'cluster': номер, число предложений и продавцов.
+        """
+        with self._lock:
+            self._prune()
+            clusters = {}
+            for events in recipients.values():
+                for event in events:
+                    if id(event) not in clusters:
+                        clusters[id(event)] = self.assign(category, event['item'])
+            collapsed = {}
+            for chat, events in recipients.items():
+                groups = {}
+                for event in events:
+                    cluster = clusters[id(event)]
+                    groups.setdefault(cluster['id'], (cluster, []))[1].append(event)
+                chat_events = []
+                for cluster, group in groups.values():
+                    best = min(group, key=lambda event: event['item']['price'])
+                    notified = cluster['notified'].get(chat)
+                    if notified is not None and best['item']['price'] >= notified:
+                        continue
+                    cluster['notified'][chat] = best['item']['price']
+                    chat_events.append(dict(best, cluster={
+                        'id': cluster['id'],
+                        'offers': len(cluster['offers']),
+                        'sellers': len({seller for seller, _ in cluster['offers'].values()}),
+                    }))
+                duplicates_suppressed.inc(len(events) - len(chat_events), category=category)
+                if chat_events:
+                    collapsed[chat] = chat_events
+            return collapsed
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        expired = now - self.window
+        for cluster_id in [cluster_id for cluster_id, cluster in self._clusters.items() if cluster['updated'] < expired]:
+            cluster = self._clusters.pop(cluster_id)
+            for key in cluster['keys']:
+                bucket = self._buckets.get(key)
+                bucket.discard(cluster_id)
+                if not bucket:
+                    del self._buckets[key]
+            category = cluster['keys'][0][0]
+            for offer_id in cluster['offers']:
+                if self._offers.get((category, offer_id)) == cluster_id:
+                    del self._offers[(category, offer_id)]
@@ -0,0 +1,142 @@
+"""Уведомления Telegram: очередь с ограничением скорости в отдельном потоке"""
+import asyncio
+import logging
+import threading
+import time
+
+from config import (
+    TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_BURST, TELEGRAM_CHAT_RATE,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_MAX_RETRIES,
+)
+from metrics import telegram_messages, telegram_send_latency
+
+logger = logging.getLogger(__name__)
+
+def create_bot():
+    """Бот Telegram; библиотека импортируется только при первой отправке, а не при старте"""
+    from telegram import Bot
+    return Bot(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_URL)
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Забрать токен; возвращает, сколько секунд нужно подождать до его появления"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+class NotificationDispatcher:
+    """Очередь уведомлений Telegram со своим потоком и event loop
+    
+    send() только кладет сообщение в очередь и сразу возвращается, поэтому
+    цикл мониторинга никогда не ждет Telegram. Для каждого чата работает
+    отдельная задача с ведром токенов; RetryAfter (429) и сетевые ошибки
+    повторяются с паузой, остальные ошибки логируются и сообщение отбрасывается —
+    задача чата продолжает работу со следующим сообщением.
+    Бот создается вызовом bot_factory в потоке отправки перед первым сообщением.
+    """
+
+    def __init__(self, bot_factory, chat_rate=TELEGRAM_CHAT_RATE, chat_burst=TELEGRAM_CHAT_BURST,
+                 global_rate=TELEGRAM_GLOBAL_RATE, max_retries=TELEGRAM_MAX_RETRIES):
+        self.bot_factory = bot_factory
+        self.bot = None
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_queues = {}
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = 0
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def depth(self):
+        """Сообщений в очереди, еще не отправленных"""
+        return self._pending
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, name='telegram-dispatcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def send(self, chat_id, text, parse_mode='HTML'):
+        """Поставить сообщение в очередь на отправку"""
+        self.start()
+        with self._pending_lock:
+            self._pending += 1
+        self._loop.call_soon_threadsafe(self._enqueue, str(chat_id), text, parse_mode)
+
+    def _enqueue(self, chat_id, text, parse_mode):
+        chat_queue = self._chat_queues.get(chat_id)
+        if chat_queue is None:
+            chat_queue = self._chat_queues[chat_id] = asyncio.Queue()
+            self._loop.create_task(self._chat_worker(chat_id, chat_queue))
+        chat_queue.put_nowait((text, parse_mode))
+
+    async def _chat_worker(self, chat_id, chat_queue):
+        bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        try:
+            while True:
+                text, parse_mode = await chat_queue.get()
+                try:
+                    await asyncio.sleep(max(bucket.reserve(), self._global_bucket.reserve()))
+                    await self._deliver(chat_id, text, parse_mode)
+                except Exception as e:
+                    logger.error(f"💥 Сообщение в чат {chat_id} не отправлено: {e}")
+                    telegram_messages.inc(result='failed')
+                    self.failed += 1
+                finally:
+                    with self._pending_lock:
+                        self._pending -= 1
+        finally:
+            # Следующее сообщение чату заведет новую очередь и задачу
+            if self._chat_queues.get(chat_id) is chat_queue:
+                del self._chat_queues[chat_id]
+
+    async def _deliver(self, chat_id, text, parse_mode):
+        from telegram.error import NetworkError, RetryAfter, TelegramError
+        if self.bot is None:
+            self.bot = self.bot_factory()
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                telegram_send_latency.observe(time.perf_counter() - started)
+                telegram_messages.inc(result='sent')
+                self.sent += 1
+                logger.info(f"📨 Отправлено в Telegram: {text[:50]}...")
+                return True
+            except RetryAfter as e:
+                delay = e.retry_after
+                logger.warning(f"⏳ Telegram просит подождать {delay} с (чат {chat_id})")
+            except NetworkError as e:
+                delay = min(60, 2 ** attempt)
+                logger.warning(f"⚠️ Сетевая ошибка Telegram, повтор через {delay} с: {e}")
+            except TelegramError as e:
+                logger.error(f"❌ Ошибка Telegram: {e}")
+                break
+            telegram_messages.inc(result='retried')
+            await asyncio.sleep(delay)
+        telegram_messages.inc(result='failed')
+        self.failed += 1
+        return False
@@ -0,0 +1,467 @@
+"""Загрузка страниц FunPay: пул соединений, условные запросы, размыкатель цепи, архив ответов"""
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    BREAKER_COOLDOWN, BREAKER_FAILURES, CAPTURE_DIR, CAPTURE_MODE, CAPTURE_REALTIME, CATALOG_NAME,
+    CATALOG_URL, CONNECT_TIMEOUT, CRAWL_IN_FLIGHT, FETCH_DEADLINE, FETCH_WORKERS, FUNPAY_BASE_URL,
+    MAX_BACKOFF, MAX_RESPONSE_BYTES, PER_HOST_LIMIT, PROXIES, READ_TIMEOUT, REQUEST_HEADERS,
+    USER_AGENTS,
+)
+from metrics import (
+    bytes_downloaded, circuit_state, fetch_errors, fetch_latency, http_responses, pages_unchanged,
+)
+from parsing import CARD_OPEN_RE, SECTION_PATH_RE, SectionLinkExtractor, listing_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Валидаторы последнего ответа по каждому URL (ETag, Last-Modified, отпечаток карточек)
+validator_cache = {}
+
+# Общий пул keep-alive соединений для всех запросов к FunPay
+http_session = requests.Session()
+http_session.headers.update(REQUEST_HEADERS)
+_http_adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS)
+http_session.mount('https://', _http_adapter)
+http_session.mount('http://', _http_adapter)
+
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+
+# Ограничение одновременных запросов к одному хосту
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+@dataclass
+class FetchResult:
+    """Результат загрузки одной страницы"""
+    url: str
+    status: int = 0
+    text: str = ''
+    elapsed: float = 0.0
+    error: str = ''
+    not_modified: bool = False
+    retry_after: float = 0.0
+    reason: str = ''
+
+    @property
+    def ok(self):
+        return self.status == 200 and not self.error
+
+class FetchError(Exception):
+    """Страница не загружена (сеть, таймаут, лимит размера, блокировка) — это не пустой список товаров"""
+
+    def __init__(self, message, reason='network'):
+        super().__init__(message)
+        self.reason = reason
+
+class CaptureArchive:
+    """Архив ответов FunPay: только дописывается, читается по индексу через mmap
+    
+    capture.dat — записи, каждая сжата zlib отдельно: строка JSON (URL,
+    статус, заголовки, время, длительность запроса), затем тело ответа.
+    capture.idx — сигнатура и записи фиксированного размера (время, хэш URL,
+    смещение и длина записи в capture.dat), поэтому любую запись можно
+    прочитать, не загружая архив. Запись из нескольких процессов
+    сериализуется блокировкой индекса.
+    """
+
+    MAGIC = b'FPCAP01\n'
+    ENTRY = struct.Struct('<d8sQI')
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data = open(os.path.join(path, 'capture.dat'), 'ab+')
+        self._index = open(os.path.join(path, 'capture.idx'), 'ab+')
+        self._map = None
+        if os.fstat(self._index.fileno()).st_size == 0:
+            self._index.write(self.MAGIC)
+            self._index.flush()
+
+    @staticmethod
+    def url_hash(url):
+        return hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+
+    def append(self, url, response, ts, elapsed):
+        """Дописать ответ requests в архив"""
+        header = json.dumps({
+            'url': url,
+            'status': response.status_code,
+            'headers': dict(response.headers),
+            'encoding': response.encoding,
+            'ts': ts,
+            'elapsed': elapsed,
+        }, ensure_ascii=False).encode('utf-8')
+        record = zlib.compress(header + b'\n' + response.content)
+        with self._lock:
+            fcntl.flock(self._index, fcntl.LOCK_EX)
+            try:
+                offset = os.fstat(self._data.fileno()).st_size
+                self._data.write(record)
+                self._data.flush()
+                # Индекс пишется после данных: запись в индексе всегда указывает на полные данные
+                self._index.write(self.ENTRY.pack(ts, self.url_hash(url), offset, len(record)))
+                self._index.flush()
+            finally:
+                fcntl.flock(self._index, fcntl.LOCK_UN)
+
+    def _entries_map(self):
+        size = os.fstat(self._index.fileno()).st_size
+        if self._map is None or len(self._map) != size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._index.fileno(), size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __len__(self):
+        return (os.fstat(self._index.fileno()).st_size - len(self.MAGIC)) // self.ENTRY.size
+
+    def entry(self, index):
+        """(время, хэш URL, смещение, длина) записи номер index"""
+        with self._lock:
+            return self.ENTRY.unpack_from(self._entries_map(), len(self.MAGIC) + index * self.ENTRY.size)
+
+    def read(self, index):
+        """Запись целиком: словарь заголовка плюс body (bytes)"""
+        _, _, offset, length = self.entry(index)
+        with self._lock:
+            self._data.seek(offset)
+            record = zlib.decompress(self._data.read(length))
+        header, _, body = record.partition(b'\n')
+        response = json.loads(header)
+        response['body'] = body
+        return response
+
+class CaptureReplay:
+    """Воспроизведение архива: ответы на каждый URL в порядке записи
+    
+    В realtime ответ отдается не раньше, чем он был получен при записи
+    (отсчет от начала воспроизведения), иначе — сразу.
+    """
+
+    def __init__(self, archive, realtime=False):
+        self.archive = archive
+        self.realtime = realtime
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._started = None
+        self._first_ts = None
+        for index in range(len(archive)):
+            ts, url_hash, _, _ = archive.entry(index)
+            if self._first_ts is None:
+                self._first_ts = ts
+            self._queues.setdefault(url_hash, deque()).append(index)
+
+    def response(self, url):
+        """Следующий записанный ответ на url в виде requests.Response"""
+        with self._lock:
+            if self._started is None:
+                self._started = time.time()
+            indices = self._queues.get(self.archive.url_hash(url))
+            if not indices:
+                raise requests.ConnectionError(f"в архиве больше нет ответов для {url}")
+            index = indices.popleft()
+        
+        record = self.archive.read(index)
+        if self.realtime:
+            delay = self._started + (record['ts'] - self._first_ts) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        
+        response = requests.Response()
+        response.url = url
+        response.status_code = record['status']
+        response.headers = requests.structures.CaseInsensitiveDict(record['headers'])
+        response.encoding = record['encoding']
+        response._content = record['body']
+        return response
+
+capture_archive = CaptureArchive(CAPTURE_DIR) if CAPTURE_MODE in ('record', 'replay') else None
+capture_replay = CaptureReplay(capture_archive, CAPTURE_REALTIME) if CAPTURE_MODE == 'replay' else None
+
+class CircuitBreaker:
+    """Размыкатель цепи для одного хоста
+    
+    Замкнут — запросы идут. После failures неудач подряд (сеть, таймаут, 5xx,
+    429, страница блокировки) размыкается на cooldown секунд: запросы к хосту не
+    отправляются, цикл не ждет таймаутов. Затем пропускает один пробный запрос;
+    успех замыкает цепь, неудача снова размыкает ее с удвоенной паузой (до max_cooldown).
+    """
+
+    STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+    def __init__(self, host, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN, max_cooldown=MAX_BACKOFF):
+        self.host = host
+        self.threshold = failures
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"🔌 {self.host}: размыкатель {self.state} → {state}"
+                           + (f", пауза {self.cooldown:.0f} с" if state == 'open' else ""))
+        self.state = state
+        circuit_state.set(self.STATES[state], host=self.host)
+
+    def remaining(self):
+        """Секунд до следующего пробного запроса"""
+        return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        """Можно ли отправить запрос (в разомкнутом состоянии — только пробный)"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.remaining() > 0:
+                return False
+            # Пробный запрос; если он не отчитался, следующий пропускается через ту же паузу
+            self._opened_at = time.monotonic()
+            self._set_state('half_open')
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._set_state('closed')
+
+    def record_failure(self, retry_after=0.0):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open':
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.failures < self.threshold and not retry_after:
+                return
+            self.cooldown = max(self.cooldown, retry_after)
+            self._opened_at = time.monotonic()
+            self._set_state('open')
+
+    def snapshot(self):
+        return {'state': self.state, 'failures': self.failures, 'retry_in': round(self.remaining())}
+
+class RotatingPool:
+    """Выбор по кругу (прокси, User-Agent); отстраненный элемент пропускается cooldown секунд"""
+
+    def __init__(self, items, cooldown=BREAKER_COOLDOWN):
+        self.items = list(items)
+        self.cooldown = cooldown
+        self._index = 0
+        self._benched = {}
+        self._lock = threading.Lock()
+
+    def next(self):
+        """Следующий доступный элемент или None для пустого пула"""
+        if not self.items:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            for _ in range(len(self.items)):
+                item = self.items[self._index % len(self.items)]
+                self._index += 1
+                if self._benched.get(item, 0) <= now:
+                    return item
+            # Отстранены все — берем тот, чья пауза кончится раньше
+            return min(self.items, key=lambda item: self._benched[item])
+
+    def bench(self, item):
+        """Отстранить элемент после неудачи через него"""
+        if item is not None:
+            with self._lock:
+                self._benched[item] = time.monotonic() + self.cooldown
+
+proxy_pool = RotatingPool(PROXIES)
+user_agents = RotatingPool(USER_AGENTS)
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def host_breaker(url):
+    """Размыкатель хоста url"""
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+def open_circuits():
+    """Состояние размыкателей хостов, которые сейчас не в штатном режиме"""
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return {host: breaker.snapshot() for host, breaker in breakers if breaker.state != 'closed'}
+
+_BLOCK_PAGE_RE = re.compile(
+    r'<title>\s*(?:Just a moment|Attention Required|DDoS-Guard|Access denied|Доступ (?:запрещен|ограничен))'
+    r'|cf_chl_opt|cf-browser-verification|<form\b[^>]*captcha',
+    re.IGNORECASE,
+)
+
+def is_block_page(html):
+    """Страница капчи или блокировки вместо раздела (в ней нет карточек товаров)"""
+    return _BLOCK_PAGE_RE.search(html) is not None and CARD_OPEN_RE.search(html) is None
+
+def download(url, headers, proxy=None):
+    """GET с раздельными таймаутами соединения и чтения, общим сроком FETCH_DEADLINE
+    и потоковым чтением тела не больше MAX_RESPONSE_BYTES (иначе FetchError)
+    """
+    deadline = time.monotonic() + FETCH_DEADLINE
+    response = http_session.get(
+        url, headers=dict(headers, **{'User-Agent': user_agents.next()}), stream=True,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), proxies={'http': proxy, 'https': proxy} if proxy else None,
+    )
+    length = response.headers.get('Content-Length', '')
+    if length.isdigit() and int(length) > MAX_RESPONSE_BYTES:
+        response.close()
+        raise FetchError(f"ответ {int(length)} байт больше лимита {MAX_RESPONSE_BYTES}", 'too_large')
+    body = bytearray()
+    for chunk in response.iter_content(65536):
+        body += chunk
+        if len(body) > MAX_RESPONSE_BYTES:
+            response.close()
+            raise FetchError(f"ответ больше лимита {MAX_RESPONSE_BYTES} байт", 'too_large')
+        if time.monotonic() > deadline:
+            response.close()
+            raise FetchError(f"ответ не загружен за {FETCH_DEADLINE:g} с", 'timeout')
+    response._content = bytes(body)
+    return response
+
+def _host_semaphore(url):
+    """Семафор, ограничивающий параллельные запросы к хосту"""
+    host = urlsplit(url).netloc
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(PER_HOST_LIMIT)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+def fetch_page(url, conditional=False):
+    """Загрузка страницы через общий пул соединений
+    
+    При conditional=True отправляет If-None-Match/If-Modified-Since и
+    помечает ответ как not_modified, если страница (или блок карточек) не изменилась.
+    Пока размыкатель хоста разомкнут, запрос не отправляется: результат с ошибкой
+    и retry_after до следующей пробы.
+    """
+    headers = {}
+    cached = validator_cache.get(url, {}) if conditional else {}
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+    
+    breaker = host_breaker(url) if capture_replay is None else None
+    if breaker and not breaker.allow():
+        fetch_errors.inc(source=url, reason='circuit_open')
+        return FetchResult(url, error=f"размыкатель {breaker.host} разомкнут", reason='circuit_open',
+                           retry_after=breaker.remaining())
+    
+    proxy = None
+    started = time.perf_counter()
+    try:
+        if capture_replay is not None:
+            response = capture_replay.response(url)
+        else:
+            proxy = proxy_pool.next()
+            with _host_semaphore(url):
+                response = download(url, headers, proxy)
+    except (requests.RequestException, FetchError) as e:
+        reason = getattr(e, 'reason', 'timeout' if isinstance(e, requests.Timeout) else 'network')
+        fetch_errors.inc(source=url, reason=reason)
+        if breaker:
+            breaker.record_failure()
+        proxy_pool.bench(proxy)
+        return FetchResult(url, elapsed=time.perf_counter() - started, error=str(e), reason=reason)
+    
+    elapsed = time.perf_counter() - started
+    if CAPTURE_MODE == 'record':
+        capture_archive.append(url, response, time.time(), elapsed)
+    fetch_latency.observe(elapsed, source=url)
+    http_responses.inc(source=url, status=response.status_code)
+    bytes_downloaded.inc(len(response.content), source=url)
+    if response.status_code == 403 or (response.status_code == 200 and is_block_page(response.text)):
+        # Капча или блокировка: не разбираем и не долбим хост, пока не откроется
+        fetch_errors.inc(source=url, reason='blocked')
+        if breaker:
+            breaker.record_failure()
+        proxy_pool.bench(proxy)
+        return FetchResult(url, response.status_code, elapsed=elapsed,
+                           error="страница капчи или блокировки", reason='blocked')
+    if response.status_code == 429 or response.status_code >= 500:
+        retry_after = response.headers.get('Retry-After', '')
+        retry_after = float(retry_after) if retry_after.isdigit() else 0.0
+        if breaker:
+            breaker.record_failure(retry_after)
+        return FetchResult(url, response.status_code, elapsed=elapsed, retry_after=retry_after)
+    if breaker:
+        breaker.record_success()
+    if response.status_code == 304:
+        pages_unchanged.inc(source=url)
+        return FetchResult(url, 304, elapsed=elapsed, not_modified=True)
+    
+    result = FetchResult(url, response.status_code, response.text, elapsed)
+    if conditional and result.ok:
+        fingerprint = listing_fingerprint(result.text)
+        result.not_modified = fingerprint == cached.get('fingerprint')
+        if result.not_modified:
+            pages_unchanged.inc(source=url)
+        validator_cache[url] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fingerprint': fingerprint,
+        }
+    return result
+
+def crawl(sources, conditional=True, in_flight=CRAWL_IN_FLIGHT):
+    """Стадия загрузки: (url, категория, FetchResult) в порядке sources
+    
+    Одновременно загружается не больше in_flight страниц: следующая
+    запрашивается, только когда потребитель забрал очередную.
+    """
+    pending = deque()
+    for url, category in sources:
+        pending.append((url, category, fetch_executor.submit(fetch_page, url, conditional)))
+        if len(pending) >= in_flight:
+            url, category, future = pending.popleft()
+            yield url, category, future.result()
+    while pending:
+        url, category, future = pending.popleft()
+        yield url, category, future.result()
+
+def discover_sections(url=CATALOG_URL, game=CATALOG_NAME):
+    """Разделы игры со страницы каталога: [(url, «игра - раздел»)] или None при ошибке"""
+    result = fetch_page(url)
+    if not result.ok:
+        logger.warning(f"⚠️ Каталог недоступен: {result.error or f'HTTP {result.status}'}")
+        return None
+    extractor = SectionLinkExtractor()
+    extractor.feed(result.text)
+    extractor.close()
+    
+    sections = {}
+    for href, name in extractor.sections:
+        section_url = f"{FUNPAY_BASE_URL}{SECTION_PATH_RE.search(href).group(0)}"
+        sections.setdefault(section_url, f"{game} - {name}")
+    return list(sections.items())
@@ -0,0 +1,133 @@
+"""Метрики процесса в текстовом формате Prometheus"""
+import threading
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metric:
+    """Метрика в формате Prometheus с произвольными метками"""
+
+    type = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+    def samples(self):
+        with self._lock:
+            return [(self.name + self._labels(key), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        lines.extend(f'{name} {value:.10g}' for name, value in self.samples())
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), func=None):
+        super().__init__(name, help_text, labelnames)
+        self.func = func
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.func is not None:
+            return [(self.name, self.func())]
+        return super().samples()
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        samples = []
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                samples.append((self.name + '_bucket' + self._labels(key, [('le', f'{bound:g}')]), count))
+            samples.append((self.name + '_bucket' + self._labels(key, [('le', '+Inf')]), state[-1]))
+            samples.append((self.name + '_sum' + self._labels(key), state[-2]))
+            samples.append((self.name + '_count' + self._labels(key), state[-1]))
+        return samples
+
+class MetricsRegistry:
+    """Набор метрик процесса и их выгрузка в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+metrics = MetricsRegistry()
+
+fetch_latency = metrics.histogram('funpay_fetch_seconds', 'Время загрузки страницы FunPay', ['source'])
+http_responses = metrics.counter('funpay_http_responses_total', 'Ответы FunPay по HTTP-статусу', ['source', 'status'])
+fetch_errors = metrics.counter('funpay_fetch_errors_total', 'Неудачные загрузки FunPay: network, timeout, too_large, blocked, circuit_open, empty', ['source', 'reason'])
+circuit_state = metrics.gauge('funpay_circuit_state', 'Размыкатель хоста: 0 — замкнут, 1 — пробный запрос, 2 — разомкнут', ['host'])
+bytes_downloaded = metrics.counter('funpay_bytes_downloaded_total', 'Скачано байт с FunPay', ['source'])
+pages_unchanged = metrics.counter('funpay_pages_unchanged_total', 'Страницы без изменений (304 или тот же отпечаток)', ['source'])
+parse_latency = metrics.histogram('funpay_parse_seconds', 'Время разбора страницы', ['source'])
+cards_seen = metrics.counter('funpay_cards_total', 'Карточки по состоянию: seen, online, offline, matched', ['category', 'state'])
+cards_last_cycle = metrics.gauge('funpay_cards_last_cycle', 'Карточки в последнем разборе страницы', ['category', 'state'])
+dedup_hits = metrics.counter('funpay_dedup_hits_total', 'Товары, уже известные хранилищу')
+duplicates_suppressed = metrics.counter('funpay_duplicates_suppressed_total', 'Уведомления, свернутые в кластер похожих предложений', ['category'])
+new_items_total = metrics.counter('funpay_new_items_total', 'Новые товары', ['source'])
+listing_events = metrics.counter('funpay_listing_events_total', 'События сравнения списков', ['source', 'type'])
+telegram_send_latency = metrics.histogram('telegram_send_seconds', 'Время отправки сообщения в Telegram')
+telegram_messages = metrics.counter('telegram_messages_total', 'Сообщения Telegram по результату: sent, failed, retried', ['result'])
+cycle_latency = metrics.histogram('monitor_cycle_seconds', 'Длительность цикла проверки', buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+cycle_overruns = metrics.counter('monitor_cycle_overruns_total', 'Циклы дольше минимального интервала опроса')
+boot_seconds = metrics.gauge('monitor_boot_seconds', 'Секунды от запуска процесса до этапа: import, leader, first_scan', ['stage'])
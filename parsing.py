@@ -0,0 +1,713 @@
+"""Разбор страниц FunPay: карточки товаров, ссылки разделов, категории и фильтр карточек"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from html.entities import html5 as HTML5_ENTITIES
+from html.parser import HTMLParser
+
+from config import (
+    CATALOG_NAME, CATALOG_URL, DEFAULT_SOURCE, EXCLUDE_TERMS, FUNPAY_BASE_URL, INCLUDE_TERMS,
+    PRICE_MAX, PRICE_MIN,
+)
+from metrics import cards_last_cycle, cards_seen, parse_latency
+
+logger = logging.getLogger(__name__)
+
+# Похожие кириллические и латинские буквы приводятся к латинским
+_HOMOGLYPHS = str.maketrans('аеёокрсухіјѕ', 'aeeokpcyxijs')
+
+_TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya',
+})
+
+def normalize_text(text):
+    """Нижний регистр, одиночные пробелы и единое написание похожих букв"""
+    return ' '.join(text.lower().split()).translate(_HOMOGLYPHS)
+
+class KeywordMatcher:
+    """Поиск терминов в названиях одним регулярным выражением
+    
+    Термины собираются в префиксное дерево, поэтому стоимость проверки почти
+    не растет с их числом. Кириллические термины дополняются транслитом,
+    совпадение ищется по границам слов; «*» в конце термина разрешает продолжение слова.
+    """
+
+    def __init__(self, include, exclude=()):
+        self.include = self._compile(include)
+        self.exclude = self._compile(exclude)
+
+    @staticmethod
+    def _variants(term):
+        prefix = term.endswith('*')
+        term = term.rstrip('*').lower()
+        for variant in {term, term.translate(_TRANSLIT)}:
+            variant = normalize_text(variant)
+            if variant:
+                yield variant, prefix
+
+    @classmethod
+    def _compile(cls, terms):
+        trie = {}
+        for term in terms:
+            for variant, prefix in cls._variants(term):
+                node = trie
+                for char in variant:
+                    node = node.setdefault(char, {})
+                node['*' if prefix else '$'] = True
+        if not trie:
+            return None
+        return re.compile(r'(?<!\w)' + cls._trie_pattern(trie))
+
+    @classmethod
+    def _trie_pattern(cls, node):
+        branches = [re.escape(char) + cls._trie_pattern(child)
+                    for char, child in sorted(node.items()) if char not in ('$', '*')]
+        if '$' in node:
+            branches.append(r'(?!\w)')
+        if '*' in node:
+            branches.append('')
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    def matches(self, title):
+        """Название содержит искомый термин и не содержит исключенных"""
+        text = normalize_text(title)
+        if self.exclude and self.exclude.search(text):
+            return False
+        return self.include is None or self.include.search(text) is not None
+
+CARD_OPEN_RE = re.compile(r"""<div\b[^>]*\bclass=["'][^"']*(?<![\w-])tc-item(?![\w-])""", re.IGNORECASE)
+_DIV_TAG_RE = re.compile(r'<(/?)div\b', re.IGNORECASE)
+
+def _inside_raw_text(html, pos):
+    """Позиция внутри <script>, <style> или HTML-комментария"""
+    for opener, closer in (('<script', '</script'), ('<style', '</style'), ('<!--', '-->')):
+        if html.rfind(opener, 0, pos) > html.rfind(closer, 0, pos):
+            return True
+    return False
+
+def listing_region(html):
+    """Фрагмент HTML от первой карточки tc-item до конца последней"""
+    cards = list(CARD_OPEN_RE.finditer(html))
+    first = next((match for match in cards if not _inside_raw_text(html, match.start())), None)
+    if not first:
+        return ''
+    last = next(match for match in reversed(cards) if not _inside_raw_text(html, match.start()))
+    
+    # Ищем закрывающий тег последней карточки по глубине вложенности div
+    depth = 0
+    for tag in _DIV_TAG_RE.finditer(html, last.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return html[first.start():html.find('>', tag.end()) + 1]
+    return html[first.start():]
+
+def listing_fingerprint(html):
+    """Отпечаток блока карточек: совпадает, если список товаров не менялся
+    
+    Страница без карточек tc-item (другая разметка) отпечатывается целиком.
+    """
+    return hashlib.blake2b((listing_region(html) or html).encode('utf-8'), digest_size=16).hexdigest()
+
+SECTION_PATH_RE = re.compile(r'/(?:chips|lots)/\d+/')
+
+class SectionLinkExtractor(HTMLParser):
+    """Ссылки на разделы игры из списка div.counter-list страницы раздела
+    
+    Название раздела берется из div.counter-param внутри ссылки, иначе
+    из всего текста ссылки. Ссылки вне списка (меню других игр) не учитываются.
+    """
+
+    LIST_CLASS = 'counter-list'
+    NAME_CLASS = 'counter-param'
+
+    def __init__(self):
+        super().__init__()
+        self.sections = []
+        self._depth = 0         # вложенность div внутри списка разделов
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if tag == 'div':
+            if self._depth:
+                self._depth += 1
+            elif self.LIST_CLASS in classes:
+                self._depth = 1
+            if self._link is not None and self.NAME_CLASS in classes:
+                self._link['in_name'] = True
+        elif tag == 'a' and self._depth and SECTION_PATH_RE.search(attrs.get('href') or ''):
+            self._link = {'href': attrs['href'], 'text': [], 'name': [], 'in_name': False}
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._depth:
+            self._depth -= 1
+            if self._link is not None:
+                self._link['in_name'] = False
+        elif tag == 'a' and self._link is not None:
+            link, self._link = self._link, None
+            name = ''.join(link['name']).strip() or ' '.join(''.join(link['text']).split())
+            self.sections.append((link['href'], name))
+
+    def handle_data(self, data):
+        if self._link is not None:
+            self._link['text'].append(data)
+            if self._link['in_name']:
+                self._link['name'].append(data)
+
+# Пустые элементы HTML и контейнеры, текст которых не входит в get_text()
+_VOID_TAGS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+    'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+))
+_HIDDEN_TEXT_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+
+class ListingExtractor(HTMLParser):
+    """Потоковый разбор карточек товаров без построения дерева страницы
+    
+    Для каждой карточки div.tc-item за один проход собирает текст первых
+    div.media-user-status, div.media-user-name, div.tc-server, div.tc-desc-text,
+    div.tc-price и href первой ссылки.
+    Текст склеивается так же, как BeautifulSoup.get_text(strip=True).
+    Другие классы карточки и полей задаются card_class и field_classes
+    (класс div -> поле), как в селекторах категории.
+    """
+
+    CARD_CLASS = 'tc-item'
+    FIELD_CLASSES = {
+        'media-user-status': 'status',
+        'media-user-name': 'seller',
+        'tc-server': 'server',
+        'tc-desc-text': 'title',
+        'tc-price': 'price',
+    }
+
+    def __init__(self, card_class=None, field_classes=None):
+        super().__init__(convert_charrefs=False)
+        if card_class:
+            self.CARD_CLASS = card_class
+        if field_classes:
+            self.FIELD_CLASSES = field_classes
+        self.cards = deque()    # открытые и еще не отданные карточки в порядке документа
+        self._stack = []        # [имя тега, открытые им захваты текста, скрытый ли текст]
+        self._open_cards = []
+        self._captures = []
+        self._text = []
+        self._hidden = 0
+        self._closed_void = []
+
+    CHUNK_SIZE = 65536
+
+    def extract(self, html):
+        """Список карточек в порядке документа"""
+        return list(self.iter_cards(html))
+
+    def iter_cards(self, html):
+        """Карточки по мере разбора: каждая отдается, как только закрыт ее div
+        
+        Страница скармливается парсеру кусками, поэтому потребитель может
+        остановиться, не разбирая остаток страницы.
+        """
+        # Блок карточек ищется только для разметки FunPay по умолчанию
+        region = (listing_region(html) if self.CARD_CLASS == ListingExtractor.CARD_CLASS else '') or html
+        for start in range(0, len(region), self.CHUNK_SIZE):
+            self.feed(region[start:start + self.CHUNK_SIZE])
+            while self.cards and not any(self.cards[0] is card for card in self._open_cards):
+                yield self._finish(self.cards.popleft())
+        self.close()
+        self._flush_text()
+        while self.cards:
+            yield self._finish(self.cards.popleft())
+
+    def _finish(self, card):
+        for field in self.FIELD_CLASSES.values():
+            if card[field] is not None:
+                card[field] = ''.join(card[field])
+        return card
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        text = ''.join(self._text).strip()
+        self._text = []
+        if text and not self._hidden:
+            for capture in self._captures:
+                capture.append(text)
+
+    def handle_starttag(self, tag, attrs, void=True):
+        self._flush_text()
+        if void and tag in _VOID_TAGS:
+            self._closed_void.append(tag)
+            self._start_element(tag, dict(attrs))
+            self._end_element(tag)
+            return
+        self._start_element(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, void=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, closing_void=True):
+        self._flush_text()
+        if closing_void and tag in self._closed_void:
+            self._closed_void.remove(tag)
+            return
+        self._end_element(tag)
+
+    def _start_element(self, tag, attrs):
+        opened = []
+        if tag == 'a':
+            for card in self._open_cards:
+                if not card['has_link']:
+                    card['has_link'] = True
+                    card['href'] = attrs.get('href')
+        elif tag == 'div':
+            classes = (attrs.get('class') or '').split()
+            for css_class in classes:
+                field = self.FIELD_CLASSES.get(css_class)
+                if field is None:
+                    continue
+                for card in self._open_cards:
+                    if card[field] is None:
+                        card[field] = []
+                        opened.append(card[field])
+            if self.CARD_CLASS in classes:
+                card = dict.fromkeys(self.FIELD_CLASSES.values())
+                card.update(href=None, has_link=False)
+                self.cards.append(card)
+                self._open_cards.append(card)
+                opened.append(card)
+        
+        hidden = tag in _HIDDEN_TEXT_TAGS
+        self._hidden += hidden
+        self._captures.extend(capture for capture in opened if isinstance(capture, list))
+        self._stack.append((tag, opened, hidden))
+
+    def _end_element(self, tag):
+        # Как в BeautifulSoup: закрываем до ближайшего открытого тега с тем же именем
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > index:
+            _, opened, hidden = self._stack.pop()
+            self._hidden -= hidden
+            for capture in opened:
+                if isinstance(capture, list):
+                    self._captures.remove(capture)
+                else:
+                    self._open_cards.remove(capture)
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_charref(self, name):
+        if name[:1] in ('x', 'X'):
+            code = int(name.lstrip('xX'), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytes([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._text.append(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        self._text.append(HTML5_ENTITIES.get(name + ';', f'&{name}'))
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def handle_decl(self, decl):
+        self._flush_text()
+
+    def handle_pi(self, data):
+        self._flush_text()
+
+    def unknown_decl(self, data):
+        self._flush_text()
+        if data.upper().startswith('CDATA['):
+            self._text.append(data[len('CDATA['):])
+            self._flush_text()
+
+def extract_cards(html):
+    """Все карточки товаров страницы: статус, название, цена, ссылка"""
+    return ListingExtractor().extract(html)
+
+def iter_cards(html, card_class=None, field_classes=None):
+    """Стадия разбора: карточки страницы по одной"""
+    return ListingExtractor(card_class, field_classes).iter_cards(html)
+
+class CategorySpec:
+    """Категория мониторинга: раздел FunPay и правила отбора его карточек
+    
+    Строится из записи файла категорий (from_config) или из настроек окружения
+    (категория по умолчанию). Термины компилируются в KeywordMatcher, селекторы —
+    в классы карточки и полей ListingExtractor один раз при загрузке.
+    """
+
+    SELECTORS = {'card': ListingExtractor.CARD_CLASS,
+                 **{field: css_class for css_class, field in ListingExtractor.FIELD_CLASSES.items()}}
+    CONFIG_KEYS = frozenset(('name', 'url', 'include', 'exclude', 'price_min', 'price_max',
+                             'require_online', 'selectors', 'game', 'discover', 'catalog'))
+
+    def __init__(self, name, url, include=(), exclude=(), price_min=PRICE_MIN, price_max=PRICE_MAX,
+                 require_online=True, selectors=None, game=None, discover=False, catalog=None):
+        self.name = name
+        self.url = url
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.price_min = price_min
+        self.price_max = price_max
+        self.require_online = require_online
+        self.selectors = dict(self.SELECTORS, **(selectors or {}))
+        self.game = game or name.split(' - ')[0]
+        self.discover = discover
+        self.catalog = catalog or url
+        self.matcher = KeywordMatcher(self.include, self.exclude)
+        self.card_class = self.selectors['card']
+        self.field_classes = {css_class: field for field, css_class in self.selectors.items() if field != 'card'}
+        if len(self.field_classes) != len(self.selectors) - 1:
+            raise ValueError(f"категория {name}: у полей должны быть разные классы")
+
+    @classmethod
+    def from_config(cls, entry):
+        """Категория из записи файла; ошибки в записи — ValueError"""
+        if not isinstance(entry, dict) or not entry.get('name') or not entry.get('url'):
+            raise ValueError(f"у категории нужны name и url: {entry!r}")
+        name = entry['name']
+        unknown = set(entry) - cls.CONFIG_KEYS
+        if unknown:
+            raise ValueError(f"категория {name}: неизвестные поля {', '.join(sorted(unknown))}")
+        selectors = entry.get('selectors') or {}
+        unknown = set(selectors) - set(cls.SELECTORS)
+        if unknown:
+            raise ValueError(f"категория {name}: неизвестные селекторы {', '.join(sorted(unknown))}")
+        for key in ('include', 'exclude'):
+            if not all(isinstance(term, str) for term in entry.get(key, [])):
+                raise ValueError(f"категория {name}: {key} — список строк")
+        url = entry['url']
+        catalog = entry.get('catalog')
+        try:
+            return cls(
+                name, FUNPAY_BASE_URL + url if url.startswith('/') else url,
+                entry.get('include', []), entry.get('exclude', []),
+                int(entry.get('price_min', PRICE_MIN)), int(entry.get('price_max', PRICE_MAX)),
+                bool(entry.get('require_online', True)), selectors, entry.get('game'),
+                bool(entry.get('discover', False)),
+                FUNPAY_BASE_URL + catalog if catalog and catalog.startswith('/') else catalog,
+            )
+        except (TypeError, AttributeError) as e:
+            raise ValueError(f"категория {name}: {e}") from None
+
+    def rules(self):
+        """Все, от чего зависит отбор карточек: если правила сменились, страницу нужно разобрать заново"""
+        return (self.name, tuple(self.include), tuple(self.exclude), self.price_min, self.price_max,
+                self.require_online, tuple(sorted(self.selectors.items())))
+
+    def derive(self, name, url):
+        """Категория раздела, найденного в каталоге: те же правила, другой URL"""
+        return CategorySpec(name, url, self.include, self.exclude, self.price_min, self.price_max,
+                            self.require_online, self.selectors, self.game)
+
+    def cards(self, html):
+        """Карточки страницы с селекторами категории"""
+        return iter_cards(html, self.card_class, self.field_classes)
+
+class CardBuffer:
+    """Карточки одной страницы для нескольких категорий с общим URL
+    
+    Страница разбирается один раз и лениво: каждая категория читает уже
+    разобранные карточки, а следующие разбираются, только когда они кому-то нужны.
+    """
+
+    def __init__(self, cards):
+        self._source = iter(cards)
+        self._cards = []
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index == len(self._cards):
+                card = next(self._source, None)
+                if card is None:
+                    return
+                self._cards.append(card)
+            yield self._cards[index]
+            index += 1
+
+def default_category():
+    """Категория из переменных окружения, когда файла категорий нет"""
+    url, name = DEFAULT_SOURCE
+    return CategorySpec(name, url, INCLUDE_TERMS, EXCLUDE_TERMS, game=CATALOG_NAME,
+                        discover=True, catalog=CATALOG_URL)
+
+class CategoryRegistry:
+    """Отслеживаемые категории: файл категорий и разделы, найденные в каталоге
+    
+    Файл — JSON-список записей CategorySpec.from_config; без файла работает
+    default_category(). reload_if_changed() перечитывает файл при смене mtime,
+    файл с ошибкой оставляет прежний набор. Категории с общим URL опрашиваются
+    одной загрузкой и одним проходом парсера, поэтому селекторы у них должны совпадать.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.configured = [default_category()]
+        self.discovered = {}    # категория-родитель -> [(url, категория)] из каталога
+        self.specs = {}
+        self._by_url = {}
+        self._adhoc = {}
+        self._mtime = None
+        self._rebuild()
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            entries = json.load(f)
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("ожидается непустой список категорий")
+        specs = [CategorySpec.from_config(entry) for entry in entries]
+        names = [spec.name for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError("названия категорий повторяются")
+        selectors = {}
+        for spec in specs:
+            if selectors.setdefault(spec.url, spec.selectors) != spec.selectors:
+                raise ValueError(f"у категорий с URL {spec.url} разные селекторы")
+        return specs
+
+    def reload_if_changed(self):
+        """Перечитать файл, если он изменился; возвращает URL, у которых сменились категории или их правила"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return set()
+        self._mtime = mtime
+        if mtime is None:
+            specs = [default_category()]
+        else:
+            try:
+                specs = self._read()
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ Файл категорий {self.path} не применен: {e}")
+                return set()
+        before = self._url_rules()
+        self.configured = specs
+        self._rebuild()
+        after = self._url_rules()
+        logger.info(f"📚 Категорий: {len(self.configured)}" + (f" из {self.path}" if mtime else " (по умолчанию)"))
+        return {url for url in before.keys() | after.keys() if before.get(url) != after.get(url)}
+
+    def _url_rules(self):
+        return {url: sorted(spec.rules() for spec in specs) for url, specs in self._by_url.items()}
+
+    def set_discovered(self, parent, sections):
+        """Запомнить разделы каталога категории parent; возвращает новые категории"""
+        before = set(self.specs)
+        self.discovered[parent] = [tuple(section) for section in sections]
+        self._rebuild()
+        return [spec for name, spec in self.specs.items() if name not in before]
+
+    def _rebuild(self):
+        specs = {spec.name: spec for spec in self.configured}
+        configured_urls = {spec.url for spec in self.configured}
+        for parent in self.configured:
+            if not parent.discover:
+                continue
+            for url, name in self.discovered.get(parent.name, ()):
+                if url not in configured_urls and name not in specs:
+                    specs[name] = parent.derive(name, url)
+        by_url = {}
+        for spec in specs.values():
+            by_url.setdefault(spec.url, []).append(spec)
+        self.specs, self._by_url = specs, by_url
+
+    def discovering(self):
+        """Категории, для которых нужно обходить каталог"""
+        return [spec for spec in self.configured if spec.discover]
+
+    def sources(self):
+        """(url, категория) всех категорий в порядке опроса"""
+        return [(spec.url, spec.name) for spec in self.specs.values()]
+
+    def spec(self, url, category):
+        """Категория по названию; неизвестная получает правила по умолчанию"""
+        spec = self.specs.get(category)
+        if spec is None:
+            spec = self._adhoc.get((url, category))
+            if spec is None:
+                spec = self._adhoc[(url, category)] = CategorySpec(category, url, INCLUDE_TERMS, EXCLUDE_TERMS)
+        return spec
+
+    def for_url(self, url, category):
+        """Все категории, которые разбираются при загрузке url"""
+        return self._by_url.get(url) or [self.spec(url, category)]
+
+def filter_cards(cards, url, spec, counts):
+    """Стадия фильтра: товары категории spec из потока карточек (онлайн и офлайн)
+    
+    counts пополняется по ходу: seen, online, offline, matched (онлайн).
+    """
+    for card in cards:
+        counts['seen'] += 1
+        try:
+            # 1. Проверяем статус продавца (ОНЛАЙН/ОФФЛАЙН)
+            seller_online = False
+            
+            # Ищем статус продавца
+            status_text = card['status']
+            if status_text is not None:
+                if 'Онлайн' in status_text or 'online' in status_text.lower():
+                    seller_online = True
+                    counts['online'] += 1
+                else:
+                    # Офлайн-товары не уведомляются, но нужны для сравнения списков
+                    counts['offline'] += 1
+            else:
+                # Если статус не найден, пропускаем для безопасности
+                continue
+            
+            # 2. Извлекаем название товара
+            title = card['title']
+            if title is None:
+                continue
+            
+            # 3. Фильтруем по ключевым словам категории
+            if not spec.matcher.matches(title):
+                continue
+            
+            # 4. Извлекаем цену
+            price_text = card['price']
+            if price_text is None:
+                continue
+            
+            # Извлекаем цифры из цены
+            digits = re.findall(r'\d+', price_text.replace(' ', ''))
+            if not digits:
+                continue
+            
+            price = int(''.join(digits))
+            
+            # Фильтр по цене (по умолчанию от 10 до 50000 руб)
+            if price < spec.price_min or price > spec.price_max:
+                continue
+            
+            # 5. Извлекаем ссылку на товар
+            link = url
+            href = card['href']
+            if href:
+                if href.startswith('/'):
+                    link = f"{FUNPAY_BASE_URL}{href}"
+                elif href.startswith('http'):
+                    link = href
+            
+            # 6. ID товара — номер предложения FunPay, не зависит от цены
+            item_id = offer_key(title, link, card['seller'], card['server'], price)
+            
+            if seller_online:
+                counts['matched'] += 1
+                logger.info(f"   ✅ [ОНЛАЙН] '{title[:50]}...' - {price} руб.")
+            
+            # 7. Отдаем товар дальше по конвейеру
+            yield {
+                'id': item_id,
+                'title': title[:100],
+                'price': price,
+                'link': link,
+                'category': spec.name,
+                'seller': card['seller'],
+                'server': card['server'],
+                'seller_online': seller_online
+            }
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка обработки карточки: {e}")
+            continue
+
+class ListingScan:
+    """Поток товаров категории spec на одной странице: разбор → фильтр → ранняя остановка
+    
+    Итерируется один раз. Если задан stop_after, то после stop_after уже
+    известных (known) предложений подряд остаток страницы не разбирается —
+    это для списков, отсортированных от новых к старым. Тогда truncated
+    становится True, и пропавшие товары по такому обходу не ищутся.
+    cards — общий CardBuffer, если страницу разбирают несколько категорий.
+    sellers после обхода: продавец -> [онлайн, самый дешевый товар, число товаров].
+    """
+
+    def __init__(self, result, spec, known=(), stop_after=0, cards=None):
+        self.result = result
+        self.spec = spec
+        self.cards = cards
+        self.known = known
+        self.stop_after = stop_after
+        self.truncated = False
+        self.counts = {'seen': 0, 'online': 0, 'offline': 0, 'matched': 0}
+        self.yielded = 0
+        self.sellers = {}
+
+    def __iter__(self):
+        url = self.result.url
+        started = time.perf_counter()
+        streak = 0
+        cards = self.cards if self.cards is not None else self.spec.cards(self.result.text)
+        for item in filter_cards(cards, url, self.spec, self.counts):
+            self.yielded += 1
+            if item['seller']:
+                seller = self.sellers.setdefault(item['seller'], [item['seller_online'], item, 0])
+                seller[2] += 1
+                if item['price'] < seller[1]['price']:
+                    seller[1] = item
+            yield item
+            streak = streak + 1 if item['id'] in self.known else 0
+            if self.stop_after and streak >= self.stop_after:
+                self.truncated = True
+                break
+        
+        counts = self.counts
+        logger.info(f"📦 Найдено карточек: {counts['seen']}" + (" (остановлено на известных)" if self.truncated else ""))
+        logger.info(f"📊 Статистика парсинга:")
+        logger.info(f"   • Онлайн продавцов: {counts['online']}")
+        logger.info(f"   • Офлайн продавцов: {counts['offline']}")
+        logger.info(f"   • {self.spec.name}: {counts['matched']} онлайн, {self.yielded - counts['matched']} офлайн")
+        
+        parse_latency.observe(time.perf_counter() - started, source=url)
+        for state, count in counts.items():
+            cards_seen.inc(count, category=self.spec.name, state=state)
+            cards_last_cycle.set(count, category=self.spec.name, state=state)
+
+_OFFER_ID_RE = re.compile(r'[?&]id=([^&#]+)')
+
+def offer_key(title, link, seller=None, server=None, price=None):
+    """Стабильный ключ предложения: id оффера FunPay (целиком, у валюты он составной:
+    2236456-186-1-29-0) или хэш названия, ссылки, продавца, сервера и цены
+    
+    Без id у всех карточек страницы одна ссылка, поэтому одинаковые названия
+    разных продавцов различаются остальными полями.
+    """
+    match = _OFFER_ID_RE.search(link)
+    if match:
+        return f"o{match.group(1)}"
+    fields = '\n'.join(str(field) for field in (title, link, seller or '', server or '', price if price is not None else ''))
+    return 'h' + hashlib.blake2b(fields.encode('utf-8'), digest_size=8).hexdigest()
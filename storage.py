@@ -0,0 +1,567 @@
+"""Состояние в SQLite: увиденные предложения, история цен, журнал событий, присутствие продавцов"""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from config import (
+    ALERT_MEDIAN_DAYS, ALERT_MEDIAN_RATIO, ALERT_MIN_SAMPLES, PRESENCE_HISTORY_DAYS,
+    PRESENCE_STALE, PRESENCE_TTL_DAYS, PRESENCE_WEEKS, RECENT_EVENTS_LIMIT, SEEN_MEMORY_LIMIT,
+    SEEN_TTL_DAYS, STATE_DB_PATH,
+)
+
+def open_state_db(path=STATE_DB_PATH):
+    """Соединение с SQLite в режиме WAL"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+class DedupStore:
+    """Множество уже отправленных товаров: LRU в памяти поверх таблицы SQLite
+    
+    В памяти держится не больше memory_limit ключей (ключ -> время последнего
+    появления и последняя цена), остальное дочитывается из SQLite по первичному
+    ключу. Записи старше ttl считаются забытыми. Изменения копятся и пишутся
+    одной транзакцией в flush() в конце цикла. warm — результат snapshot()
+    прошлого процесса: если таблица с тех пор не менялась, память берется из
+    него вместо прогрева запросом (restored=True).
+    """
+
+    PRUNE_INTERVAL = 3600
+    TOUCH_INTERVAL = 86400
+
+    def __init__(self, connection, memory_limit=SEEN_MEMORY_LIMIT, ttl=SEEN_TTL_DAYS * 86400, warm=None):
+        self.db = connection
+        self.memory_limit = memory_limit
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS seen ('
+            'key TEXT PRIMARY KEY, price INTEGER, first_seen INTEGER, last_seen INTEGER'
+            ') WITHOUT ROWID'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS seen_last_seen ON seen (last_seen)')
+        self.restored = warm is not None and self.last_write() == warm[2]
+        if self.restored:
+            entries, self._count, _ = warm
+            for key, last_seen, price in entries:
+                self._memory[key] = (last_seen, price)
+            return
+        self._count = self.db.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+        
+        # Прогреваем память самыми свежими ключами
+        rows = self.db.execute(
+            'SELECT key, last_seen, price FROM seen WHERE last_seen >= ? ORDER BY last_seen DESC LIMIT ?',
+            (int(time.time()) - self.ttl, self.memory_limit),
+        ).fetchall()
+        for key, last_seen, price in reversed(rows):
+            self._memory[key] = (last_seen, price)
+
+    def __len__(self):
+        return self._count
+
+    def last_write(self):
+        """Самое позднее время записи в таблице (по индексу last_seen)"""
+        return self.db.execute('SELECT MAX(last_seen) FROM seen').fetchone()[0] or 0
+
+    def snapshot(self):
+        """Ключи памяти от давних к свежим, размер и время последней записи таблицы"""
+        with self._lock:
+            entries = [(key, last_seen, price) for key, (last_seen, price) in self._memory.items()]
+            return entries, self._count, self.last_write()
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def price(self, key):
+        """Последняя известная цена предложения или None, если оно не встречалось"""
+        entry = self._lookup(key)
+        return entry[1] if entry else None
+
+    def _lookup(self, key):
+        now = int(time.time())
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self.db.execute('SELECT last_seen, price FROM seen WHERE key = ?', (key,)).fetchone()
+                if entry is None:
+                    return None
+            if entry[0] < now - self.ttl:
+                return None
+            self._remember(key, entry)
+            return entry
+
+    def _remember(self, key, entry):
+        self._memory[key] = tuple(entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_limit:
+            self._memory.popitem(last=False)
+
+    def add(self, key, price):
+        """Отметить товар как увиденный (новый или повторно встреченный)"""
+        with self._lock:
+            self._add(key, price)
+
+    def touch(self, key, price):
+        """Продлить срок жизни неизменившегося предложения (пишется не чаще раза в сутки)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[0] < time.time() - self.TOUCH_INTERVAL:
+                self._add(key, price)
+
+    def _add(self, key, price):
+        now = int(time.time())
+        self._remember(key, (now, price))
+        self._pending[key] = (key, price, now, now)
+
+    def flush(self):
+        """Записать накопленные за цикл изменения одной транзакцией"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            if not pending:
+                return
+            now = int(time.time())
+            with self.db:
+                self.db.execute('BEGIN')
+                # Размер таблицы ведется по числу вставленных и удаленных строк, без COUNT(*)
+                self._count += self.db.executemany(
+                    'INSERT OR IGNORE INTO seen (key, price, first_seen, last_seen) VALUES (?, ?, ?, ?)',
+                    pending,
+                ).rowcount
+                self.db.executemany(
+                    'UPDATE seen SET price = ?, last_seen = ? WHERE key = ?',
+                    [(price, last_seen, key) for key, price, _, last_seen in pending],
+                )
+                if now - self._last_prune >= self.PRUNE_INTERVAL:
+                    self._last_prune = now
+                    self._count -= self.db.execute('DELETE FROM seen WHERE last_seen < ?', (now - self.ttl,)).rowcount
+
+class PriceHistory:
+    """История цен: наблюдения предложений и почасовые сводки по категориям
+    
+    В price_history строка (категория, предложение, продавец, цена, время)
+    добавляется, когда предложение появляется или меняет цену, — повторные
+    наблюдения той же цены не дублируются. Для быстрых запросов по месяцам
+    данных каждый цикл обновляет почасовую сводку категории в price_rollup:
+    число предложений за час, минимум, максимум, сумму и гистограмму цен по
+    логарифмическим корзинам с шагом 5%, из которой считаются медиана и
+    перцентили.
+    """
+
+    BUCKET_BASE = 1.05
+    MEDIAN_CACHE_SECONDS = 600
+
+    def __init__(self, connection):
+        self.db = connection
+        self._lock = threading.Lock()
+        self._hours = {}        # категория -> (начало часа, {предложение: цена})
+        self._dirty = set()
+        self._pending = []
+        self._medians = {}
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS price_history ('
+            'category TEXT, offer TEXT, seller TEXT, price INTEGER, ts INTEGER)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS price_history_offer ON price_history (offer, ts)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS price_history_category ON price_history (category, ts)')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS price_rollup ('
+            'category TEXT, hour INTEGER, offers INTEGER, min_price INTEGER, max_price INTEGER, '
+            'sum_price INTEGER, buckets TEXT, PRIMARY KEY (category, hour)) WITHOUT ROWID'
+        )
+
+    def _bucket(self, price):
+        return int(math.log(max(price, 1), self.BUCKET_BASE))
+
+    def _bucket_price(self, bucket):
+        return self.BUCKET_BASE ** (bucket + 0.5)
+
+    def record(self, category, snapshot, events):
+        """Учесть товары категории за цикл (отпечаток ListingDiff); в сырую историю идут только новые цены"""
+        now = int(time.time())
+        hour = now - now % 3600
+        with self._lock:
+            current = self._hours.get(category)
+            if current is None or current[0] != hour:
+                current = self._hours[category] = (hour, {})
+            prices = current[1]
+            for key, (price, _) in snapshot.items():
+                prices[key] = price
+            for event in events:
+                if event['type'] in ('new', 'price_drop', 'price_rise'):
+                    item = event['item']
+                    self._pending.append((category, item['id'], item.get('seller'), item['price'], now))
+            self._dirty.add(category)
+
+    def flush(self):
+        """Записать новые цены и обновить сводки текущего часа"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            rollups = []
+            for category in self._dirty:
+                hour, prices = self._hours[category]
+                if not prices:
+                    continue
+                buckets = {}
+                for price in prices.values():
+                    bucket = self._bucket(price)
+                    buckets[bucket] = buckets.get(bucket, 0) + 1
+                values = prices.values()
+                rollups.append((category, hour, len(prices), min(values), max(values), sum(values),
+                                json.dumps(buckets)))
+            self._dirty.clear()
+            if not pending and not rollups:
+                return
+            with self.db:
+                self.db.execute('BEGIN')
+                self.db.executemany('INSERT INTO price_history VALUES (?, ?, ?, ?, ?)', pending)
+                self.db.executemany('INSERT OR REPLACE INTO price_rollup VALUES (?, ?, ?, ?, ?, ?, ?)', rollups)
+
+    def stats(self, since, until=None, category=None, percentiles=(0.1, 0.25, 0.5, 0.75, 0.9)):
+        """Цены по категориям за окно из почасовых сводок: {категория: статистика}"""
+        query = 'SELECT category, offers, min_price, max_price, sum_price, buckets FROM price_rollup WHERE hour >= ?'
+        params = [since - since % 3600]
+        if until is not None:
+            query += ' AND hour < ?'
+            params.append(until)
+        if category is not None:
+            query += ' AND category = ?'
+            params.append(category)
+        with self._lock:
+            rows = self.db.execute(query, params).fetchall()
+        
+        merged = {}
+        for name, offers, min_price, max_price, sum_price, buckets in rows:
+            total = merged.setdefault(name, {'samples': 0, 'min': min_price, 'max': max_price, 'sum': 0, 'buckets': {}})
+            total['samples'] += offers
+            total['min'] = min(total['min'], min_price)
+            total['max'] = max(total['max'], max_price)
+            total['sum'] += sum_price
+            for bucket, count in json.loads(buckets).items():
+                total['buckets'][int(bucket)] = total['buckets'].get(int(bucket), 0) + count
+        
+        result = {}
+        for name, total in merged.items():
+            stats = {
+                'samples': total['samples'],
+                'min': total['min'],
+                'max': total['max'],
+                'mean': round(total['sum'] / total['samples'], 2),
+            }
+            for fraction in percentiles:
+                label = 'median' if fraction == 0.5 else f"p{round(fraction * 100):g}"
+                stats[label] = self._percentile(total, fraction)
+            result[name] = stats
+        return result
+
+    def _percentile(self, total, fraction):
+        """Перцентиль по гистограмме (точность — ширина корзины, 5%)"""
+        rank = fraction * total['samples']
+        seen = 0
+        for bucket in sorted(total['buckets']):
+            seen += total['buckets'][bucket]
+            if seen >= rank:
+                return min(total['max'], max(total['min'], round(self._bucket_price(bucket))))
+        return total['max']
+
+    def series(self, category, since, until=None):
+        """Почасовой ряд категории: [(час, предложений, минимум, медиана, максимум)]"""
+        query = ('SELECT hour, offers, min_price, max_price, sum_price, buckets FROM price_rollup '
+                 'WHERE category = ? AND hour >= ?')
+        params = [category, since - since % 3600]
+        if until is not None:
+            query += ' AND hour < ?'
+            params.append(until)
+        with self._lock:
+            rows = self.db.execute(query + ' ORDER BY hour', params).fetchall()
+        series = []
+        for hour, offers, min_price, max_price, sum_price, buckets in rows:
+            total = {'samples': offers, 'min': min_price, 'max': max_price,
+                     'buckets': {int(bucket): count for bucket, count in json.loads(buckets).items()}}
+            series.append((hour, offers, min_price, self._percentile(total, 0.5), max_price))
+        return series
+
+    def history(self, since, until=None, offer=None, category=None, seller=None, limit=1000):
+        """Сырые наблюдения цен, новые сначала"""
+        query = 'SELECT category, offer, seller, price, ts FROM price_history WHERE ts >= ?'
+        params = [since]
+        for column, value in (('offer', offer), ('category', category), ('seller', seller)):
+            if value is not None:
+                query += f' AND {column} = ?'
+                params.append(value)
+        if until is not None:
+            query += ' AND ts < ?'
+            params.append(until)
+        query += ' ORDER BY ts DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            return self.db.execute(query, params).fetchall()
+
+    def median(self, category, days=ALERT_MEDIAN_DAYS, min_samples=ALERT_MIN_SAMPLES):
+        """Медиана цены категории за days дней (кэшируется) или None, если данных мало"""
+        now = time.time()
+        cached = self._medians.get(category)
+        if cached and now - cached[0] < self.MEDIAN_CACHE_SECONDS:
+            return cached[1]
+        stats = self.stats(int(now) - days * 86400, category=category, percentiles=(0.5,)).get(category)
+        median = stats['median'] if stats and stats['samples'] >= min_samples else None
+        self._medians[category] = (now, median)
+        return median
+
+    def is_good_price(self, category, price):
+        """Цена ниже медианы категории (без накопленной истории подходит любая)"""
+        median = self.median(category)
+        return median is None or price < median * ALERT_MEDIAN_RATIO
+
+class EventRing:
+    """Кольцевой журнал последних событий фиксированного размера (SQLite)
+    
+    Событию присваивается возрастающий номер seq, строка пишется в слот
+    seq % capacity, поэтому таблица никогда не растет больше capacity.
+    Номер служит курсором для постраничного чтения в /api/items.
+    """
+
+    COLUMNS = ('seq', 'ts', 'type', 'offer', 'category', 'title', 'price', 'old_price', 'seller', 'online', 'link')
+
+    def __init__(self, connection, capacity=RECENT_EVENTS_LIMIT):
+        self.db = connection
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._pending = []
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS event_ring (slot INTEGER PRIMARY KEY, seq INTEGER, ts INTEGER, '
+            'type TEXT, offer TEXT, category TEXT, title TEXT, price INTEGER, old_price INTEGER, '
+            'seller TEXT, online INTEGER, link TEXT)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS event_ring_seq ON event_ring (seq)')
+        self.seq = self.db.execute('SELECT COALESCE(MAX(seq), 0) FROM event_ring').fetchone()[0]
+
+    def extend(self, events, category):
+        """Добавить события цикла (пишутся в flush)"""
+        now = int(time.time())
+        with self._lock:
+            for event in events:
+                item = event['item']
+                self.seq += 1
+                self._pending.append((
+                    self.seq % self.capacity, self.seq, now, event['type'], item['id'], category,
+                    item.get('title'), item['price'], event['old_price'], item.get('seller'),
+                    item.get('seller_online'), item.get('link'),
+                ))
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                with self.db:
+                    self.db.execute('BEGIN')
+                    self.db.executemany('INSERT OR REPLACE INTO event_ring VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', pending)
+
+    def query(self, before=None, after=None, limit=50, min_price=None, max_price=None,
+              since=None, until=None, kind=None, category=None):
+        """События по фильтрам: новые сначала (курсор before) или после курсора after по возрастанию"""
+        conditions = []
+        params = []
+        for condition, value in (('seq < ?', before), ('seq > ?', after), ('price >= ?', min_price),
+                                 ('price <= ?', max_price), ('ts >= ?', since), ('ts < ?', until),
+                                 ('type = ?', kind), ('category = ?', category)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM event_ring"
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f" ORDER BY seq {'ASC' if after is not None else 'DESC'} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def latest(self):
+        """Номер последнего записанного события"""
+        with self._lock:
+            return self.db.execute('SELECT COALESCE(MAX(seq), 0) FROM event_ring').fetchone()[0]
+
+class SellerPresence:
+    """Присутствие продавцов: когда онлайн сейчас и в какие часы обычно
+    
+    Лидер держит состояние в памяти и после каждого разбора страницы отмечает
+    статус продавцов ее карточек. Смены статуса хранятся отрезками (время
+    начала и статус, за последние history секунд), активность — битовой маской
+    168 часов недели на каждую из последних weeks недель: бит ставится, если
+    продавец был онлайн в этот час. Изменения пишутся в таблицу seller_presence
+    в flush(), откуда /api/sellers читают все воркеры.
+    
+    Статусы последнего разбора запоминаются по источнику (категории): если
+    страница не изменилась (304 или тот же отпечаток), refresh() отмечает тех же
+    продавцов снова, и спокойный рынок не выглядит как пропавшие продавцы.
+    """
+
+    HOURS_PER_WEEK = 168
+    PERSIST_INTERVAL = 300
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, connection, history=PRESENCE_HISTORY_DAYS * 86400, weeks=PRESENCE_WEEKS,
+                 ttl=PRESENCE_TTL_DAYS * 86400):
+        self.db = connection
+        self.history = history
+        self.weeks = weeks
+        self.ttl = ttl
+        self._sellers = {}
+        self.sources = {}        # источник -> {продавец: онлайн} последнего разбора
+        self._dirty = set()
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS seller_presence (seller TEXT PRIMARY KEY, online INTEGER, '
+            'since INTEGER, last_seen INTEGER, runs TEXT, weeks TEXT) WITHOUT ROWID'
+        )
+
+    def __len__(self):
+        return len(self._sellers)
+
+    def load(self):
+        """Прочитать сохраненное состояние в память (процесс-лидер)"""
+        with self._lock:
+            rows = self.db.execute('SELECT seller, online, since, last_seen, runs, weeks FROM seller_presence').fetchall()
+            self._sellers = {
+                seller: {'online': bool(online), 'since': since, 'last_seen': last_seen, 'saved': last_seen,
+                         'runs': json.loads(runs), 'weeks': json.loads(weeks)}
+                for seller, online, since, last_seen, runs, weeks in rows
+            }
+
+    @staticmethod
+    def _hour_of_week(ts):
+        moment = datetime.fromtimestamp(ts)
+        return moment.weekday() * 24 + moment.hour
+
+    def observe(self, source, sellers, partial=False, now=None):
+        """Отметить статусы {продавец: онлайн} источника; возвращает продавцов, вышедших онлайн
+        
+        partial — страница разобрана не до конца: остальные продавцы источника
+        остаются в статусе прошлого разбора.
+        """
+        now = int(now or time.time())
+        hour = self._hour_of_week(now)
+        week = now // (7 * 86400)
+        came_online = []
+        with self._lock:
+            if partial:
+                sellers = dict(self.sources.get(source, {}), **sellers)
+            self.sources[source] = sellers
+            for seller, online in sellers.items():
+                state = self._sellers.get(seller)
+                if state is None:
+                    state = self._sellers[seller] = {'online': online, 'since': now, 'last_seen': now, 'saved': 0,
+                                                     'runs': [now * 2 + online], 'weeks': []}
+                elif state['online'] != online:
+                    if online:
+                        came_online.append(seller)
+                    state['online'] = online
+                    state['since'] = now
+                    state['runs'].append(now * 2 + online)
+                    # Отрезок, начавшийся до окна истории, остается, если он еще продолжался в окне
+                    while len(state['runs']) > 1 and state['runs'][1] // 2 < now - self.history:
+                        state['runs'].pop(0)
+                    state['saved'] = 0
+                state['last_seen'] = now
+                if online:
+                    weeks = state['weeks']
+                    if not weeks or weeks[-1][0] != week:
+                        weeks.append([week, 0])
+                        del weeks[:-self.weeks]
+                    if not weeks[-1][1] >> hour & 1:
+                        weeks[-1][1] |= 1 << hour
+                        state['saved'] = 0
+                if now - state['saved'] >= self.PERSIST_INTERVAL:
+                    self._dirty.add(seller)
+        return came_online
+
+    def refresh(self, source):
+        """Страница источника не изменилась: продавцы прошлого разбора в том же статусе"""
+        self.observe(source, self.sources.get(source, {}))
+
+    def flush(self):
+        """Записать изменившихся продавцов; раз в час забыть не встречавшихся дольше ttl"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for seller in self._dirty:
+                state = self._sellers.get(seller)
+                if state is None:
+                    continue
+                state['saved'] = state['last_seen']
+                rows.append((seller, int(state['online']), state['since'], state['last_seen'],
+                             json.dumps(state['runs']), json.dumps(state['weeks'])))
+            self._dirty.clear()
+            expired = []
+            if now - self._last_prune >= self.PRUNE_INTERVAL:
+                self._last_prune = now
+                expired = [seller for seller, state in self._sellers.items() if state['last_seen'] < now - self.ttl]
+                for seller in expired:
+                    del self._sellers[seller]
+            if not rows and not expired:
+                return
+            with self.db:
+                self.db.execute('BEGIN')
+                self.db.executemany('INSERT OR REPLACE INTO seller_presence VALUES (?, ?, ?, ?, ?, ?)', rows)
+                self.db.execute('DELETE FROM seller_presence WHERE last_seen < ?', (now - self.ttl,))
+
+    def activity(self, weeks):
+        """Доля недель, в которые продавец был онлайн, для каждого из 168 часов недели (с понедельника)"""
+        if not weeks:
+            return [0.0] * self.HOURS_PER_WEEK
+        return [round(sum(bits >> hour & 1 for _, bits in weeks) / len(weeks), 2)
+                for hour in range(self.HOURS_PER_WEEK)]
+
+    def _describe(self, row, details=False):
+        seller, online, since, last_seen, runs, weeks = row
+        activity = self.activity(json.loads(weeks))
+        by_hour = [sum(activity[day * 24 + hour] for day in range(7)) / 7 for hour in range(24)]
+        info = {
+            'seller': seller,
+            'online': bool(online) and last_seen >= time.time() - PRESENCE_STALE,
+            'since': since,
+            'last_seen': last_seen,
+            'active_hours': [hour for hour, share in enumerate(by_hour) if share >= 0.5],
+        }
+        if details:
+            runs = json.loads(runs)
+            info['timeline'] = [
+                {'from': run // 2, 'to': runs[index + 1] // 2 if index + 1 < len(runs) else None, 'online': bool(run & 1)}
+                for index, run in enumerate(runs)
+            ]
+            info['hour_of_week'] = activity
+        return info
+
+    def query(self, online=None, limit=100):
+        """Продавцы по времени последней смены статуса (сначала недавние); online=True — только онлайн сейчас"""
+        query = 'SELECT seller, online, since, last_seen, runs, weeks FROM seller_presence'
+        params = []
+        if online is not None:
+            query += ' WHERE online = ? AND last_seen >= ?' if online else ' WHERE (online = ? OR last_seen < ?)'
+            params += [1 if online else 0, int(time.time() - PRESENCE_STALE)]
+        query += ' ORDER BY since DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [self._describe(row) for row in rows]
+
+    def seller(self, name):
+        """Статус, отрезки онлайн/офлайн и активность по часам одного продавца или None"""
+        with self._lock:
+            row = self.db.execute('SELECT seller, online, since, last_seen, runs, weeks FROM seller_presence '
+                                  'WHERE seller = ?', (name,)).fetchone()
+        return self._describe(row, details=True) if row else None
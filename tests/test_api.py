@@ -0,0 +1,30 @@
+"""JSON API страниц статуса"""
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+import app
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+@pytest.mark.parametrize('path', ['/api/items', '/api/history?category=x', '/api/sellers'])
+@pytest.mark.parametrize('limit', ['0', '-5', 'x', '1.5'])
+def test_invalid_limit_is_rejected(client, path, limit):
+    separator = '&' if '?' in path else '?'
+    response = client.get(f"{path}{separator}limit={limit}")
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+def test_items_page_with_valid_limit(client):
+    response = client.get('/api/items?limit=1')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['items'] == [] and body['next_cursor'] is None
@@ -0,0 +1,40 @@
+"""Кластеры почти одинаковых предложений"""
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+from diff import ListingClusters
+
+CATEGORY = 'Black Russia - Вирты'
+
+def event(offer_id, title, price, seller):
+    return {'type': 'new', 'old_price': None,
+            'item': {'id': offer_id, 'title': title, 'price': price, 'seller': seller}}
+
+def test_similar_titles_collapse_into_one_notification():
+    clusters = ListingClusters()
+    collapsed = clusters.collapse(CATEGORY, {'chat': [
+        event('o1', 'Вирты Black Russia 10кк быстро', 100, 'a'),
+        event('o2', '🔥 ВИРТЫ black russia 10кк, быстро!', 98, 'b'),
+        event('o3', 'Вирты Black Russia 50кк быстро', 100, 'c'),
+    ]})
+    assert sorted(item['item']['id'] for item in collapsed['chat']) == ['o2', 'o3']
+    cluster = next(item['cluster'] for item in collapsed['chat'] if item['item']['id'] == 'o2')
+    assert cluster['offers'] == 2 and cluster['sellers'] == 2
+
+def test_removed_offers_leave_their_cluster():
+    clusters = ListingClusters()
+    clusters.collapse(CATEGORY, {'chat': [
+        event('o1', 'Вирты Black Russia 10кк быстро', 100, 'a'),
+        event('o2', 'ВИРТЫ black russia 10кк быстро', 100, 'b'),
+        event('o3', 'вирты Black Russia 10кк, быстро', 100, 'c'),
+    ]})
+    clusters.remove(CATEGORY, ['o1', 'o2', 'unknown'])
+    
+    collapsed = clusters.collapse(CATEGORY, {'chat': [event('o4', 'Вирты Black Russia 10кк быстро!', 95, 'd')]})
+    assert collapsed['chat'][0]['cluster']['offers'] == 2
+    assert collapsed['chat'][0]['cluster']['sellers'] == 2
@@ -0,0 +1,57 @@
+"""Хранилище уже увиденных предложений"""
+import os
+import sqlite3
+import tempfile
+import time
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+from storage import DedupStore, open_state_db
+
+def test_memory_is_bounded_and_evicted_keys_come_from_sqlite():
+    store = DedupStore(sqlite3.connect(':memory:', isolation_level=None), memory_limit=3)
+    for number in range(10):
+        store.add(f"o{number}", number * 10)
+    assert len(store._memory) == 3
+    assert list(store._memory) == ['o7', 'o8', 'o9']
+    store.flush()
+    assert len(store) == 10
+    assert store.price('o0') == 0
+    assert list(store._memory) == ['o8', 'o9', 'o0']
+
+def test_count_follows_inserts_updates_and_pruning():
+    store = DedupStore(sqlite3.connect(':memory:', isolation_level=None), ttl=100)
+    store.add('o1', 100)
+    store.add('o2', 200)
+    store.flush()
+    store.add('o1', 90)
+    store.touch('o2', 200)
+    store.flush()
+    assert len(store) == 2
+    assert store.price('o1') == 90
+    
+    store.db.execute('UPDATE seen SET last_seen = ? WHERE key = ?', (int(time.time()) - 1000, 'o2'))
+    store._last_prune = 0
+    store.add('o3', 300)
+    store.flush()
+    assert len(store) == 2
+    assert store.db.execute('SELECT COUNT(*) FROM seen').fetchone()[0] == 2
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / 'state.db')
+    store = DedupStore(open_state_db(path))
+    store.add('o1', 100)
+    store.add('o2', 200)
+    store.flush()
+    
+    restarted = DedupStore(open_state_db(path))
+    assert len(restarted) == 2
+    assert restarted.price('o2') == 200
+    assert 'o3' not in restarted
+    
+    warm = DedupStore(open_state_db(path), warm=store.snapshot())
+    assert warm.restored
+    assert len(warm) == 2 and warm.price('o1') == 100
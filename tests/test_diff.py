@@ -0,0 +1,71 @@
+"""Сравнение списков товаров между опросами"""
+import os
+import sqlite3
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+import app
+from config import URLS_TO_MONITOR
+from parsing import ListingScan, filter_cards
+from fetch import FetchResult
+from diff import EmptyListing, ListingDiff
+from storage import DedupStore
+from bench.fixtures import synthetic_page
+
+def listing(*offers):
+    return [{'id': key, 'price': price, 'seller_online': True} for key, price in offers]
+
+def kinds(events):
+    return sorted((event['type'], event['item']['id']) for event in events)
+
+def make_diff():
+    return ListingDiff(DedupStore(sqlite3.connect(':memory:')))
+
+def test_categories_of_one_page_get_their_own_new_events():
+    diff = make_diff()
+    page = listing(('o1', 100), ('o2', 200))
+    assert kinds(diff.update('Вирты', page)) == [('new', 'o1'), ('new', 'o2')]
+    assert kinds(diff.update('Вирты оптом', page)) == [('new', 'o1'), ('new', 'o2')]
+    assert diff.update('Вирты оптом', page) == []
+
+def test_restart_compares_with_stored_prices():
+    store = DedupStore(sqlite3.connect(':memory:'))
+    ListingDiff(store).update('Вирты', listing(('o1', 100)))
+    events = ListingDiff(store).update('Вирты', listing(('o1', 90), ('o2', 50)))
+    assert kinds(events) == [('new', 'o2'), ('price_drop', 'o1')]
+
+def test_page_without_cards_keeps_previous_listing():
+    url, category = URLS_TO_MONITOR[0]
+    spec = app.categories.for_url(url, category)[0]
+    diff = make_diff()
+    
+    good = FetchResult(url, 200, synthetic_page(50))
+    diff.update(spec.name, ListingScan(good, spec))
+    known = dict(diff.known(spec.name))
+    assert known
+    
+    broken = FetchResult(url, 200, '<html><body><h1>Технические работы</h1></body></html>')
+    with pytest.raises(EmptyListing):
+        diff.update(spec.name, ListingScan(broken, spec))
+    assert diff.known(spec.name) == known
+    assert diff.update(spec.name, ListingScan(good, spec)) == []
+
+def test_cards_without_link_get_distinct_keys():
+    url, category = URLS_TO_MONITOR[0]
+    spec = app.categories.for_url(url, category)[0]
+    cards = [
+        {'status': 'Онлайн', 'seller': seller, 'server': 'Red', 'title': 'Вирты Black Russia 10кк',
+         'price': price, 'href': None, 'has_link': False}
+        for seller, price in (('seller1', '100 ₽'), ('seller2', '100 ₽'), ('seller1', '120 ₽'))
+    ]
+    counts = {'seen': 0, 'online': 0, 'offline': 0, 'matched': 0}
+    items = list(filter_cards(cards, url, spec, counts))
+    assert len(items) == 3
+    assert len({item['id'] for item in items}) == 3
+    assert kinds(make_diff().update(spec.name, items)) == sorted(('new', item['id']) for item in items)
@@ -0,0 +1,60 @@
+"""Очередь уведомлений Telegram"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+from dispatcher import NotificationDispatcher
+
+class FlakyBot:
+    """Первая отправка падает не ошибкой Telegram, остальные проходят"""
+
+    def __init__(self):
+        self.calls = 0
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('сломанная разметка')
+        self.sent.append((chat_id, text))
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_chat_keeps_sending_after_unexpected_error():
+    bot = FlakyBot()
+    dispatcher = NotificationDispatcher(lambda: bot, chat_rate=1000, chat_burst=10, global_rate=1000)
+    dispatcher.send(1, 'первое')
+    dispatcher.send(1, 'второе')
+    wait_for(lambda: dispatcher.depth == 0)
+    assert bot.sent == [('1', 'второе')]
+    assert dispatcher.failed == 1
+    
+    dispatcher.send(1, 'третье')
+    wait_for(lambda: dispatcher.depth == 0)
+    assert bot.sent[-1] == ('1', 'третье')
+
+def test_bot_factory_failure_is_retried_on_next_message():
+    bot = FlakyBot()
+    bot.calls = 1
+    attempts = []
+    
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError('нет сети')
+        return bot
+    
+    dispatcher = NotificationDispatcher(factory, chat_rate=1000, chat_burst=10, global_rate=1000)
+    dispatcher.send(1, 'первое')
+    dispatcher.send(1, 'второе')
+    wait_for(lambda: dispatcher.depth == 0)
+    assert bot.sent == [('1', 'второе')]
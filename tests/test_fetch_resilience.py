@@ -0,0 +1,89 @@
+"""Размыкатель цепи хоста и ротация прокси/User-Agent"""
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+from fetch import CircuitBreaker, RotatingPool
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('fetch.time.monotonic', clock)
+    return clock
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker('test.host', failures=3, cooldown=10, max_cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.remaining() == 10
+
+def test_success_resets_failure_streak(clock):
+    breaker = CircuitBreaker('test.host', failures=2, cooldown=10)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+def test_half_open_probe_closes_or_doubles_cooldown(clock):
+    breaker = CircuitBreaker('test.host', failures=1, cooldown=10, max_cooldown=30)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    # Пока проба не отчиталась, следующий запрос ждет ту же паузу
+    assert not breaker.allow()
+    
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.cooldown == 20
+    clock.now += 20
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.cooldown == 30
+    
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.cooldown == 10 and breaker.failures == 0
+
+def test_retry_after_opens_immediately(clock):
+    breaker = CircuitBreaker('test.host', failures=5, cooldown=10)
+    breaker.record_failure(retry_after=120)
+    assert breaker.state == 'open'
+    assert breaker.remaining() == 120
+
+def test_pool_rotates_and_skips_benched(clock):
+    pool = RotatingPool(['a', 'b', 'c'], cooldown=30)
+    assert [pool.next() for _ in range(4)] == ['a', 'b', 'c', 'a']
+    pool.bench('b')
+    assert [pool.next() for _ in range(3)] == ['c', 'a', 'c']
+    clock.now += 30
+    assert 'b' in {pool.next() for _ in range(3)}
+
+def test_fully_benched_pool_returns_soonest_available(clock):
+    pool = RotatingPool(['a', 'b'], cooldown=30)
+    pool.bench('b')
+    clock.now += 5
+    pool.bench('a')
+    assert pool.next() == 'b'
+
+def test_empty_pool():
+    pool = RotatingPool([])
+    assert pool.next() is None
+    pool.bench(None)
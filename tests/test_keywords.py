@@ -0,0 +1,66 @@
+"""Поиск терминов в названиях"""
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+from config import DEFAULT_INCLUDE_TERMS
+from parsing import KeywordMatcher
+
+@pytest.fixture
+def matcher():
+    return KeywordMatcher(DEFAULT_INCLUDE_TERMS)
+
+@pytest.mark.parametrize('title', [
+    'Вирты Black Russia 10кк',
+    'BLACK   RUSSIA вирты',
+    'blackrussia 50кк',
+    'Блэк Раша, сервер Red',
+    'вирты на бр',
+    'BR 100кк',
+    'Black Sport 10кк',
+    'blackstars бонус',
+    'Вирты (бр)',
+])
+def test_default_terms_match(matcher, title):
+    assert matcher.matches(title)
+
+@pytest.mark.parametrize('title', [
+    'Arizona RP 10кк',
+    'brand new account',
+    'добрый продавец',
+    'Вирты Radmir RP',
+    'abr 10кк',
+    'black 10кк',
+])
+def test_word_boundaries(matcher, title):
+    assert not matcher.matches(title)
+
+def test_homoglyphs_and_transliteration():
+    matcher = KeywordMatcher(['вирты'])
+    assert matcher.matches('ВИРТЫ 10кк')
+    assert matcher.matches('virty 10кк')
+    # Латинские «о», «р» внутри кириллического слова
+    assert KeywordMatcher(['работа']).matches('pабoта')
+
+def test_exclude_wins_over_include():
+    matcher = KeywordMatcher(['black russia'], ['аккаунт*'])
+    assert matcher.matches('Black Russia вирты')
+    assert not matcher.matches('Black Russia аккаунты')
+    assert not matcher.matches('Black Russia АККАУНТ')
+
+def test_empty_include_matches_everything_not_excluded():
+    matcher = KeywordMatcher([], ['скам'])
+    assert matcher.include is None
+    assert matcher.matches('что угодно')
+    assert not matcher.matches('скам')
+
+def test_shared_prefixes_stay_distinct():
+    matcher = KeywordMatcher(['br', 'brs', 'bra*'])
+    assert matcher.matches('br') and matcher.matches('brs') and matcher.matches('brave')
+    assert not matcher.matches('brsx')
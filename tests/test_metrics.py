@@ -0,0 +1,57 @@
+"""Метрики в текстовом формате Prometheus"""
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import app
+from metrics import MetricsRegistry
+
+def test_counter_with_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter('demo_total', 'Пример', ['source', 'status'])
+    counter.inc(source='a', status=200)
+    counter.inc(2, source='a', status=200)
+    counter.inc(source='b "x"\n', status=500)
+    assert registry.render().splitlines() == [
+        '# HELP demo_total Пример',
+        '# TYPE demo_total counter',
+        'demo_total{source="a",status="200"} 3',
+        'demo_total{source="b \\"x\\"\\n",status="500"} 1',
+    ]
+
+def test_gauge_set_and_callback():
+    registry = MetricsRegistry()
+    registry.gauge('depth', 'Очередь', func=lambda: 7)
+    gauge = registry.gauge('cards', 'Карточки', ['state'])
+    gauge.set(5, state='seen')
+    gauge.set(4, state='seen')
+    lines = registry.render().splitlines()
+    assert '# TYPE depth gauge' in lines and 'depth 7' in lines
+    assert 'cards{state="seen"} 4' in lines
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Задержка', ['source'], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, source='x')
+    lines = registry.render().splitlines()
+    assert lines[1] == '# TYPE latency_seconds histogram'
+    assert lines[2:] == [
+        'latency_seconds_bucket{source="x",le="0.1"} 1',
+        'latency_seconds_bucket{source="x",le="1"} 2',
+        'latency_seconds_bucket{source="x",le="+Inf"} 3',
+        'latency_seconds_sum{source="x"} 5.55',
+        'latency_seconds_count{source="x"} 3',
+    ]
+
+def test_metrics_endpoint():
+    response = app.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+    assert '# TYPE funpay_fetch_seconds histogram' in text
@@ -0,0 +1,58 @@
+"""Разбор карточек FunPay совпадает с прежним разбором на BeautifulSoup"""
+import glob
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+from parsing import extract_cards, offer_key
+from bench.bench_parser import FIXTURES_DIR, SAVED_PAGES, legacy_extract_cards, parse_items
+from bench.fixtures import synthetic_page
+from bench.save_page import Scrubber
+
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html')))
+SAVED = sorted(glob.glob(os.path.join(FIXTURES_DIR, SAVED_PAGES)))
+
+def read_fixture(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_fixture_cards_match_legacy(path):
+    html = read_fixture(path)
+    assert extract_cards(html) == legacy_extract_cards(html)
+    assert parse_items(html, extract_cards) == parse_items(html, legacy_extract_cards)
+
+@pytest.mark.skipif(not SAVED, reason='нет сохраненных страниц FunPay: python -m bench.save_page <URL раздела>')
+@pytest.mark.parametrize('path', SAVED, ids=os.path.basename)
+def test_saved_funpay_pages_have_cards(path):
+    # Настоящая верстка: карточки должны находиться, а не совпадать на пустом списке
+    html = read_fixture(path)
+    cards = extract_cards(html)
+    assert cards and cards == legacy_extract_cards(html)
+    assert parse_items(html, extract_cards) == parse_items(html, legacy_extract_cards)
+
+@pytest.mark.parametrize('seed', [186, 1, 2024])
+def test_synthetic_cards_match_legacy(seed):
+    html = synthetic_page(200, seed=seed)
+    assert extract_cards(html) == legacy_extract_cards(html)
+
+def test_composite_offer_ids_stay_distinct():
+    html = read_fixture(os.path.join(FIXTURES_DIR, 'chips_edge_cases.html'))
+    keys = [offer_key(card['title'], card['href']) for card in extract_cards(html) if card['href']]
+    assert 'o2236456-186-1-29-0' in keys and 'o2236456-186-1-30-0' in keys
+    assert len(keys) == len(set(keys))
+
+def test_scrubbed_page_keeps_cards():
+    html = synthetic_page(50)
+    scrubbed = Scrubber().scrub(html)
+    original = extract_cards(html)
+    cards = extract_cards(scrubbed)
+    assert cards == legacy_extract_cards(scrubbed)
+    assert [dict(card, seller=None) for card in cards] == [dict(card, seller=None) for card in original]
+    assert all(card['seller'].startswith('seller') for card in cards if card['seller'])
@@ -0,0 +1,48 @@
+"""Индекс правил подписчиков"""
+import os
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import app
+
+CATEGORY = 'Black Russia - Вирты'
+
+def rule(rule_id, chat_id, min_price=None, max_price=None, keywords=(), category=None, server=None):
+    return {'id': rule_id, 'chat_id': chat_id, 'min_price': min_price, 'max_price': max_price,
+            'keywords': list(keywords), 'category': category, 'server': server}
+
+def item(title, price, server='Red', category=CATEGORY):
+    return {'title': title, 'price': price, 'server': server, 'category': category}
+
+def test_price_buckets_cover_rule_range():
+    index = app.RuleIndex([rule(1, 'a', min_price=100, max_price=500)])
+    assert index.match(item('Вирты 10кк', 100)) == {'a'}
+    assert index.match(item('Вирты 10кк', 500)) == {'a'}
+    # Та же корзина, но вне диапазона: отсекает точная проверка
+    assert index.match(item('Вирты 10кк', 99)) == set()
+    assert index.match(item('Вирты 10кк', 501)) == set()
+    assert index.match(item('Вирты 10кк', 5000)) == set()
+
+def test_open_ranges_and_top_bucket():
+    index = app.RuleIndex([rule(1, 'a', min_price=1000), rule(2, 'b', max_price=50)])
+    assert index.match(item('Вирты', 10 ** 9)) == {'a'}
+    assert index.match(item('Вирты', 1)) == {'b'}
+
+def test_posting_list_matches_whole_phrases():
+    index = app.RuleIndex([rule(1, 'a', keywords=['10 кк', 'Radmir']), rule(2, 'b', keywords=['50кк'])])
+    assert index.match(item('Вирты 10 кк быстро', 300)) == {'a'}
+    assert index.match(item('Вирты 100 кк', 300)) == set()
+    assert index.match(item('RADMIR RP вирты', 300)) == {'a'}
+    assert index.match(item('Вирты 50КК', 300)) == {'b'}
+    assert index.match(item('Вирты 50', 300)) == set()
+
+def test_rules_without_keywords_filter_by_server_and_category():
+    index = app.RuleIndex([rule(1, 'a', server='red'), rule(2, 'b', category='Другое'), rule(3, 'a', category=CATEGORY)])
+    assert index.match(item('что угодно', 300)) == {'a'}
+    assert index.match(item('что угодно', 300, server='Blue')) == {'a'}
+    assert index.match(item('что угодно', 300, category='Другое')) == {'a', 'b'}
+    assert index.match(item('что угодно', 300, server='Blue', category='Другое')) == {'b'}
@@ -0,0 +1,90 @@
+"""Присутствие продавцов: отрезки онлайн/офлайн и недельные битовые маски"""
+import os
+import sqlite3
+import tempfile
+import time
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+from storage import SellerPresence
+
+HOUR = 3600
+WEEK = 7 * 86400
+
+@pytest.fixture
+def presence():
+    return SellerPresence(sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False),
+                              history=2 * 86400, weeks=2)
+
+def test_runs_record_status_changes(presence):
+    start = int(time.time()) - 3 * HOUR
+    assert presence.observe('Вирты', {'a': False}, now=start) == []
+    assert presence.observe('Вирты', {'a': True}, now=start + HOUR) == ['a']
+    assert presence.observe('Вирты', {'a': True}, now=start + 2 * HOUR) == []
+    presence.flush()
+    
+    info = presence.seller('a')
+    assert info['last_seen'] == start + 2 * HOUR
+    # Не встречался дольше PRESENCE_STALE — уже не считается онлайн
+    assert info['online'] is False
+    assert info['timeline'] == [
+        {'from': start, 'to': start + HOUR, 'online': False},
+        {'from': start + HOUR, 'to': None, 'online': True},
+    ]
+
+def test_runs_older_than_history_are_trimmed(presence):
+    start = 1_700_000_000
+    presence.observe('Вирты', {'a': True}, now=start)
+    presence.observe('Вирты', {'a': False}, now=start + HOUR)
+    presence.observe('Вирты', {'a': True}, now=start + 3 * 86400)
+    runs = presence._sellers['a']['runs']
+    # Офлайн-отрезок продолжался в окне истории, поэтому он остается
+    assert [run // 2 for run in runs] == [start + HOUR, start + 3 * 86400]
+
+def test_weekly_bitmask_marks_online_hours(presence):
+    start = 1_700_000_000
+    presence.observe('Вирты', {'a': True}, now=start)
+    presence.observe('Вирты', {'a': False}, now=start + HOUR)
+    presence.observe('Вирты', {'a': True}, now=start + 2 * HOUR)
+    week, bits = presence._sellers['a']['weeks'][0]
+    assert week == start // WEEK
+    expected = 1 << presence._hour_of_week(start) | 1 << presence._hour_of_week(start + 2 * HOUR)
+    assert bits == expected
+
+def test_only_recent_weeks_are_kept(presence):
+    start = 1_700_000_000
+    for week in range(4):
+        presence.observe('Вирты', {'a': True}, now=start + week * WEEK)
+    weeks = presence._sellers['a']['weeks']
+    assert [week for week, _ in weeks] == [(start + 2 * WEEK) // WEEK, (start + 3 * WEEK) // WEEK]
+    activity = presence.activity(weeks)
+    assert len(activity) == SellerPresence.HOURS_PER_WEEK
+    assert activity[presence._hour_of_week(start)] == 1.0
+
+def test_partial_scan_keeps_unseen_sellers(presence):
+    presence.observe('Вирты', {'a': True, 'b': True})
+    presence.observe('Вирты', {'a': False}, partial=True)
+    assert presence.sources['Вирты'] == {'a': False, 'b': True}
+    presence.observe('Вирты', {'a': False})
+    assert presence.sources['Вирты'] == {'a': False}
+
+def test_refresh_repeats_last_statuses(presence):
+    start = int(time.time()) - HOUR
+    presence.observe('Вирты', {'a': True}, now=start)
+    presence.refresh('Вирты')
+    assert presence._sellers['a']['last_seen'] > start
+    assert len(presence._sellers['a']['runs']) == 1
+
+def test_state_survives_reload(presence):
+    presence.observe('Вирты', {'a': True, 'b': False})
+    presence.flush()
+    reloaded = SellerPresence(presence.db)
+    reloaded.load()
+    assert len(reloaded) == 2
+    assert reloaded._sellers['a']['online'] is True
+    assert [row['seller'] for row in reloaded.query(online=True)] == ['a']
@@ -0,0 +1,62 @@
+"""Подписчики, их правила и команды бота"""
+import os
+import sqlite3
+import tempfile
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import pytest
+
+import app
+from config import TELEGRAM_CHAT_ID
+
+@pytest.fixture
+def store():
+    connection = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+    return app.SubscriptionStore(connection, app.StateChannel(connection))
+
+def test_subscribe_is_idempotent(store):
+    assert store.subscribe(1)
+    assert not store.subscribe(1)
+    assert store.is_subscribed(1) and not store.is_subscribed(2)
+    assert store.subscriber_count() == 1
+
+def test_rules_are_added_and_deleted_per_chat(store):
+    store.subscribe(1)
+    store.subscribe(2)
+    first = store.add_rule(1, min_price=100, max_price=500, keywords=['10кк'])
+    store.add_rule(2, server='Red')
+    assert [rule['keywords'] for rule in store.rules(1)] == [['10кк']]
+    assert len(store.rules()) == 2
+    
+    assert not store.delete_rule(2, first)
+    assert store.delete_rule(1, first)
+    assert store.rules(1) == []
+
+def test_unsubscribe_removes_rules_and_bumps_version(store):
+    store.subscribe(1)
+    store.add_rule(1, keywords=['вирты'])
+    version = store.version()
+    assert store.unsubscribe(1)
+    assert store.version() != version
+    assert store.rules() == [] and not store.is_subscribed(1)
+    assert not store.unsubscribe(1)
+
+@pytest.fixture
+def replies(monkeypatch):
+    sent = []
+    monkeypatch.setattr(app, 'send_telegram_message',
+                        lambda message, parse_mode='HTML', chat_id=None: sent.append((chat_id, message)))
+    return sent
+
+def test_start_shows_admin_commands_only_to_admin_chat(replies):
+    app.handle_command('/start', '', 12345)
+    app.handle_command('/start', '', int(TELEGRAM_CHAT_ID))
+    (_, subscriber), (_, admin) = replies
+    assert '/subscribe' in subscriber and '/subscribe' in admin
+    for command in ('/check', '/monitor', '/stop', '/status'):
+        assert command not in subscriber
+        assert command in admin
@@ -0,0 +1,72 @@
+"""Снимок горячего состояния лидера"""
+import marshal
+import os
+import tempfile
+import time
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import app
+from diff import ListingDiff
+from storage import DedupStore, open_state_db
+
+def leader_state(db_path):
+    store = DedupStore(open_state_db(db_path))
+    diff = ListingDiff(store)
+    diff.update('Вирты', [{'id': 'o1', 'price': 100, 'seller_online': True}])
+    store.flush()
+    return store, diff
+
+def test_round_trip_restores_store_and_snapshots(tmp_path):
+    db_path = str(tmp_path / 'state.db')
+    store, diff = leader_state(db_path)
+    warm = app.WarmState(str(tmp_path / 'warm.bin'))
+    warm.save({
+        'seen': store.snapshot(),
+        'listings': diff.snapshots,
+        'validators': {'https://funpay.com/chips/186/': {'etag': '"abc"', 'last_modified': None, 'fingerprint': 'f'}},
+        'schedule': {'https://funpay.com/chips/186/': (60.0, 0, 0.5, 123.0)},
+    })
+    assert warm.saved_at > 0
+    
+    state = app.WarmState(warm.path).load()
+    assert state['listings'] == {'Вирты': {'o1': (100, True)}}
+    assert state['schedule']['https://funpay.com/chips/186/'] == (60.0, 0, 0.5, 123.0)
+    assert state['validators']['https://funpay.com/chips/186/']['etag'] == '"abc"'
+    
+    restored = DedupStore(open_state_db(db_path), warm=state['seen'])
+    assert restored.restored
+    assert len(restored) == 1
+    diff = ListingDiff(restored)
+    diff.snapshots.update(state['listings'])
+    assert diff.update('Вирты', [{'id': 'o1', 'price': 100, 'seller_online': True}]) == []
+
+def test_snapshot_is_ignored_after_the_store_changed(tmp_path):
+    db_path = str(tmp_path / 'state.db')
+    store, _ = leader_state(db_path)
+    snapshot = store.snapshot()
+    store.db.execute('UPDATE seen SET last_seen = last_seen + 10')
+    assert not DedupStore(open_state_db(db_path), warm=snapshot).restored
+
+def test_missing_stale_foreign_and_corrupt_snapshots(tmp_path):
+    path = str(tmp_path / 'warm.bin')
+    warm = app.WarmState(path, max_age=60)
+    assert warm.load() is None
+    
+    warm.save({'monitoring': True})
+    assert warm.load()['monitoring'] is True
+    
+    with open(path, 'wb') as f:
+        marshal.dump({'version': app.WarmState.VERSION, 'saved': time.time() - 120}, f)
+    assert warm.load() is None
+    
+    with open(path, 'wb') as f:
+        marshal.dump({'version': app.WarmState.VERSION + 1, 'saved': time.time()}, f)
+    assert warm.load() is None
+    
+    with open(path, 'wb') as f:
+        f.write(b'\x00garbage')
+    assert warm.load() is None
@@ -0,0 +1,83 @@
+"""Webhook Telegram: фоновая очередь задач и отбрасывание повторов update_id"""
+import os
+import sqlite3
+import tempfile
+import threading
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+os.environ.setdefault('TELEGRAM_CHAT_ID', '0')
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='funpay-test-'))
+os.environ.setdefault('MONITOR_ROLE', 'web')
+
+import app
+from storage import open_state_db
+
+def test_recent_updates_in_memory():
+    updates = app.RecentUpdates(sqlite3.connect(':memory:', isolation_level=None), limit=2)
+    assert not updates.seen(1)
+    assert updates.seen(1)
+    assert not updates.seen(2)
+    assert not updates.seen(3)
+    # Вытесненный из памяти id ловит таблица
+    assert 1 not in updates._ids
+    assert updates.seen(1)
+
+def test_recent_updates_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'state.db')
+    first = app.RecentUpdates(open_state_db(path))
+    second = app.RecentUpdates(open_state_db(path))
+    assert not first.seen(42)
+    assert second.seen(42)
+
+def test_job_queue_survives_failing_job():
+    jobs = app.JobQueue(workers=1)
+    done = threading.Event()
+    
+    def fail():
+        raise RuntimeError('сбой')
+    
+    assert jobs.submit(fail)
+    assert jobs.submit(done.set)
+    assert done.wait(5)
+
+def test_job_queue_rejects_when_full():
+    jobs = app.JobQueue(workers=1, maxsize=1)
+    release = threading.Event()
+    started = threading.Event()
+    
+    def block():
+        started.set()
+        release.wait(5)
+    
+    assert jobs.submit(block)
+    assert started.wait(5)
+    assert jobs.submit(lambda: None)
+    assert not jobs.submit(lambda: None)
+    release.set()
+
+class RecordingJobs:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, func, *args):
+        self.jobs.append((func.__name__, args))
+        return True
+
+def test_webhook_queues_command_once(monkeypatch, tmp_path):
+    jobs = RecordingJobs()
+    monkeypatch.setattr(app, 'webhook_jobs', jobs)
+    monkeypatch.setattr(app, 'recent_updates', app.RecentUpdates(open_state_db(str(tmp_path / 'state.db'))))
+    client = app.app.test_client()
+    update = {'update_id': 1001, 'message': {'text': '/rules@FunPayHunterBot', 'chat': {'id': 555}}}
+    
+    assert client.post('/webhook', json=update).get_json() == {'status': 'ok'}
+    assert client.post('/webhook', json=update).get_json() == {'status': 'ok', 'duplicate': True}
+    assert jobs.jobs == [('handle_command', ('/rules', '', 555))]
+
+def test_webhook_rejects_admin_command_from_other_chat(monkeypatch, tmp_path):
+    jobs = RecordingJobs()
+    monkeypatch.setattr(app, 'webhook_jobs', jobs)
+    monkeypatch.setattr(app, 'recent_updates', app.RecentUpdates(open_state_db(str(tmp_path / 'state.db'))))
+    response = app.app.test_client().post('/webhook', json={'update_id': 7, 'message': {'text': '/stop', 'chat': {'id': 555}}})
+    assert response.status_code == 403
+    assert jobs.jobs == []